@@ -1,7 +1,16 @@
 from s1_report import send_race_to_s2
-import requests, sys, random, textwrap, time
+from s2_client import http  # sessão keep-alive com gzip, retry, journal e latências
+from catalog_cache import CatalogCache, Track
+from build_index import BuildIndex
+import config, race_engine
+import numpy as np
+import sys, random, textwrap, time
 
-API = "http://localhost:8000"
+# token de sessão devolvido por /auth/login ou /auth/signup
+_token = None
+
+def auth_headers():
+    return {"Authorization": f"Bearer {_token}"} if _token else {}
 
 # ==============================
 # Helpers básicos de I/O
@@ -26,16 +35,16 @@ def pretty_row(idx, name, extra=""):
 # ==============================
 
 def signup():
+    global _token
     print("\n== Cadastro ==")
     nome = prompt("Nome: ").strip()
     email = prompt("E-mail: ").strip()
     senha = prompt("Senha: ").strip()
     try:
-        r = requests.post(f"{API}/auth/signup",
-                          json={"name": nome, "email": email, "password": senha},
-                          timeout=10)
+        r = http.post("/auth/signup", json={"name": nome, "email": email, "password": senha})
         r.raise_for_status()
         data = r.json()
+        _token = data.get("token")
         print("Cadastro OK!")
         return data  # { user_id, name, email, ... }
     except Exception as e:
@@ -46,15 +55,15 @@ def signup():
         return None
 
 def login():
+    global _token
     print("\n== Login ==")
     email = prompt("E-mail: ").strip()
     senha = prompt("Senha: ").strip()
     try:
-        r = requests.post(f"{API}/auth/login",
-                          json={"email": email, "password": senha},
-                          timeout=10)
+        r = http.post("/auth/login", json={"email": email, "password": senha})
         r.raise_for_status()
         data = r.json()
+        _token = data.get("token")
         print("Login OK!")
         return data  # { user_id, name, email, ... }
     except Exception as e:
@@ -64,20 +73,50 @@ def login():
             print("Falhou:", e)
         return None
 
+def logout():
+    global _token
+    if _token:
+        try:
+            http.post("/auth/logout", headers=auth_headers())
+        except Exception:
+            pass
+    _token = None
+
 # ==============================
 # DB1 CATALOG
 # ==============================
 
+_catalog = CatalogCache.from_config()
+
+def sync_catalog():
+    """Chamado uma vez no startup: baixa só o que mudou desde o cache em disco."""
+    try:
+        how = _catalog.sync(http)
+        print(f"(Catálogo v{_catalog.version}: {how})")
+    except Exception as e:
+        if _catalog.get() is not None:
+            print("(Aviso) S2 indisponível, usando o catálogo em cache:", e)
+        else:
+            print("(Aviso) Falha ao sincronizar o catálogo:", e)
+
+_builds = None  # BuildIndex da versão atual do catálogo
+
 def get_catalog():
-    r = requests.get(f"{API}/db1/catalog", timeout=10)
-    r.raise_for_status()
-    return r.json()  # {"characters":[...], "karts":[...], "wheels":[...], "gliders":[...], "tracks":[...]}
+    global _builds
+    # com o cache em disco sincronizado, montar uma corrida não usa a rede
+    if _catalog.get() is None:
+        _catalog.sync(http)
+    catalog = _catalog.get()  # {"characters":[...], "karts":[...], "wheels":[...], "gliders":[...], "tracks":[...]}
+    version = (_catalog.epoch, _catalog.version)
+    if _builds is None or _builds.version != version:
+        _builds = BuildIndex(catalog, part_stats, version)
+    return catalog
 
 def choose_from_list(title, items, render_extra):
     print_title(title)
     for i, it in enumerate(items, 1):
         extra = render_extra(it)
-        print(pretty_row(i, it.get("name") or it.get("Nome") or "?", extra))
+        print(pretty_row(i, it.name, extra))
     while True:
         s = prompt("Escolha (número): ").strip()
         if not s.isdigit():
@@ -89,80 +128,36 @@ def choose_from_list(title, items, render_extra):
         print("Opção inválida.")
 
 # ==============================
-# Normalização de atributos (PT/EN)
+# Atributos das peças
 # ==============================
+# O catálogo chega no schema canônico do S2 como registros Part(name, weight,
+# speed, accel) / Track(name) (ver catalog_cache.py); nada de adivinhar chaves.
 
-WEIGHT_MAP = {"light": 1, "medium": 2, "heavy": 3}
+WEIGHT_LABELS = {1: "leve", 2: "médio", 3: "pesado"}
 
-# Se no seu DB1 os personagens já trazem "Peso": "light/medium/heavy",
-# este mapa não é obrigatório, mas ajuda a garantir fallback.
-WEIGHT_BY_CHARACTER = {
-    "Mario": "medium", "Luigi": "medium", "Peach": "light", "Bowser": "heavy",
-    "Yoshi": "light", "Toad": "light", "Donkey Kong": "heavy", "Wario": "heavy"
-}
-
-def _to_int(x, default=0):
-    try:
-        return int(x)
-    except Exception:
-        return default
-
-def normalize_weight(val):
-    """Aceita 'light/medium/heavy' ou número."""
-    if isinstance(val, str):
-        m = val.strip().lower()
-        if m in WEIGHT_MAP:
-            return WEIGHT_MAP[m]
-        # pode ser número em string
-        return _to_int(m, 0)
-    return _to_int(val, 0)
-
-def get_field(d: dict, *keys, default=None):
-    """Busca primeira chave existente (case-sensitive) em PT/EN."""
-    for k in keys:
-        if d.get(k) is not None:
-            return d.get(k)
-    return default
+def render_character_extra(ch):
+    return f"[Peso={WEIGHT_LABELS.get(ch.weight, ch.weight)}({ch.weight})]"
 
 def render_part_extra(part):
-    # tenta pegar Peso em PT/EN
-    w_raw = get_field(part, "Peso", "peso", "weight", default=None)
-    v_raw = get_field(part, "Velocidade", "velocidade", "speed", default=None)
-    a_raw = get_field(part, "Aceleração", "aceleracao", "acceleration", default=None)
-
-    wv = normalize_weight(w_raw) if w_raw is not None else None
-    bits = []
-    if w_raw is not None:
-        if isinstance(w_raw, str) and w_raw.lower() in WEIGHT_MAP:
-            bits.append(f"Peso={w_raw}({wv})")
-        else:
-            bits.append(f"Peso={wv}")
-    if v_raw is not None:
-        bits.append(f"Velocidade={_to_int(v_raw)}")
-    if a_raw is not None:
-        bits.append(f"Aceleração={_to_int(a_raw)}")
-    return "[" + ", ".join(bits) + "]" if bits else ""
+    return f"[Peso={part.weight}, Velocidade={part.speed}, Aceleração={part.accel}]"
+
+def part_stats(slot, part):
+    """(peso, velocidade, aceleração) de uma peça; personagens só têm peso."""
+    return part.weight, part.speed, part.accel
 
 def resumo_stats(escolhas):
-    """Somatória do peso/vel/acc (char + kart + roda + glider), aceitando PT/EN."""
+    """Somatória do peso/vel/acc (char + kart + roda + glider).
+
+    Peças do catálogo atual saem prontas do índice de builds; o cálculo peça a
+    peça fica para builds fora dele."""
+    if _builds is not None:
+        hit = _builds.lookup(escolhas)
+        if hit is not None:
+            return hit
     pes, vel, acc = 0, 0, 0
-
-    # personagem: pode ser "Peso": "light/medium/heavy" OU "weight"
-    ch = escolhas["character"]
-    ch_weight_label = get_field(ch, "Peso", "peso", "weight", default=None)
-    if ch_weight_label is None:
-        # fallback por nome do personagem
-        label = WEIGHT_BY_CHARACTER.get(ch.get("name") or ch.get("Nome") or "", "medium")
-        pes += WEIGHT_MAP.get(label, 0)
-    else:
-        pes += normalize_weight(ch_weight_label)
-
-    # demais peças (preferimos PT, caindo em EN)
-    for key in ("kart", "wheel", "glider"):
-        part = escolhas[key]
-        pes += normalize_weight(get_field(part, "Peso", "peso", "weight", default=0))
-        vel += _to_int(get_field(part, "Velocidade", "velocidade", "speed", default=0))
-        acc += _to_int(get_field(part, "Aceleração", "aceleracao", "acceleration", default=0))
+    for key in ("character", "kart", "wheel", "glider"):
+        w, v, a = part_stats(key, escolhas[key])
+        pes, vel, acc = pes + w, vel + v, acc + a
     return pes, vel, acc
 
 # ==============================
@@ -170,7 +165,7 @@ def resumo_stats(escolhas):
 # ==============================
 
 def montar_kart_user(catalog):
-    ch = choose_from_list("Selecione seu Personagem:", catalog["characters"], render_part_extra)
+    ch = choose_from_list("Selecione seu Personagem:", catalog["characters"], render_character_extra)
     ka = choose_from_list("Selecione seu Kart:", catalog["karts"], render_part_extra)
     wh = choose_from_list("Selecione a Roda:", catalog["wheels"], render_part_extra)
     gl = choose_from_list("Selecione o Glider:", catalog["gliders"], render_part_extra)
@@ -179,11 +174,11 @@ def montar_kart_user(catalog):
 def escolha_pista_aleatoria(catalog):
     tracks = catalog.get("tracks") or []
     if not tracks:
-        return {"name": "Pista Desconhecida"}
+        return Track("Pista Desconhecida")
     return random.choice(tracks)
 
 def nome_de(item):
-    return item.get("name") or item.get("Nome") or "?"
+    return item.name
 
 def print_resumo_corrida(titulo, pista, jogadores):
     print_title(titulo)
@@ -216,7 +211,7 @@ def lista_users_rdb(exclude_id=None, limit=7):
     params = {"limit": limit}
     if exclude_id:
         params["exclude_id"] = exclude_id
-    r = requests.get(f"{API}/rdb/users", params=params, timeout=10)
+    r = http.get("/rdb/users", params=params, headers=auth_headers())
     r.raise_for_status()
     return r.json()
 
@@ -228,11 +223,16 @@ def run_countdown():
         time.sleep(1)
     print("VAI!!!")
 
-def simulate_race(players):
-    """Ordem aleatória como resultado (posição 1..N)."""
-    results = players[:]  # shallow copy
-    random.shuffle(results)
-    return results
+_race_rng = np.random.default_rng(config.RACE_SEED)
+
+def simulate_race(players, track=None, rng=None):
+    """Simula a corrida (race_engine) com os totais de resumo_stats e o perfil
+    da pista. Devolve cópias dos jogadores em ordem de chegada, com "time_ms"."""
+    stats = np.array([resumo_stats(p) for p in players], dtype=np.float64)
+    times = race_engine.simulate(stats, nome_de(track) if track else None,
+                                 rng if rng is not None else _race_rng)
+    order = np.argsort(times, kind="stable")
+    return [{**players[i], "time_ms": int(round(times[i] * 1000))} for i in order]
 
 def _player_stats_dict(p):
     # gera dict {"peso_total":..., "velocidade":..., "aceleracao":...} para payload
@@ -252,7 +252,8 @@ def _payload_from_results(mode: str, track, results):
             "wheel": {"name": nome_de(wh)},
             "glider": {"name": nome_de(gl)},
             "position": pos,
-            "stats": stats
+            "stats": stats,
+            **({"time_ms": pl["time_ms"]} if pl.get("time_ms") is not None else {}),
         })
     return {
         "mode": mode,
@@ -260,14 +261,22 @@ def _payload_from_results(mode: str, track, results):
         "players": players_payload
     }
 
+def fmt_time(ms):
+    m, s = divmod(ms / 1000, 60)
+    return f"{int(m)}:{s:06.3f}"
+
 def print_race_results(track, results):
     print_title("RESULTADO FINAL")
     print(f"Pista: {nome_de(track)}\n" + "-"*60)
+    best = results[0].get("time_ms") if results else None
     for pos, j in enumerate(results, 1):
         ch, ka, wh, gl = j["character"], j["kart"], j["wheel"], j["glider"]
         pes, vel, acc = resumo_stats(j)
+        tempo = ""
+        if j.get("time_ms") is not None:
+            tempo = f"  ({fmt_time(j['time_ms'])}" + (f", +{(j['time_ms'] - best) / 1000:.3f}s)" if pos > 1 else ")")
         print(textwrap.dedent(f"""
-        #{pos} - {j['name']}
+        #{pos} - {j['name']}{tempo}
            Personagem: {nome_de(ch)}
            Kart:       {nome_de(ka)}
            Roda:       {nome_de(wh)}
@@ -276,7 +285,7 @@ def print_race_results(track, results):
         """).strip())
         print("-"*60)
 
-def run_race_flow(players, track, titulo_inicio, mode_str: str):
+def run_race_flow(players, track, titulo_inicio, mode_str: str, rng=None, registrar=True):
     # grid já foi impresso antes
     print_title(titulo_inicio)
     run_countdown()
@@ -287,18 +296,28 @@ def run_race_flow(players, track, titulo_inicio, mode_str: str):
     print("\n")
 
     # resultado
-    results = simulate_race(players)
+    results = simulate_race(players, track, rng)
     print_race_results(track, results)
 
-    # envia para S2/Neo4j
+    if not registrar:
+        # partida do matchmaking: todos simulam a mesma corrida, só o host registra
+        print("\n[S1] Resultado registrado pelo host da partida.")
+        _ = prompt("\nPressione ENTER para voltar ao menu...")
+        return
+
+    # envia para a S2 (outbox -> RDB/Neo4j)
     payload = _payload_from_results(mode=mode_str, track=track, results=results)
-    rid = send_race_to_s2(mode=payload["mode"],
+    res = send_race_to_s2(mode=payload["mode"],
                           track_name=payload["track_name"],
-                          players=payload["players"])
-    if rid:
-        print(f"\n[S1] Corrida registrada no Neo4j. race_id={rid}")
+                          players=payload["players"],
+                          token=_token)
+    if res is None:
+        print("\n[S1] Falha ao enviar a corrida para a S2.")
+    elif res["queued"]:
+        # 202: a S2 guardou no outbox; a gravação nos bancos acontece em seguida
+        print(f"\n[S1] Corrida enfileirada na S2 para gravação. race_id={res['race_id']}")
     else:
-        print("\n[S1] Falha ao registrar a corrida no Neo4j.")
+        print(f"\n[S1] Corrida registrada na S2. race_id={res['race_id']}")
 
     _ = prompt("\nPressione ENTER para voltar ao menu...")
 
@@ -307,6 +326,7 @@ def run_race_flow(players, track, titulo_inicio, mode_str: str):
 # ==============================
 
 def menu_principal():
+    sync_catalog()
     while True:
         print("\nOlá, seja bem-vindo ao Nintendo Switch\n")
         print("1. Login")
@@ -332,13 +352,18 @@ def menu_usuario(user):
         print(f"\nOlá, {uname}!")
         print("1. Jogar Mario Kart (Online)")
         print("2. Jogar Mario Kart (Local)")
-        print("3. Voltar ao menu")
+        print("3. Estatísticas de rede (S2)")
+        print("4. Voltar ao menu")
         op = prompt("Escolha: ").strip()
         if op == "1":
             jogar_online(uid, uname)
         elif op == "2":
             jogar_local(uname)
         elif op == "3":
+            print_title("Latência das chamadas ao S2")
+            http.stats.print_table()
+        elif op == "4":
+            logout()
             return
         else:
             print("Opção inválida.")
@@ -364,11 +389,77 @@ def jogar_local(uname):
     print_resumo_corrida("Mario Kart (Local) — Grid de Largada", pista, players)
     run_race_flow(players, pista, "Preparar...", mode_str="local")
 
+def _ping_ms():
+    # p50 mais baixo entre as rotas já chamadas: aproxima o RTT até a S2
+    # (descontando o tempo do servidor quando a S2 manda Server-Timing)
+    p50s = [r.get("net_p50_ms") or r["p50_ms"] for r in http.stats.summary()]
+    return round(min(p50s), 1) if p50s else None
+
+def entrar_na_fila(escolhas, pista):
+    """Fila de matchmaking da S2. Devolve o grid, "cancelado" ou None (S2 sem matchmaking)."""
+    body = {"ping_ms": _ping_ms(), "track": nome_de(pista),
+            **{slot: nome_de(escolhas[slot]) for slot in ("character", "kart", "wheel", "glider")}}
+    r = http.post("/match/queue", json=body, headers=auth_headers())
+    if r.status_code in (401, 404):
+        return None
+    r.raise_for_status()
+    data = r.json()
+    tid = data["ticket_id"]
+    print("\nProcurando adversários... (Ctrl+C cancela)")
+    try:
+        while data["status"] != "matched":
+            print(f"  na fila há {data['waited_s']:.0f}s ({data['queue']} jogadores esperando)")
+            r = http.get(f"/match/queue/{tid}", params={"wait": 20}, headers=auth_headers(),
+                         timeout=(config.HTTP_CONNECT_TIMEOUT, 30))
+            if r.status_code == 404:
+                return None
+            r.raise_for_status()
+            data = r.json()
+    except KeyboardInterrupt:
+        http.delete(f"/match/queue/{tid}", headers=auth_headers())
+        print("\nBusca cancelada.")
+        return "cancelado"
+    return data["match"]
+
+def _por_nome(items, name, rng):
+    return next((it for it in items if it.name == name), None) or items[int(rng.integers(len(items)))]
+
+def grid_do_match(catalog, match):
+    """Monta jogadores e pista do grid recebido; bots e peças faltantes saem do `seed`,
+    então todos os consoles da partida montam (e simulam) exatamente a mesma corrida."""
+    rng = np.random.default_rng(match["seed"])
+    kinds = {"character": "characters", "kart": "karts", "wheel": "wheels", "glider": "gliders"}
+    players = []
+    for pl in match["players"]:
+        players.append({"id": pl["user_id"], "name": pl["name"],
+                        **{slot: _por_nome(catalog[kind], pl.get(slot), rng) for slot, kind in kinds.items()}})
+    for i in range(match["bots"]):
+        players.append({"id": f"bot-{i+1}", "name": f"Bot {i+1}",
+                        **{slot: catalog[kind][int(rng.integers(len(catalog[kind])))]
+                           for slot, kind in kinds.items()}})
+    pista = _por_nome(catalog["tracks"], match.get("track"), rng)
+    return players, pista, rng
+
 def jogar_online(uid, uname):
     catalog = get_catalog()
     minhas_escolhas = montar_kart_user(catalog)
     pista = escolha_pista_aleatoria(catalog)
 
+    try:
+        match = entrar_na_fila(minhas_escolhas, pista)
+    except Exception as e:
+        print("(Aviso) Matchmaking indisponível:", e)
+        match = None
+    if match == "cancelado":
+        return
+    if match is not None:
+        players, pista, rng = grid_do_match(catalog, match)
+        host = match["host"] == uid
+        print_resumo_corrida("Mario Kart (Online) — Grid de Largada", pista, players)
+        run_race_flow(players, pista, "Preparar...", mode_str="online", rng=rng, registrar=host)
+        return
+
+    # S2 sem matchmaking: adversários aleatórios do RDB + bots
     adversarios = []
     try:
         raw_users = lista_users_rdb(exclude_id=uid, limit=7)
@@ -0,0 +1,52 @@
+"""
+Totais (peso, velocidade, aceleração) de todas as builds do catálogo, pré-calculados.
+
+Cada peça vira um id inteiro (posição na coleção) e os totais de todas as
+combinações personagem x kart x roda x glider ficam num array int16
+(c, k, w, g, 3) — 8^4 = 4096 builds com o catálogo do PopDB1.py. Main.py
+reconstrói o índice só quando a versão do catálogo em cache muda; depois
+disso resumo_stats é uma consulta por nome -> id -> array, sem somar peça a
+peça a cada linha do grid.
+
+A regra por peça vem de fora (`part_stats(kind, part)`), para que o índice e
+o cálculo direto de Main.resumo_stats nunca divirjam.
+"""
+from typing import Callable, Optional
+
+import numpy as np
+
+# chave no dict do jogador -> coleção do catálogo
+SLOTS = [("character", "characters"), ("kart", "karts"), ("wheel", "wheels"), ("glider", "gliders")]
+
+
+class BuildIndex:
+    def __init__(self, catalog: dict, part_stats: Callable[[str, tuple], tuple], version=None):
+        self.version = version
+        self.ids = []
+        parts = []
+        for slot, kind in SLOTS:
+            items = catalog.get(kind) or []
+            self.ids.append({p.name: i for i, p in enumerate(items)})
+            parts.append(np.array([part_stats(slot, p) for p in items], dtype=np.int16).reshape(-1, 3))
+        self.totals = (parts[0][:, None, None, None, :] + parts[1][None, :, None, None, :]
+                       + parts[2][None, None, :, None, :] + parts[3][None, None, None, :, :])
+
+    def build_ids(self, escolhas: dict) -> Optional[tuple]:
+        out = []
+        for (slot, _), ids in zip(SLOTS, self.ids):
+            part = escolhas.get(slot)
+            i = ids.get(part.name) if part is not None else None
+            if i is None:
+                return None
+            out.append(i)
+        return tuple(out)
+
+    def lookup(self, escolhas: dict) -> Optional[tuple]:
+        """(peso, velocidade, aceleração) da build, ou None se alguma peça não está no índice."""
+        ids = self.build_ids(escolhas)
+        if ids is None:
+            return None
+        return tuple(self.totals[ids].tolist())
+
+    def __len__(self):
+        return int(np.prod(self.totals.shape[:4]))
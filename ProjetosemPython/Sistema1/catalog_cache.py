@@ -0,0 +1,155 @@
+"""
+Cache do catálogo (DB1) em disco, sincronizado por delta com o S2.
+
+O arquivo guarda {epoch, version, items}. No startup o S1 chama `sync()`, que
+pede a /db1/catalog/delta só o que mudou desde a versão guardada (um GET
+pequeno, ou vazio se nada mudou) e regrava o arquivo. Depois disso as
+corridas usam o catálogo da memória, sem nenhuma ida à rede.
+
+Os itens chegam no formato compacto do S2 (uma lista por item, na ordem de
+`fields`) e viram registros imutáveis Part(name, weight, speed, accel) /
+Track(name) — tuplas nomeadas, sem dict por item e sem adivinhar chaves.
+Só a resposta de um S2 antigo (sem o endpoint de delta) passa por
+`from_dict`, que traduz os formatos antigos uma única vez.
+
+Arquivo: config.CATALOG_CACHE_PATH (S1_CATALOG_CACHE).
+"""
+import json, os
+from typing import NamedTuple, Optional
+
+COLLECTIONS = ["characters", "karts", "wheels", "gliders", "tracks"]
+
+
+class Part(NamedTuple):
+    name: str
+    weight: int = 0
+    speed: int = 0
+    accel: int = 0
+
+
+class Track(NamedTuple):
+    name: str
+
+
+RECORDS = {"characters": Part, "karts": Part, "wheels": Part, "gliders": Part, "tracks": Track}
+
+# só para respostas de um S2 sem schema canônico
+_WEIGHT_LABELS = {"light": 1, "medium": 2, "heavy": 3}
+_WEIGHT_BY_CHARACTER = {
+    "Mario": "medium", "Luigi": "medium", "Peach": "light", "Bowser": "heavy",
+    "Yoshi": "light", "Toad": "light", "Donkey Kong": "heavy", "Wario": "heavy"
+}
+_ALIASES = {
+    "weight": ("weight", "Peso", "peso"),
+    "speed": ("speed", "Velocidade", "velocidade"),
+    "accel": ("accel", "Aceleração", "aceleracao", "acceleration"),
+}
+
+
+def _int(v) -> int:
+    if isinstance(v, str) and v.strip().lower() in _WEIGHT_LABELS:
+        return _WEIGHT_LABELS[v.strip().lower()]
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return 0
+
+
+def from_dict(col: str, d: dict):
+    """Item em formato antigo (chaves PT/EN, peso por rótulo) -> registro."""
+    name = d.get("name") or d.get("Nome") or "?"
+    if RECORDS[col] is Track:
+        return Track(name)
+    vals = {f: next((d[k] for k in keys if d.get(k) is not None), None) for f, keys in _ALIASES.items()}
+    if col == "characters" and vals["weight"] is None:
+        vals["weight"] = _WEIGHT_BY_CHARACTER.get(name, "medium")
+    return Part(name, *(_int(vals[f]) for f in ("weight", "speed", "accel")))
+
+
+def decode(col: str, fields: list, row: list):
+    rec = RECORDS[col]
+    if tuple(fields) == rec._fields:
+        return rec(*row)
+    return rec(**{f: v for f, v in zip(fields, row) if f in rec._fields})
+
+
+def decode_items(items: dict, fields: Optional[dict] = None) -> dict:
+    """{col: [linhas ou dicts]} -> {col: [registros]}."""
+    out = {}
+    for col in COLLECTIONS:
+        rows = items.get(col) or []
+        if fields is not None:
+            out[col] = [decode(col, fields[col], r) for r in rows]
+        else:
+            out[col] = [from_dict(col, r) for r in rows]
+    return out
+
+
+class CatalogCache:
+    def __init__(self, path: str):
+        self.path = path
+        self.epoch: Optional[str] = None
+        self.version = 0
+        self.items: Optional[dict] = None
+        self._load()
+
+    @classmethod
+    def from_config(cls) -> "CatalogCache":
+        import config
+        return cls(config.CATALOG_CACHE_PATH)
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("format") != "compact":
+                raise ValueError("cache em formato antigo")
+            fields = {col: RECORDS[col]._fields for col in COLLECTIONS}
+            self.epoch, self.version = data["epoch"], data["version"]
+            self.items = decode_items(data["items"], fields)
+        except (OSError, ValueError, KeyError, TypeError):
+            self.epoch, self.version, self.items = None, 0, None  # sem cache (ou corrompido)
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"format": "compact", "epoch": self.epoch, "version": self.version,
+                       "items": self.items}, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self.path)  # troca atômica: nunca fica meio arquivo
+
+    def _apply(self, delta: dict):
+        fields = delta.get("fields")
+        if delta.get("full"):
+            self.items = decode_items(delta["items"], fields)
+        else:
+            changed = decode_items(delta.get("changed", {}), fields)
+            for col in COLLECTIONS:
+                gone = set(delta.get("deleted", {}).get(col, []))
+                by_name = {it.name: it for it in self.items.get(col, []) if it.name not in gone}
+                for it in changed[col]:
+                    by_name[it.name] = it
+                self.items[col] = list(by_name.values())
+        self.epoch, self.version = delta.get("epoch"), delta.get("version", 0)
+
+    def sync(self, http) -> str:
+        """Atualiza com o S2 (`http` é o s2_client). Devolve "full", "delta", "atual" ou "legado"."""
+        since = self.version if self.items is not None else 0
+        r = http.get("/db1/catalog/delta",
+                     params={"since": since, "epoch": self.epoch or "", "format": "compact"})
+        if r.status_code == 404:
+            r = http.get("/db1/catalog")
+            r.raise_for_status()
+            self._apply({"full": True, "items": r.json(), "epoch": None, "version": 0})
+            self._save()
+            return "legado"
+        r.raise_for_status()
+        delta = r.json()
+        if not delta.get("full") and not delta.get("changed") and not delta.get("deleted") \
+                and delta.get("version") == self.version:
+            return "atual"
+        self._apply(delta)
+        self._save()
+        return "full" if delta.get("full") else "delta"
+
+    def get(self) -> Optional[dict]:
+        return self.items
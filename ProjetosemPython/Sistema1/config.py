@@ -0,0 +1,33 @@
+"""Configuração do S1 (um lugar só; tudo pode vir de variáveis de ambiente / .env)."""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# URL base da API S2 (S2_API é o nome antigo usado pelo s1_report.py)
+S2_API = os.getenv("S2_API", "http://localhost:8000").rstrip("/")
+
+# ---- Cliente HTTP (s2_client.py) ----
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))          # conexões keep-alive por host
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))               # só métodos idempotentes / falha de conexão
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.2"))           # base do backoff exponencial (s)
+HTTP_BACKOFF_JITTER = float(os.getenv("HTTP_BACKOFF_JITTER", "0.2"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "5"))
+HTTP_GZIP_MIN = int(os.getenv("HTTP_GZIP_MIN", "1024"))          # corpos menores vão sem gzip (0 = nunca)
+HTTP_LOG_SLOW_MS = float(os.getenv("HTTP_LOG_SLOW_MS", "0"))      # imprime chamadas mais lentas com o Server-Timing (0 = não)
+
+# ---- Journal (journal.py) ----
+JOURNAL_ENABLED = os.getenv("S1_JOURNAL", "1") == "1"
+JOURNAL_DIR = os.getenv("S1_JOURNAL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "journal"))
+JOURNAL_MAX_BYTES = int(os.getenv("S1_JOURNAL_MAX_BYTES", str(16 * 1024 * 1024)))
+JOURNAL_COMPRESS = os.getenv("S1_JOURNAL_COMPRESS", "1") == "1"
+
+# ---- Cache do catálogo (catalog_cache.py) ----
+CATALOG_CACHE_PATH = os.getenv("S1_CATALOG_CACHE",
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog_cache.json"))
+
+# ---- Motor de corrida (race_engine.py) ----
+# semente fixa reproduz as mesmas corridas; vazio = aleatório a cada execução
+RACE_SEED = int(os.environ["S1_RACE_SEED"]) if os.getenv("S1_RACE_SEED") else None
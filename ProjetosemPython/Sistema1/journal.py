@@ -0,0 +1,169 @@
+"""
+Journal append-only das trocas HTTP do S1 com o S2.
+
+O enunciado pede que o S1 guarde todas as requisições enviadas ao S2 junto com
+as respostas. Cada troca vira um registro binário compacto:
+
+    [4 bytes: tamanho, big-endian][1 byte: flags][corpo]
+
+onde o corpo é JSON (UTF-8) e flags&1 indica corpo comprimido com zlib. Os
+arquivos rodam por tamanho (journal-<timestamp>-<n>.mkj) dentro do diretório
+do journal. Segredos não são gravados: o header Authorization fica de fora e,
+nas rotas /auth/*, senhas do corpo da requisição e o token da resposta viram
+"***" (corpo que não é JSON nessas rotas não é gravado).
+
+Configuração em config.py (JOURNAL_*): S1_JOURNAL=0 desliga,
+S1_JOURNAL_DIR, S1_JOURNAL_MAX_BYTES e S1_JOURNAL_COMPRESS.
+
+Leitura: `iter_records(caminho_ou_diretorio)`. Reenvio: ver replay.py.
+"""
+import glob, json, os, struct, threading, time, zlib
+from typing import Iterator, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+HEADER = struct.Struct(">IB")
+FLAG_ZLIB = 1
+SUFFIX = ".mkj"
+MIN_COMPRESS = 256  # registros menores não compensam
+SECRET_KEYS = {"password", "senha", "token"}
+REDACTED = "***"
+
+
+class Journal:
+    def __init__(self, directory: str, max_bytes: int = 16 * 1024 * 1024, compress: bool = True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self._lock = threading.Lock()
+        self._f = None
+        self._seq = 0
+
+    @classmethod
+    def from_config(cls) -> Optional["Journal"]:
+        import config
+        if not config.JOURNAL_ENABLED:
+            return None
+        return cls(config.JOURNAL_DIR, config.JOURNAL_MAX_BYTES, config.JOURNAL_COMPRESS)
+
+    def _rotate(self):
+        if self._f is not None:
+            self._f.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self._seq += 1
+        name = f"journal-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._seq}{SUFFIX}"
+        self._f = open(os.path.join(self.directory, name), "ab")
+
+    def append(self, record: dict):
+        body = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode()
+        flags = 0
+        if self.compress and len(body) >= MIN_COMPRESS:
+            body, flags = zlib.compress(body, 6), FLAG_ZLIB
+        with self._lock:
+            if self._f is None or self._f.tell() >= self.max_bytes:
+                self._rotate()
+            self._f.write(HEADER.pack(len(body), flags) + body)
+            self._f.flush()
+
+    def close(self):
+        with self._lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+
+
+def _text(b) -> Optional[str]:
+    if b is None:
+        return None
+    if isinstance(b, bytes):
+        return b.decode("utf-8", errors="replace")
+    return str(b)
+
+
+def _redact(v):
+    if isinstance(v, dict):
+        return {k: REDACTED if k in SECRET_KEYS else _redact(x) for k, x in v.items()}
+    if isinstance(v, list):
+        return [_redact(x) for x in v]
+    return v
+
+
+def _redacted_text(b) -> Optional[str]:
+    """Corpo JSON com senhas/tokens trocados por "***"; não-JSON não é gravado."""
+    text = _text(b)
+    if not text:
+        return text
+    try:
+        return json.dumps(_redact(json.loads(text)), ensure_ascii=False, separators=(",", ":"))
+    except ValueError:
+        return None
+
+
+def exchange_record(method: str, url: str, req_headers: dict, req_body, t_start: float,
+                    elapsed: float, resp: Optional[requests.Response] = None,
+                    error: Optional[str] = None) -> dict:
+    body = _redacted_text if urlsplit(url).path.startswith("/auth/") else _text
+    rec = {
+        "ts": t_start,
+        "elapsed_ms": round(elapsed * 1000, 3),
+        "method": method,
+        "url": url,
+        "req_headers": {k: v for k, v in req_headers.items()
+                        if k.lower() in ("content-type", "content-encoding", "if-none-match")},
+        "req_body": body(req_body),
+    }
+    if resp is not None:
+        rec["status"] = resp.status_code
+        rec["resp_headers"] = {k: v for k, v in resp.headers.items()
+                               if k.lower() in ("content-type", "etag", "server-timing")}
+        rec["resp_body"] = body(resp.content)
+    if error is not None:
+        rec["error"] = error
+    return rec
+
+
+class JournaledSession(requests.Session):
+    """requests.Session que grava cada troca (inclusive falhas de conexão) no journal."""
+
+    def __init__(self, journal: Optional[Journal]):
+        super().__init__()
+        self.journal = journal
+
+    def send(self, request: requests.PreparedRequest, **kwargs):
+        if self.journal is None:
+            return super().send(request, **kwargs)
+        t_start, t0 = time.time(), time.perf_counter()
+        try:
+            resp = super().send(request, **kwargs)
+        except Exception as e:
+            self.journal.append(exchange_record(request.method, request.url, dict(request.headers),
+                                                request.body, t_start, time.perf_counter() - t0,
+                                                error=f"{type(e).__name__}: {e}"))
+            raise
+        self.journal.append(exchange_record(request.method, request.url, dict(request.headers),
+                                            request.body, t_start, time.perf_counter() - t0, resp=resp))
+        return resp
+
+
+def journal_files(path: str) -> list[str]:
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, "*" + SUFFIX)), key=lambda p: (os.path.getmtime(p), p))
+    return [path]
+
+
+def iter_records(path: str) -> Iterator[dict]:
+    """Lê os registros de um arquivo ou de todos os arquivos de um diretório, em ordem."""
+    for fn in journal_files(path):
+        with open(fn, "rb") as f:
+            while True:
+                head = f.read(HEADER.size)
+                if len(head) < HEADER.size:
+                    break  # fim do arquivo (ou registro truncado por crash)
+                size, flags = HEADER.unpack(head)
+                body = f.read(size)
+                if len(body) < size:
+                    break
+                if flags & FLAG_ZLIB:
+                    body = zlib.decompress(body)
+                yield json.loads(body)
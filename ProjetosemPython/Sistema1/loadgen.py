@@ -0,0 +1,212 @@
+"""
+Gerador de carga headless: N consoles S1 virtuais jogando contra a S2.
+
+Cada console segue o mesmo fluxo do Main.py, sem prompt() e sem as pausas da
+contagem regressiva:
+
+    cadastro -> login -> catálogo (delta) -> [adversários -> corrida -> /race/finish] x R
+
+O grid, o resultado e o payload saem das mesmas funções do Main.py
+(pick_random_build, resumo_stats, _payload_from_results). Entre as corridas
+cada console "pensa" por um tempo aleatório (exponencial com média --think).
+Ao final imprime, por endpoint, vazão, erros, p50/p95/p99 e um histograma
+de latência.
+
+O motor de corrida (race_engine, ~10 ms por corrida avulsa) não roda no event
+loop: com --race-sim batch (padrão) as corridas pedidas pelos consoles numa
+janela de --sim-window segundos são simuladas juntas com simulate_batch numa
+thread, então as latências medidas não incluem a simulação dos outros
+consoles. --race-sim shuffle sorteia a ordem de chegada (custo ~zero), para
+quando só interessa a carga na S2.
+
+    python loadgen.py --url http://localhost:8000 --consoles 1000 --duration 120 --think 2 --ramp 30
+    python loadgen.py --consoles 200 --races 5 --think 0 --ingest sync --local-ratio 0.3
+"""
+import argparse, asyncio, bisect, os, random, statistics, time, uuid
+from collections import Counter, defaultdict
+
+import httpx
+
+# as mesmas regras de montagem de grid/resultado do cliente interativo
+from Main import _payload_from_results, escolha_pista_aleatoria, nome_de, pick_random_build, resumo_stats
+from catalog_cache import decode_items
+import numpy as np
+import race_engine
+
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+
+class Stats:
+    def __init__(self):
+        self.lat = defaultdict(list)       # endpoint -> [segundos]
+        self.errors = Counter()            # endpoint -> falhas (status >= 400 ou exceção)
+        self.status = defaultdict(Counter)
+
+    async def timed(self, endpoint: str, coro):
+        t0 = time.perf_counter()
+        try:
+            r = await coro
+        except httpx.HTTPError as e:
+            self.lat[endpoint].append(time.perf_counter() - t0)
+            self.errors[endpoint] += 1
+            self.status[endpoint][type(e).__name__] += 1
+            return None
+        self.lat[endpoint].append(time.perf_counter() - t0)
+        self.status[endpoint][r.status_code] += 1
+        if r.status_code >= 400:
+            self.errors[endpoint] += 1
+            return None
+        return r
+
+    def report(self, wall: float):
+        print(f"\n{'endpoint':<12} {'n':>7} {'req/s':>9} {'erros':>7} {'p50':>9} {'p95':>9} {'p99':>9}")
+        for ep, xs in self.lat.items():
+            qs = statistics.quantiles(xs, n=100, method="inclusive") if len(xs) > 1 else xs * 99
+            print(f"{ep:<12} {len(xs):>7} {len(xs) / wall:>9.1f} {self.errors[ep]:>7} "
+                  f"{qs[49] * 1000:>7.1f}ms {qs[94] * 1000:>7.1f}ms {qs[98] * 1000:>7.1f}ms")
+        for ep, xs in self.lat.items():
+            print(f"\n{ep} — status: {dict(self.status[ep])}")
+            counts = [0] * (len(BUCKETS_MS) + 1)
+            for x in xs:
+                counts[bisect.bisect_left(BUCKETS_MS, x * 1000)] += 1
+            top = max(counts) or 1
+            for i, n in enumerate(counts):
+                if not n:
+                    continue
+                label = f"<= {BUCKETS_MS[i]}ms" if i < len(BUCKETS_MS) else f"> {BUCKETS_MS[-1]}ms"
+                print(f"  {label:>10} {n:>7} {'#' * max(1, round(40 * n / top))}")
+
+
+class RaceBatcher:
+    """Junta as corridas pedidas numa janela curta e simula todas de uma vez
+    (simulate_batch por pista) numa thread, fora do event loop."""
+
+    def __init__(self, window: float = 0.02, max_batch: int = 512):
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: dict[tuple, list] = {}   # (pista, nº de jogadores) -> [(stats, future)]
+
+    async def simulate(self, players: list, track) -> list:
+        """Mesmo retorno do Main.simulate_race: jogadores em ordem de chegada, com time_ms."""
+        key = (nome_de(track) if track else None, len(players))
+        fut = asyncio.get_running_loop().create_future()
+        batch = self._pending.setdefault(key, [])
+        batch.append(([resumo_stats(p) for p in players], fut))
+        if len(batch) == 1:
+            asyncio.get_running_loop().call_later(self.window, self._flush, key)
+        elif len(batch) >= self.max_batch:
+            self._flush(key)
+        times = await fut
+        order = np.argsort(times, kind="stable")
+        return [{**players[i], "time_ms": int(round(times[i] * 1000))} for i in order]
+
+    def _flush(self, key):
+        batch = self._pending.pop(key, None)
+        if batch:
+            asyncio.ensure_future(self._run(key[0], batch))
+
+    async def _run(self, track, batch):
+        stats = np.array([b[0] for b in batch], dtype=np.float64)
+        try:
+            times = await asyncio.to_thread(race_engine.simulate_batch, stats, track)
+        except Exception as e:
+            for _, fut in batch:
+                fut.set_exception(e)
+            return
+        for (_, fut), row in zip(batch, times):
+            if not fut.done():
+                fut.set_result(row)
+
+
+async def shuffle_race(players: list, track) -> list:
+    # modo barato: ordem sorteada e tempos plausíveis, sem motor
+    order = random.sample(players, len(players))
+    t = random.uniform(100, 130)
+    out = []
+    for p in order:
+        out.append({**p, "time_ms": int(t * 1000)})
+        t += random.uniform(0.1, 2.5)
+    return out
+
+
+async def think(mean: float):
+    if mean > 0:
+        await asyncio.sleep(random.expovariate(1 / mean))
+
+
+async def console(i: int, cli: httpx.AsyncClient, stats: Stats, args, run_id: str, deadline: float,
+                  race_sim):
+    """Um S1 virtual: cadastra, loga, sincroniza o catálogo e joga até o fim."""
+    await asyncio.sleep(args.ramp * i / max(1, args.consoles))
+    email, pwd = f"load-{run_id}-{i}@loadgen-mk.com", "loadgen-pw"
+    name = f"Load {i}"
+    if await stats.timed("signup", cli.post("/auth/signup", json={"name": name, "email": email,
+                                                                   "password": pwd})) is None:
+        return
+    r = await stats.timed("login", cli.post("/auth/login", json={"email": email, "password": pwd}))
+    if r is None:
+        return
+    user = r.json()
+    uid, headers = user["user_id"], {"Authorization": f"Bearer {user['token']}"}
+
+    r = await stats.timed("catalog", cli.get("/db1/catalog/delta", params={"since": 0, "format": "compact"}))
+    if r is None:
+        return
+    data = r.json()
+    catalog = decode_items(data["items"], data.get("fields"))
+
+    races = 0
+    while time.monotonic() < deadline and (not args.races or races < args.races):
+        await think(args.think)
+        online = random.random() >= args.local_ratio
+        players = [{"id": uid, "name": name, **pick_random_build(catalog)}]
+        if online:
+            r = await stats.timed("opponents", cli.get("/rdb/users", params={"limit": 7}, headers=headers))
+            for u in (r.json() if r is not None else [])[:7]:
+                players.append({"id": u["id"], "name": u["name"], **pick_random_build(catalog)})
+        while len(players) < 8:
+            players.append({"id": f"bot-{len(players)}", "name": f"Bot {len(players)}",
+                            **pick_random_build(catalog)})
+        track = escolha_pista_aleatoria(catalog)
+        payload = _payload_from_results("online" if online else "local", track, await race_sim(players, track))
+        body = {"mode": payload["mode"], "track": {"name": payload["track_name"]},
+                "players": payload["players"], "race_id": str(uuid.uuid4()),
+                "finished_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+        await stats.timed("race_finish", cli.post("/race/finish", params={"ingest": args.ingest},
+                                                   json=body, headers=headers))
+        races += 1
+
+
+async def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default=os.getenv("S2_API", "http://localhost:8000"))
+    ap.add_argument("--consoles", type=int, default=100, help="consoles S1 simultâneos")
+    ap.add_argument("--duration", type=float, default=60, help="segundos de jogo (após o ramp)")
+    ap.add_argument("--races", type=int, default=0, help="corridas por console (0 = até o fim do tempo)")
+    ap.add_argument("--think", type=float, default=1.0, help="tempo médio de 'pensar' entre corridas (s)")
+    ap.add_argument("--ramp", type=float, default=10, help="segundos para ligar todos os consoles")
+    ap.add_argument("--local-ratio", type=float, default=0.0, help="fração de corridas locais (sem /rdb/users)")
+    ap.add_argument("--ingest", choices=["sync", "async"], default="async")
+    ap.add_argument("--timeout", type=float, default=30)
+    ap.add_argument("--race-sim", choices=["batch", "shuffle"], default="batch",
+                    help="batch = race_engine em lote numa thread; shuffle = ordem sorteada (sem custo)")
+    ap.add_argument("--sim-window", type=float, default=0.02, help="janela de agrupamento do modo batch (s)")
+    args = ap.parse_args()
+
+    run_id = uuid.uuid4().hex[:8]
+    stats = Stats()
+    race_sim = RaceBatcher(args.sim_window).simulate if args.race_sim == "batch" else shuffle_race
+    limits = httpx.Limits(max_connections=args.consoles, max_keepalive_connections=args.consoles)
+    print(f"== {args.consoles} consoles contra {args.url} (run {run_id}, ingest={args.ingest}) ==")
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as cli:
+        t0 = time.perf_counter()
+        deadline = time.monotonic() + args.ramp + args.duration
+        await asyncio.gather(*(console(i, cli, stats, args, run_id, deadline, race_sim)
+                               for i in range(args.consoles)))
+        wall = time.perf_counter() - t0
+    print(f"Tempo total: {wall:.1f}s")
+    stats.report(wall)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""
+Reenvia um journal do S1 (journal.py) contra uma instância da S2.
+
+Mantém o espaçamento original entre as requisições, dividido por --speed
+(2 = duas vezes mais rápido; 0 = o mais rápido possível), com até
+--concurrency requisições em voo. Ao final compara os status com os
+originais e mostra latências por rota.
+
+O journal não guarda senhas nem tokens (ficam "***"), então /auth/signup e
+/auth/login reenviados não reproduzem o status original; para as rotas
+autenticadas use --token (ou --include para deixar /auth/ de fora).
+
+    python replay.py journal/ --target http://localhost:8000 --speed 10
+    python replay.py journal/ --target http://staging:8000 --speed 0 --token <jwt>
+"""
+import argparse, re, statistics, sys, threading, time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from journal import iter_records
+
+
+def _retarget(url: str, target: str) -> str:
+    t, u = urlsplit(target), urlsplit(url)
+    return urlunsplit((t.scheme, t.netloc, t.path.rstrip("/") + u.path, u.query, ""))
+
+
+def _route(url: str) -> str:
+    return urlsplit(url).path
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("journal", help="arquivo .mkj ou diretório do journal")
+    ap.add_argument("--target", required=True, help="URL base da S2 que vai receber o tráfego")
+    ap.add_argument("--speed", type=float, default=1.0, help="fator de aceleração (0 = sem espera)")
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--token", default=None, help="Bearer usado nas rotas autenticadas")
+    ap.add_argument("--include", default=None, help="regex de rotas a reenviar (ex.: '^/race/')")
+    args = ap.parse_args()
+
+    include = re.compile(args.include) if args.include else None
+    records = [r for r in iter_records(args.journal)
+               if "status" in r and (include is None or include.search(_route(r["url"])))]
+    if not records:
+        print("Nada para reenviar.")
+        return
+    records.sort(key=lambda r: r["ts"])
+
+    sess = requests.Session()
+    sess.mount("http://", HTTPAdapter(pool_maxsize=args.concurrency))
+    sess.mount("https://", HTTPAdapter(pool_maxsize=args.concurrency))
+    auth = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+
+    lock = threading.Lock()
+    lat = defaultdict(list)
+    same = diff = errors = 0
+
+    def send(rec):
+        nonlocal same, diff, errors
+        headers = {**rec.get("req_headers", {}), **auth}
+        body = rec.get("req_body")
+        t0 = time.perf_counter()
+        try:
+            r = sess.request(rec["method"], _retarget(rec["url"], args.target),
+                             data=body.encode() if body is not None else None,
+                             headers=headers, timeout=30)
+            status = r.status_code
+        except Exception:
+            status = None
+        dt = time.perf_counter() - t0
+        with lock:
+            lat[f"{rec['method']} {_route(rec['url'])}"].append(dt)
+            if status is None:
+                errors += 1
+            elif status == rec["status"]:
+                same += 1
+            else:
+                diff += 1
+
+    print(f"== Replay de {len(records)} requisição(ões) em {args.target} (speed={args.speed}) ==")
+    t_first, t0 = records[0]["ts"], time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for rec in records:
+            if args.speed > 0:
+                delay = (rec["ts"] - t_first) / args.speed - (time.perf_counter() - t0)
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(send, rec)
+    wall = time.perf_counter() - t0
+
+    print(f"Tempo total: {wall:.2f}s  ({len(records) / wall:.1f} req/s)")
+    print(f"Status igual ao original: {same}  diferente: {diff}  erro de conexão: {errors}")
+    for route, xs in sorted(lat.items()):
+        xs.sort()
+        p95 = xs[min(len(xs) - 1, int(len(xs) * 0.95))]
+        print(f"  {route:<28} n={len(xs):<6} p50={statistics.median(xs) * 1000:8.1f}ms  p95={p95 * 1000:8.1f}ms")
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,18 @@
-import os
-import requests
+import uuid
+from datetime import datetime, timezone
 
-API_BASE = os.getenv("S2_API", "http://localhost:8000")
+from s2_client import http
 
-def send_race_to_s2(mode: str, track_name: str, players: list[dict]) -> str | None:
+def send_race_to_s2(mode: str, track_name: str, players: list[dict], token: str | None = None) -> dict | None:
     """
-    Envia o resultado da corrida para o S2 (/race/finish), que grava no Neo4j.
+    Envia o resultado da corrida para o S2 (/race/finish), que grava no RDB e no Neo4j.
+
+    Usa a ingestão assíncrona (ingest=async): a S2 grava o resultado num outbox
+    durável e responde 202 na hora, mesmo com os bancos lentos ou fora do ar; a
+    gravação de fato acontece depois, pelo flusher do outbox.
+
+    Devolve {"race_id": ..., "queued": bool} (queued=True no 202: só enfileirada)
+    ou None se a S2 recusou/não respondeu.
 
     players: lista de dicts como:
       {
@@ -18,25 +25,31 @@ def send_race_to_s2(mode: str, track_name: str, players: list[dict]) -> str | No
         "position": 1,
         "stats": {"peso_total": 6, "velocidade": 7, "aceleracao": 0}
       }
+
+    token: token de sessão do /auth/login (enviado como Bearer).
+
+    race_id e finished_at saem daqui: se a S2 receber o mesmo payload de novo
+    (reenvio depois de erro/timeout), a corrida não é gravada duas vezes.
     """
     payload = {
         "mode": mode,
         "track": {"name": track_name},
-        "players": players
+        "players": players,
+        "race_id": str(uuid.uuid4()),
+        "finished_at": datetime.now(timezone.utc).isoformat(),
     }
     try:
-        r = requests.post(f"{API_BASE}/race/finish", json=payload, timeout=10)
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        r = http.post("/race/finish", params={"ingest": "async"}, json=payload, headers=headers)
         if r.ok:
-            data = r.json()
-            rid = data.get("race_id")
-            print(f"[S1] Neo4j OK: race_id={rid}")
-            return rid
+            # 202 = aceita no outbox; 200 = a S2 respondeu de forma síncrona (já gravada)
+            return {"race_id": r.json().get("race_id"), "queued": r.status_code == 202}
         else:
-            print(f"[S1] Falha ao salvar no Neo4j: {r.status_code} {r.text}")
+            print(f"[S1] S2 recusou a corrida: {r.status_code} {r.text}")
     except Exception as e:
         print(f"[S1] Erro ao contatar S2: {e}")
     return None
-def report_race_to_neo4j(mode: str, track_name: str, results: list[dict]) -> str | None:
+def report_race_to_neo4j(mode: str, track_name: str, results: list[dict], token: str | None = None) -> dict | None:
     players = []
     for r in results:
         players.append({
@@ -54,4 +67,4 @@ def report_race_to_neo4j(mode: str, track_name: str, results: list[dict]) -> str
             },
         })
     from s1_report import send_race_to_s2
-    return send_race_to_s2(mode=mode, track_name=track_name, players=players)
+    return send_race_to_s2(mode=mode, track_name=track_name, players=players, token=token)
@@ -0,0 +1,233 @@
+"""
+Cliente HTTP único do S1 para falar com o S2.
+
+- keep-alive: uma requests.Session com pool de conexões por host
+  (HTTP_POOL_SIZE), em vez de uma conexão TCP nova por chamada;
+- gzip: respostas já vêm comprimidas (Accept-Encoding); corpos de requisição
+  a partir de HTTP_GZIP_MIN bytes são enviados com Content-Encoding: gzip;
+- retry: até HTTP_RETRIES tentativas com backoff exponencial + jitter, só para
+  métodos idempotentes (GET/PUT/DELETE...) em 502/503/504/erro de leitura, e
+  para qualquer método quando a conexão nem chegou a abrir. Retry-After é
+  respeitado;
+- timeout padrão (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT) quando a chamada
+  não passa um;
+- latência por rota (contagem, erros, retries, p50/p95/máx), impressa pelo
+  menu com `http.stats.print_table()`;
+- Server-Timing: o S2 diz quanto da resposta foi pg/mongo/neo4j/app; a tabela
+  mostra o p50 de cada parte ao lado da latência do cliente, e a sobra
+  (cliente - servidor) é rede + fila + parse. Com HTTP_LOG_SLOW_MS > 0 cada
+  chamada mais lenta que isso é impressa com a divisão completa.
+
+URLs relativas ("/auth/login") são resolvidas contra config.S2_API. Cada
+chamada lógica também vai para o journal (ver journal.py), com o corpo
+original; `python s2_client.py --check-journal` confere isso.
+"""
+import gzip, re, sys, threading, time
+from collections import deque
+from typing import Optional
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import config
+from journal import Journal, JournaledSession
+
+STATUS_RETRY = (502, 503, 504)
+SAMPLES_PER_ROUTE = 1000
+SERVER_PARTS = ("pg", "mongo", "neo4j", "app")
+_TIMING_ENTRY = re.compile(r'\s*([\w-]+)(?:;[^,]*?dur=([\d.]+))?[^,]*')
+
+
+def parse_server_timing(value: str) -> dict[str, float]:
+    """'pg;dur=3.1;desc="1x", total;dur=9.0' -> {"pg": 3.1, "total": 9.0} (ms)."""
+    out = {}
+    for entry in (value or "").split(","):
+        m = _TIMING_ENTRY.match(entry)
+        if m and m.group(2):
+            out[m.group(1)] = out.get(m.group(1), 0.0) + float(m.group(2))
+    return out
+
+
+class GzipAdapter(HTTPAdapter):
+    """Comprime o corpo da requisição na camada de transporte (depois do journal)."""
+
+    def __init__(self, min_size: int, **kw):
+        self.min_size = min_size
+        super().__init__(**kw)
+
+    def send(self, request, **kwargs):
+        body = request.body
+        if self.min_size and body and "Content-Encoding" not in request.headers:
+            if isinstance(body, str):
+                body = body.encode("utf-8")
+            if isinstance(body, bytes) and len(body) >= self.min_size:
+                # comprime uma cópia: o journal lê request.body/headers depois do envio
+                # e precisa do JSON original
+                request = request.copy()
+                request.body = gzip.compress(body, compresslevel=5)
+                request.headers["Content-Encoding"] = "gzip"
+                request.headers["Content-Length"] = str(len(request.body))
+        return super().send(request, **kwargs)
+
+
+class LatencyStats:
+    """Latências por "MÉTODO /rota" (últimas SAMPLES_PER_ROUTE chamadas)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: dict[str, dict] = {}
+
+    def record(self, key: str, seconds: float, ok: bool, retries: int,
+               server: Optional[dict] = None):
+        """`server` = Server-Timing da resposta já em ms (ver parse_server_timing)."""
+        with self._lock:
+            r = self._routes.get(key)
+            if r is None:
+                r = self._routes[key] = {"n": 0, "errors": 0, "retries": 0,
+                                         "samples": deque(maxlen=SAMPLES_PER_ROUTE), "server": {}}
+            r["n"] += 1
+            r["errors"] += 0 if ok else 1
+            r["retries"] += retries
+            r["samples"].append(seconds)
+            if server and "total" in server:
+                server = {**server, "net": max(0.0, seconds * 1000 - server["total"])}
+                for part, ms in server.items():
+                    r["server"].setdefault(part, deque(maxlen=SAMPLES_PER_ROUTE)).append(ms)
+
+    def summary(self) -> list[dict]:
+        with self._lock:
+            routes = {k: (v["n"], v["errors"], v["retries"], sorted(v["samples"]),
+                          {p: sorted(xs) for p, xs in v["server"].items()})
+                      for k, v in self._routes.items()}
+        out = []
+        p50 = lambda xs: xs[len(xs) // 2] if xs else None
+        for key, (n, errors, retries, xs, server) in sorted(routes.items()):
+            pick = lambda q: xs[min(len(xs) - 1, int(len(xs) * q))] * 1000
+            row = {"route": key, "n": n, "errors": errors, "retries": retries,
+                   "p50_ms": pick(0.50), "p95_ms": pick(0.95), "max_ms": xs[-1] * 1000}
+            if server:
+                # p50 de cada parte separadamente (não somam exatamente o p50 do cliente)
+                row["server_p50_ms"] = p50(server.get("total"))
+                row["net_p50_ms"] = p50(server.get("net"))
+                row.update({f"{p}_p50_ms": p50(server.get(p)) for p in SERVER_PARTS})
+            out.append(row)
+        return out
+
+    def print_table(self):
+        rows = self.summary()
+        if not rows:
+            print("Nenhuma chamada ao S2 ainda.")
+            return
+        ms = lambda v: f"{v:>7.1f}ms" if v is not None else f"{'-':>9}"
+        print(f"{'rota':<30} {'n':>5} {'erros':>6} {'retry':>6} {'p50':>9} {'p95':>9} {'máx':>9}"
+              f" | {'servidor':>9} {'pg':>9} {'mongo':>9} {'neo4j':>9} {'app':>9} {'rede':>9}")
+        for r in rows:
+            print(f"{r['route']:<30} {r['n']:>5} {r['errors']:>6} {r['retries']:>6} "
+                  f"{r['p50_ms']:>7.1f}ms {r['p95_ms']:>7.1f}ms {r['max_ms']:>7.1f}ms | "
+                  + " ".join(ms(r.get(k)) for k in ("server_p50_ms", "pg_p50_ms", "mongo_p50_ms",
+                                                    "neo4j_p50_ms", "app_p50_ms", "net_p50_ms")))
+        print("(colunas após | : p50 do Server-Timing do S2; rede = cliente - servidor)")
+
+
+def format_breakdown(key: str, seconds: float, server: dict) -> str:
+    """Uma linha: latência do cliente e a divisão que o S2 mandou no Server-Timing."""
+    line = f"[s2] {key} {seconds * 1000:.1f}ms"
+    if "total" not in server:
+        return line + " (sem Server-Timing)"
+    parts = ", ".join(f"{p} {server[p]:.1f}" for p in SERVER_PARTS if p in server)
+    return (line + f" | servidor {server['total']:.1f}ms: {parts}"
+            f" | rede+cliente {max(0.0, seconds * 1000 - server['total']):.1f}ms")
+
+
+class S2Client(JournaledSession):
+    def __init__(self, base_url: str, journal=None):
+        super().__init__(journal)
+        self.base_url = base_url
+        self.timeout = (config.HTTP_CONNECT_TIMEOUT, config.HTTP_READ_TIMEOUT)
+        self.stats = LatencyStats()
+        retry = Retry(
+            total=config.HTTP_RETRIES,
+            status_forcelist=STATUS_RETRY,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,  # só idempotentes
+            backoff_factor=config.HTTP_BACKOFF,
+            backoff_jitter=config.HTTP_BACKOFF_JITTER,
+            backoff_max=config.HTTP_BACKOFF_MAX,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = GzipAdapter(config.HTTP_GZIP_MIN, pool_connections=4,
+                              pool_maxsize=config.HTTP_POOL_SIZE, max_retries=retry)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        if url.startswith("/"):
+            url = self.base_url + url
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, *args, **kwargs)
+
+    def send(self, request, **kwargs):
+        key = f"{request.method} {urlsplit(request.url).path}"
+        t0 = time.perf_counter()
+        try:
+            resp = super().send(request, **kwargs)
+        except Exception:
+            self.stats.record(key, time.perf_counter() - t0, False, 0)
+            raise
+        elapsed = time.perf_counter() - t0
+        retries = getattr(getattr(resp.raw, "retries", None), "history", ()) or ()
+        server = parse_server_timing(resp.headers.get("Server-Timing"))
+        self.stats.record(key, elapsed, resp.status_code < 500, len(retries), server)
+        if config.HTTP_LOG_SLOW_MS and elapsed * 1000 >= config.HTTP_LOG_SLOW_MS:
+            print(format_breakdown(key, elapsed, server))
+        return resp
+
+
+# cliente compartilhado pelo S1 (Main.py, s1_report.py, catalog_cache.py)
+http = S2Client(config.S2_API, Journal.from_config())
+
+
+def check_journal_roundtrip(size: int = 64 * 1024) -> None:
+    """POST grande (comprimido no transporte) contra um servidor local: o journal
+    tem que devolver o JSON original, sem Content-Encoding."""
+    import json, tempfile
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from journal import iter_records
+
+    class Echo(BaseHTTPRequestHandler):
+        def do_POST(self):
+            raw = self.rfile.read(int(self.headers["Content-Length"]))
+            if self.headers.get("Content-Encoding") == "gzip":
+                raw = gzip.decompress(raw)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def log_message(self, *a):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Echo)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    payload = {"track": "Mario Circuit", "players": [{"name": f"P{i}", "pad": "x" * (size // 8)}
+                                                      for i in range(8)]}
+    with tempfile.TemporaryDirectory() as d:
+        journal = Journal(d)
+        cli = S2Client(f"http://127.0.0.1:{srv.server_address[1]}", journal)
+        r = cli.post("/race/finish", json=payload)
+        journal.close()
+        srv.shutdown()
+        assert r.json() == payload, "servidor recebeu corpo diferente"
+        (rec,) = list(iter_records(d))
+        assert json.loads(rec["req_body"]) == payload, "journal não guardou o JSON original"
+        assert "Content-Encoding" not in rec["req_headers"], rec["req_headers"]
+    print(f"journal ok: corpo de {len(json.dumps(payload))} bytes gravado sem gzip")
+
+
+if __name__ == "__main__":
+    if "--check-journal" in sys.argv:
+        check_journal_roundtrip()
+    else:
+        print("uso: python s2_client.py --check-journal")
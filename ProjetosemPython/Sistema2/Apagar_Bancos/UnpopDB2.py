@@ -27,6 +27,13 @@ def main():
             "MATCH (n:Wheel)     DETACH DELETE n",
             "MATCH (n:Glider)    DETACH DELETE n",
             "MATCH (n:Track)     DETACH DELETE n",
+            # agregados do race_stats.py e versão do schema (senão o v6 não refaz o backfill)
+            "MATCH ()-[u:USES]->() DELETE u",
+            "MATCH (n:Combo)     DETACH DELETE n",
+            "MATCH (n:SchemaVersion) DETACH DELETE n",
+            "MATCH (n) WHERE n:Character OR n:Kart OR n:Wheel OR n:Glider "
+            "REMOVE n.picks, n.wins, n.podiums, n.pos_sum",
+            "MATCH (n:Track)     REMOVE n.races, n.runners",
         ]
 
         for q in queries:
@@ -6,7 +6,10 @@ def main():
         raise RuntimeError("PG_DSN não definido no .env")
     with psycopg.connect(DSN) as conn, conn.cursor() as cur:
         cur.execute("DROP TABLE IF EXISTS consoles CASCADE;")
+        cur.execute("DROP TABLE IF EXISTS race_results, races, player_totals, ratings CASCADE;")
         cur.execute("DROP TABLE IF EXISTS usuarios CASCADE;")
+        # sem isso o schema.py acha que as migrações já rodaram e não recria as tabelas
+        cur.execute("DROP TABLE IF EXISTS schema_version;")
         conn.commit()
     print("Postgres (RDB): tudo removido.")
 
@@ -0,0 +1,62 @@
+"""
+Compara a S2 assíncrona com os handlers síncronos antigos.
+
+Os dois servidores precisam estar rodando. Para subir a versão síncrona
+(handlers `def` no threadpool do Starlette) numa porta separada:
+
+    git worktree add /tmp/s2-sync <commit anterior a user-002>
+    cd /tmp/s2-sync/ProjetosemPython/Sistema2 && uvicorn api:app --port 8001
+
+e a versão atual:
+
+    uvicorn api:app --port 8000
+
+Depois:
+
+    python Benchmarks/bench_async.py --url http://localhost:8000 \\
+        --baseline-url http://localhost:8001 --concurrency 10,100,1000,3000
+"""
+import argparse, asyncio
+
+import httpx
+
+from common import auth_headers, print_row, race_payload, run_load
+
+
+async def bench_target(label: str, base_url: str, endpoint: str, total: int, levels: list[int],
+                       token: str | None = None):
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120,
+                                 headers=auth_headers(token)) as cli:
+        for c in levels:
+            if endpoint == "finish":
+                async def call():
+                    r = await cli.post("/race/finish", json=race_payload())
+                    return r.status_code < 400
+            else:
+                async def call():
+                    r = await cli.get("/db1/catalog")
+                    return r.status_code < 400
+            r = await run_load(call, total=max(total, c), concurrency=c)
+            print_row(f"{label} {endpoint}", r)
+
+
+async def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default="http://localhost:8000", help="S2 assíncrona")
+    ap.add_argument("--baseline-url", default=None, help="S2 síncrona (opcional)")
+    ap.add_argument("--endpoint", choices=["finish", "catalog"], default="finish")
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--concurrency", default="10,100,1000")
+    ap.add_argument("--token", default=None, help="token de /auth/login (rotas autenticadas)")
+    args = ap.parse_args()
+    levels = [int(x) for x in args.concurrency.split(",") if x]
+
+    print(f"== Benchmark /{args.endpoint}: {args.requests} req por nível ==")
+    if args.baseline_url:
+        await bench_target("sync ", args.baseline_url, args.endpoint, args.requests, levels)
+    await bench_target("async", args.url, args.endpoint, args.requests, levels, args.token)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,46 @@
+"""
+Logins/s por núcleo para cada custo de scrypt (verificação = 1 login).
+
+Roda local, sem S2 nem banco: mede a verificação sozinha (1 thread = 1 núcleo)
+e com o pool de PWD_HASH_WORKERS threads, para mostrar a escala com núcleos.
+
+    python Benchmarks/bench_hash.py --costs 12,14,15,16 --seconds 3
+"""
+import argparse, os, sys, time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import passwords
+
+
+def _verify_for(stored: str, seconds: float) -> int:
+    n, t_end = 0, time.perf_counter() + seconds
+    while time.perf_counter() < t_end:
+        passwords.verify_password("senha-de-teste", stored)
+        n += 1
+    return n
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--costs", default="12,13,14,15,16", help="log2(N) a testar")
+    ap.add_argument("--r", type=int, default=8)
+    ap.add_argument("--p", type=int, default=1)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--seconds", type=float, default=3.0)
+    args = ap.parse_args()
+
+    print(f"== scrypt r={args.r} p={args.p}, {args.workers} worker(s), {os.cpu_count()} núcleo(s) ==")
+    print(f"{'N':>8} {'ms/login':>10} {'login/s/núcleo':>15} {'login/s total':>14}")
+    for log_n in (int(x) for x in args.costs.split(",") if x):
+        n = 2 ** log_n
+        stored = passwords.hash_password("senha-de-teste", n, args.r, args.p)
+        single = _verify_for(stored, args.seconds) / args.seconds
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            total = sum(pool.map(_verify_for, [stored] * args.workers,
+                                 [args.seconds] * args.workers)) / args.seconds
+        print(f"{'2^' + str(log_n):>8} {1000 / single:>10.1f} {single:>15.1f} {total:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
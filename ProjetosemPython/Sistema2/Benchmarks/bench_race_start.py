@@ -0,0 +1,72 @@
+"""
+Registro de um grid de 8 corredores: 8 x POST /race/start contra 1 x POST /race/start/batch.
+
+Cada "grid" é uma unidade de trabalho; o benchmark mede latência por grid e
+grids/s em cada nível de concorrência. Com --baseline-url dá para incluir uma
+S2 anterior (16 round trips por /race/start) rodando em outra porta.
+
+    python Benchmarks/bench_race_start.py --url http://localhost:8000 --grids 500 --concurrency 1,10,50
+"""
+import argparse, asyncio, random, uuid
+
+import httpx
+
+from common import (CHARACTERS, GLIDERS, KARTS, TRACKS, WHEELS, auth_headers, print_row,
+                    run_load, token_user_id)
+
+
+def _entry(user_id: str | None = None) -> dict:
+    return {"user_id": user_id or str(uuid.uuid4()),
+            "character": random.choice(CHARACTERS), "kart": random.choice(KARTS),
+            "wheel": random.choice(WHEELS), "glider": random.choice(GLIDERS)}
+
+
+async def bench(label: str, base_url: str, mode: str, grids: int, levels: list[int],
+                token: str | None = None):
+    limits = httpx.Limits(max_connections=max(levels) * 8)
+    # /race/start exige user_id == dono do token; /race/start/batch, o dono no grid
+    me = token_user_id(token)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120,
+                                 headers=auth_headers(token)) as cli:
+        async def per_runner():
+            track = random.choice(TRACKS)
+            for _ in range(8):
+                e = _entry(me)
+                sel = {k: e[k] for k in ("character", "kart", "wheel", "glider")}
+                r = await cli.post("/race/start", json={"user_id": e["user_id"],
+                                                        "selection": {**sel, "track": track}})
+                if r.status_code >= 400:
+                    return False
+            return True
+
+        async def batch():
+            r = await cli.post("/race/start/batch",
+                               json={"track": random.choice(TRACKS),
+                                     "runners": [_entry(me)] + [_entry() for _ in range(7)]})
+            return r.status_code < 400
+
+        call = batch if mode == "batch" else per_runner
+        for c in levels:
+            r = await run_load(call, total=max(grids, c), concurrency=c)
+            print_row(f"{label} {mode} (grids)", r)
+
+
+async def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default="http://localhost:8000")
+    ap.add_argument("--baseline-url", default=None, help="S2 anterior, só /race/start (opcional)")
+    ap.add_argument("--grids", type=int, default=200)
+    ap.add_argument("--concurrency", default="1,10,50")
+    ap.add_argument("--token", default=None, help="token de /auth/login (rotas autenticadas)")
+    args = ap.parse_args()
+    levels = [int(x) for x in args.concurrency.split(",") if x]
+
+    print(f"== Grid de 8 corredores: {args.grids} grids por nível ==")
+    if args.baseline_url:
+        await bench("antes", args.baseline_url, "8x-start", args.grids, levels)
+    await bench("atual", args.url, "8x-start", args.grids, levels, args.token)
+    await bench("atual", args.url, "batch", args.grids, levels, args.token)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
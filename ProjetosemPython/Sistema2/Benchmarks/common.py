@@ -0,0 +1,84 @@
+"""Utilitários compartilhados pelos benchmarks da S2."""
+import asyncio, base64, json, random, statistics, time, uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+CHARACTERS = ["Mario", "Luigi", "Peach", "Bowser", "Yoshi", "Toad", "Donkey Kong", "Wario"]
+KARTS      = ["Standard Kart", "Pipe Frame", "Mach 8", "Steel Driver", "Cat Cruiser",
+              "Circuit Special", "Prancer", "Biddybuggy"]
+WHEELS     = ["Standard", "Slick", "Roller", "Azure Roller", "Monster", "Cyber Slick",
+              "Off-Road", "Gold Tires"]
+GLIDERS    = ["Super Glider", "Paraglider", "Wario Wing", "Cloud Glider", "Peach Parasol",
+              "Bowser Kite", "Parachute", "Plane Glider"]
+TRACKS     = ["Mario Kart Stadium", "Water Park", "Sweet Sweet Canyon", "Thwomp Ruins",
+              "Mario Circuit", "Toad Harbor", "Twisted Mansion", "Shy Guy Falls"]
+
+
+def auth_headers(token: Optional[str]) -> Dict[str, str]:
+    """Header Bearer para as rotas autenticadas (token de /auth/login)."""
+    return {"Authorization": f"Bearer {token}"} if token else {}
+
+
+def token_user_id(token: Optional[str]) -> Optional[str]:
+    """`sub` do token (sem validar assinatura; só para montar requests)."""
+    if not token:
+        return None
+    body = token.split(".")[1]
+    return json.loads(base64.urlsafe_b64decode(body + "=" * (-len(body) % 4)))["sub"]
+
+
+def race_payload(mode: str = "online", n_players: int = 8) -> dict:
+    """Payload sintético no formato de RaceFinishPayload."""
+    players = []
+    for pos in range(1, n_players + 1):
+        players.append({
+            "id": str(uuid.uuid4()) if pos == 1 else f"bot-{pos}",
+            "name": f"Bench {pos}",
+            "character": {"name": random.choice(CHARACTERS)},
+            "kart": {"name": random.choice(KARTS)},
+            "wheel": {"name": random.choice(WHEELS)},
+            "glider": {"name": random.choice(GLIDERS)},
+            "position": pos,
+            "stats": {"peso_total": random.randint(3, 9),
+                      "velocidade": random.randint(3, 10),
+                      "aceleracao": random.randint(3, 10)},
+        })
+    return {"mode": mode, "track": {"name": random.choice(TRACKS)}, "players": players}
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 (em ms) de uma lista de latências em segundos."""
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    qs = statistics.quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else samples * 99
+    return {"p50": qs[49] * 1000, "p95": qs[94] * 1000, "p99": qs[98] * 1000}
+
+
+async def run_load(call: Callable[[], Awaitable[bool]], total: int, concurrency: int) -> dict:
+    """Dispara `total` chamadas com no máximo `concurrency` em voo; devolve vazão e latências."""
+    sem = asyncio.Semaphore(concurrency)
+    lat: List[float] = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                ok = await call()
+            except Exception:
+                ok = False
+            lat.append(time.perf_counter() - t0)
+            if not ok:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    wall = time.perf_counter() - t0
+    return {"total": total, "concurrency": concurrency, "errors": errors,
+            "rps": total / wall if wall else 0.0, **percentiles(lat)}
+
+
+def print_row(label: str, r: dict):
+    print(f"{label:<28} c={r['concurrency']:<5} n={r['total']:<6} "
+          f"{r['rps']:>9.1f} req/s  p50={r['p50']:>8.1f}ms  p95={r['p95']:>8.1f}ms  "
+          f"p99={r['p99']:>8.1f}ms  erros={r['errors']}")
@@ -0,0 +1,44 @@
+"""
+Importa usuários em massa no Postgres (RDB) via COPY.
+
+    python Popular_Bancos/ImportRDB.py usuarios.ndjson
+    python Popular_Bancos/ImportRDB.py contas.csv.gz --format csv
+    cat usuarios.ndjson | python Popular_Bancos/ImportRDB.py -
+
+O formato é deduzido da extensão (.csv / .ndjson / .jsonl, com ou sem .gz)
+quando --format não é informado. Mesma lógica do POST /rdb/users/import.
+"""
+import argparse, gzip, io, os, sys, psycopg
+
+# bulk_import.py fica em Sistema2/ (um nível acima)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bulk_import
+
+PG_DSN = os.getenv("PG_DSN")
+
+def _open(path: str):
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("arquivo", help="caminho do arquivo ou - para stdin")
+    ap.add_argument("--format", choices=["ndjson", "csv"], default=None)
+    args = ap.parse_args()
+    if not PG_DSN:
+        raise RuntimeError("PG_DSN não definido")
+
+    fmt = args.format or ("csv" if args.arquivo.removesuffix(".gz").endswith(".csv") else "ndjson")
+    with _open(args.arquivo) as f, psycopg.connect(PG_DSN) as conn:
+        rep = bulk_import.import_users(conn, f, fmt)
+
+    print(f"Postgres (RDB): {rep['inserted']} usuário(s) importado(s) de {rep['received']} linha(s).")
+    print(f"  conflitos com contas existentes: {rep['conflicts']}")
+    print(f"  duplicados no próprio arquivo:   {rep['duplicates_in_file']}")
+    print(f"  linhas inválidas:                {rep['invalid']}")
+
+if __name__ == "__main__":
+    main()
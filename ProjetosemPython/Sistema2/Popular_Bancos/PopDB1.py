@@ -1,6 +1,10 @@
-import os
+import os, sys
 from pymongo import MongoClient
 
+# schema.py e catalog.py ficam em Sistema2/ (um nível acima)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import schema, catalog
+
 MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DB  = os.getenv("MONGO_DB", "kart_db1")
 
@@ -61,11 +65,20 @@ def main():
     if not MONGO_URI: raise RuntimeError("MONGO_URI não definido")
     cli = MongoClient(MONGO_URI)
     db = cli[MONGO_DB]
+    schema.apply_mongo(db)  # índices únicos por nome
+    changed = {}
     for col, items in DATA.items():
         c = db[col]
-        c.create_index("name", unique=True)
-        for it in items:
-            c.update_one({"name": it["name"]}, {"$setOnInsert": it}, upsert=True)
+        for raw in items:
+            it = catalog.normalize_item(col, raw)  # schema canônico (validador do Mongo)
+            res = c.update_one({"name": it["name"]}, {"$setOnInsert": it}, upsert=True)
+            if res.upserted_id is not None:
+                changed.setdefault(col, []).append(it["name"])
+    if changed:
+        # invalida o cache de catálogo da S2 e entra no delta dos clientes
+        v = catalog.record_changes(db, changed)
+        n = sum(len(names) for names in changed.values())
+        print(f"Mongo: catálogo na versão {v['version']} ({n} item(ns) novo(s)).")
     print(f"Mongo: populado/atualizado em '{MONGO_DB}' com 8 itens por coleção.")
 if __name__ == "__main__":
     main()
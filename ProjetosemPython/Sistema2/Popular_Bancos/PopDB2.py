@@ -1,7 +1,11 @@
-import os
+import os, sys
 import uuid
 from neo4j import GraphDatabase
 
+# schema.py fica em Sistema2/ (um nível acima)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import schema
+
 # Mesmo esquema do api.py
 NEO4J_URI  = os.getenv("NEO4J_URI")
 NEO4J_AUTH = (os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD"))
@@ -47,14 +51,8 @@ def main():
     print("== Neo4j (DB2): populando corridas de exemplo ==")
 
     with neo4j_session() as s:
-        # Mesmos constraints usados em /race/start
-        s.run("CREATE CONSTRAINT IF NOT EXISTS FOR (n:Runner)   REQUIRE n.runner_id IS UNIQUE").consume()
-        s.run("CREATE CONSTRAINT IF NOT EXISTS FOR (n:Race)     REQUIRE n.race_id IS UNIQUE").consume()
-        s.run("CREATE CONSTRAINT IF NOT EXISTS FOR (n:Character) REQUIRE n.name IS UNIQUE").consume()
-        s.run("CREATE CONSTRAINT IF NOT EXISTS FOR (n:Kart)      REQUIRE n.name IS UNIQUE").consume()
-        s.run("CREATE CONSTRAINT IF NOT EXISTS FOR (n:Wheel)     REQUIRE n.name IS UNIQUE").consume()
-        s.run("CREATE CONSTRAINT IF NOT EXISTS FOR (n:Glider)    REQUIRE n.name IS UNIQUE").consume()
-        s.run("CREATE CONSTRAINT IF NOT EXISTS FOR (n:Track)     REQUIRE n.name IS UNIQUE").consume()
+        # Mesmos constraints usados pela API (versionados no schema.py)
+        schema.apply_neo4j(s)
 
         for seed in RACE_SEEDS:
             sel = seed["selection"]
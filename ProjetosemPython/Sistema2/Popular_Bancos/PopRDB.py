@@ -1,33 +1,18 @@
-import os, psycopg
+import os, sys, psycopg
 from typing import cast
 
+# schema.py fica em Sistema2/ (um nível acima)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import schema
+
 PG_DSN = cast(str, os.getenv("PG_DSN"))  # garante para o type checker
 
 def main():
-    with psycopg.connect(PG_DSN) as conn, conn.cursor() as cur:
-        # tabela com senha (plaintext)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS usuarios (
-                id UUID PRIMARY KEY,
-                nome TEXT NOT NULL,
-                email TEXT NOT NULL,
-                senha TEXT NOT NULL,
-                criado_em TIMESTAMP DEFAULT NOW()
-            );
-        """)
-        # índice único em email
-        cur.execute("""
-            DO $$
-            BEGIN
-              IF NOT EXISTS (
-                SELECT 1 FROM pg_indexes
-                WHERE schemaname='public' AND indexname='usuarios_email_key'
-              ) THEN
-                CREATE UNIQUE INDEX usuarios_email_key ON usuarios(email);
-              END IF;
-            END$$;
-        """)
+    with psycopg.connect(PG_DSN) as conn:
+        # tabela usuarios + índice único em email (versionados no schema.py)
+        schema.apply_pg(conn)
 
+    with psycopg.connect(PG_DSN) as conn, conn.cursor() as cur:
         # seeds idempotentes (senha texto puro)
         cur.execute("""
             INSERT INTO usuarios (id, nome, email, senha)
@@ -1,34 +1,178 @@
 from typing import Any, Dict, List, Optional
-import os, uuid, hashlib
-from datetime import datetime
-from fastapi import FastAPI, APIRouter, HTTPException
-from pydantic import BaseModel, EmailStr
+import os, uuid, hashlib, asyncio, random, codecs, hmac
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Depends, Header, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic import BaseModel, EmailStr, Field
 import psycopg
-from pymongo import MongoClient
-from neo4j import GraphDatabase
-
-app = FastAPI(title="MK S2 API", version="1.0")
-
-# ---- Conexões (do .env) ----
-PG_DSN    = os.getenv("PG_DSN")
-MONGO_URI = os.getenv("MONGO_URI")
-MONGO_DB  = os.getenv("MONGO_DB","kart_db1")
-NEO4J_URI = os.getenv("NEO4J_URI")
-NEO4J_AUTH= (os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD"))
-NEO4J_DB  = os.getenv("NEO4J_DATABASE","neo4j")
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from pymongo import AsyncMongoClient
+from neo4j import AsyncGraphDatabase
+
+import config
+import schema
+import catalog as catalog_mod
+import passwords
+import tokens
+import bulk_import
+import builds
+import race_results
+import race_stats
+import ratings
+import matchmaking
+import health as health_mod
+import metrics
+import server_timing
+from outbox import Outbox
+from compression import GzipRequestMiddleware
+
+# ---- Conexões (do .env, via config.py) ----
+PG_DSN    = config.PG_DSN
+MONGO_URI = config.MONGO_URI
+MONGO_DB  = config.MONGO_DB
+NEO4J_URI = config.NEO4J_URI
+NEO4J_AUTH= (config.NEO4J_USER, config.NEO4J_PASSWORD)
+NEO4J_DB  = config.NEO4J_DATABASE
+
+# ---- Pools (criados uma vez no lifespan, fechados no shutdown) ----
+_pg_pool: Optional[AsyncConnectionPool] = None
+_mongo_client: Optional[AsyncMongoClient] = None
+_neo4j_driver = None
+_outbox: Optional[Outbox] = None
+_outbox_task: Optional[asyncio.Task] = None
+_mongo_pool_counter = health_mod.MongoPoolCounter()
+_mongo_command_timer = server_timing.MongoCommandTimer()
+_lobby = matchmaking.Lobby.from_config()
+_lobby_task: Optional[asyncio.Task] = None
+
+async def open_pools():
+    global _pg_pool, _mongo_client, _neo4j_driver
+    if PG_DSN:
+        _pg_pool = AsyncConnectionPool(PG_DSN, min_size=config.PG_POOL_MIN, max_size=config.PG_POOL_MAX,
+                                       timeout=config.PG_POOL_TIMEOUT, open=False, name="s2-pg")
+        await _pg_pool.open(wait=False)
+    if MONGO_URI:
+        _mongo_client = AsyncMongoClient(MONGO_URI, minPoolSize=config.MONGO_POOL_MIN,
+                                         maxPoolSize=config.MONGO_POOL_MAX,
+                                         event_listeners=[_mongo_pool_counter, _mongo_command_timer])
+    if NEO4J_URI and all(NEO4J_AUTH):
+        _neo4j_driver = AsyncGraphDatabase.driver(NEO4J_URI, auth=NEO4J_AUTH,
+                                                  max_connection_pool_size=config.NEO4J_POOL_MAX,
+                                                  connection_acquisition_timeout=config.NEO4J_ACQUIRE_TIMEOUT)
+
+async def close_pools():
+    global _pg_pool, _mongo_client, _neo4j_driver
+    if _pg_pool is not None:
+        await _pg_pool.close()
+    if _mongo_client is not None:
+        await _mongo_client.close()
+    if _neo4j_driver is not None:
+        await _neo4j_driver.close()
+    _pg_pool = _mongo_client = _neo4j_driver = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if config.SCHEMA_AUTO_APPLY:
+        # DDL roda uma vez aqui (ou via `python schema.py`), nunca no caminho quente
+        await asyncio.to_thread(schema.apply_all)
+    _hasher.open()
+    await open_pools()
+    await ensure_race_partitions()
+    start_outbox()
+    start_lobby()
+    try:
+        yield
+    finally:
+        await stop_lobby()
+        await stop_outbox()
+        await close_pools()
+        _hasher.shutdown()
+
+app = FastAPI(title="MK S2 API", version="1.0", lifespan=lifespan)
+if config.SERVER_TIMING:
+    # mais interno: o corpo JSON ainda não passou pelo gzip quando o "_timing" entra
+    app.add_middleware(server_timing.ServerTimingMiddleware, debug_allowed=config.SERVER_TIMING_DEBUG)
+# respostas grandes (catálogo, listas) saem com gzip; corpos gzip do S1 são aceitos
+app.add_middleware(GZipMiddleware, minimum_size=config.GZIP_MIN_SIZE)
+app.add_middleware(GzipRequestMiddleware, max_bytes=config.GZIP_MAX_REQUEST_BYTES)
+# por último = mais externo: a latência inclui gzip e validação
+app.add_middleware(metrics.MetricsMiddleware)
 
 # ---- Helpers ----
-def hash_pwd(p: str) -> str:
-    return p
-
+# scrypt roda num pool próprio de threads (aberto/fechado no lifespan); custo e
+# tamanho do pool vêm do config
+_hasher = passwords.Hasher(workers=config.PWD_HASH_WORKERS, n=config.PWD_SCRYPT_N,
+                           r=config.PWD_SCRYPT_R, p=config.PWD_SCRYPT_P,
+                           max_pending=config.PWD_HASH_MAX_PENDING)
+
+# sessão: token assinado + revogações e perfis em memória (sem ida ao Postgres)
+_revoked = tokens.Revocations()
+_profiles = tokens.ProfileCache(max_size=config.PROFILE_CACHE_SIZE)
+
+def _issue_session(uid: str, name: str, email: str) -> Dict[str, Any]:
+    token, claims = tokens.issue(config.JWT_SECRET, uid, name, email, config.TOKEN_TTL)
+    _profiles.put({"user_id": uid, "name": name, "email": email})
+    return {"token": token, "token_type": "bearer", "expires_at": claims["exp"]}
+
+async def current_user(authorization: Optional[str] = Header(default=None)) -> Optional[Dict[str, Any]]:
+    """Dependência de auth: valida o Bearer token só com HMAC + caches em memória."""
+    if not authorization:
+        if config.AUTH_REQUIRED:
+            raise HTTPException(401, "Token ausente", headers={"WWW-Authenticate": "Bearer"})
+        return None
+    scheme, _, tok = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not tok:
+        raise HTTPException(401, "Esquema de autenticação inválido", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        claims = tokens.decode(config.JWT_SECRET, tok)
+    except tokens.InvalidToken as e:
+        raise HTTPException(401, f"Token inválido: {e}", headers={"WWW-Authenticate": "Bearer"})
+    if _revoked.is_revoked(claims["jti"]):
+        raise HTTPException(401, "Token revogado", headers={"WWW-Authenticate": "Bearer"})
+    profile = _profiles.get(claims["sub"]) or {
+        "user_id": claims["sub"], "name": claims.get("name"), "email": claims.get("email")}
+    return {**profile, "jti": claims["jti"], "exp": claims["exp"]}
+
+def _is_admin(x_admin_key: Optional[str]) -> bool:
+    return bool(config.ADMIN_KEY and x_admin_key and hmac.compare_digest(x_admin_key, config.ADMIN_KEY))
+
+async def require_admin(x_admin_key: Optional[str] = Header(default=None)):
+    """Rotas administrativas: exigem X-Admin-Key == ADMIN_KEY (desligadas se ADMIN_KEY vazio)."""
+    if not _is_admin(x_admin_key):
+        raise HTTPException(403, "Acesso administrativo negado")
+
+# Os três helpers alimentam o Server-Timing da requisição (server_timing.py):
+# pg e neo4j pelo tempo com a conexão/sessão, mongo pelo listener de comandos.
 def pg_conn():
-    return psycopg.connect(PG_DSN)
+    """Empresta uma conexão do pool (devolvida ao sair do `async with`)."""
+    if _pg_pool is None:
+        raise RuntimeError("Pool do Postgres não inicializado (PG_DSN ausente?).")
+    return server_timing.timed("pg", _pg_pool.connection())
 
 def mongo_db():
-    return MongoClient(MONGO_URI)[MONGO_DB]
+    if _mongo_client is None:
+        raise RuntimeError("Cliente Mongo não inicializado (MONGO_URI ausente?).")
+    return _mongo_client[MONGO_DB]
 
 def neo4j_session():
-    return GraphDatabase.driver(NEO4J_URI, auth=NEO4J_AUTH).session(database=NEO4J_DB)
+    if _neo4j_driver is None:
+        raise RuntimeError("Variáveis NEO4J_URI/USER/PASSWORD ausentes no ambiente do container.")
+    return server_timing.timed("neo4j", _neo4j_driver.session(database=NEO4J_DB))
+
+def pool_stats() -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    out["pg"] = _pg_pool.get_stats() if _pg_pool is not None else None
+    if _mongo_client is not None:
+        po = _mongo_client.options.pool_options
+        out["mongo"] = {"min_pool_size": po.min_pool_size, "max_pool_size": po.max_pool_size}
+    else:
+        out["mongo"] = None
+    out["neo4j"] = ({"max_connection_pool_size": config.NEO4J_POOL_MAX,
+                     "connection_acquisition_timeout": config.NEO4J_ACQUIRE_TIMEOUT}
+                    if _neo4j_driver is not None else None)
+    return out
 
 # ---- Models ----
 class SignUp(BaseModel):
@@ -51,149 +195,221 @@ class StartRace(BaseModel):
     user_id: str
     selection: Selection
 
+class GridEntry(BaseModel):
+    user_id: str
+    character: str
+    kart: str
+    wheel: str
+    glider: str
+
+class StartRaceBatch(BaseModel):
+    track: str
+    runners: List[GridEntry] = Field(min_length=1, max_length=8)  # ordem = posição no grid
+
 # ---- Endpoints ----
+# Probes leves pelos pools; rodam juntos, com prazo, e o resultado fica em cache.
+async def _probe_pg():
+    async with pg_conn() as conn, conn.cursor() as cur:
+        await cur.execute("SELECT 1")
+
+async def _probe_mongo():
+    await mongo_db().command("ping")
+
+async def _probe_neo4j():
+    async with neo4j_session() as s:
+        await (await s.run("RETURN 1")).consume()
+
+_health = health_mod.HealthCheck(
+    probes={"pg": _probe_pg, "mongo": _probe_mongo, "neo4j": _probe_neo4j},
+    usage={
+        "pg": lambda: health_mod.pg_pool_usage(_pg_pool),
+        "mongo": lambda: (health_mod.mongo_pool_usage(_mongo_pool_counter, config.MONGO_POOL_MAX)
+                          if _mongo_client is not None else None),
+        "neo4j": lambda: (health_mod.neo4j_pool_usage(_neo4j_driver, config.NEO4J_POOL_MAX)
+                          if _neo4j_driver is not None else None),
+    },
+    timeout=config.HEALTH_TIMEOUT, ttl=config.HEALTH_CACHE_TTL,
+)
+
 @app.get("/health")
-def health():
-    # PG
-    try:
-        with pg_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT version()")
-                pg_ok = True
-    except Exception as e:
-        pg_ok = False
-    # Mongo
-    try:
-        mongo_db().command("ping")
-        mg_ok = True
-    except Exception:
-        mg_ok = False
-    # Neo4j
-    try:
-        with neo4j_session() as s:
-            s.run("RETURN 1").consume()
-            n4j_ok = True
-    except Exception:
-        n4j_ok = False
-    return {"pg": pg_ok, "mongo": mg_ok, "neo4j": n4j_ok}
+async def health(strict: bool = Query(False, description="503 se algum banco estiver fora")):
+    """Estado, latência e ocupação do pool de cada banco (cache de HEALTH_CACHE_TTL s)."""
+    res = await _health.get()
+    if strict and res["status"] != "ok":
+        return JSONResponse(res, status_code=503)
+    return res
+
+@app.get("/health/pools")
+async def health_pools():
+    return pool_stats()
 
 # --- Auth: SignUp ---
 @app.post("/auth/signup")
-def signup(p: SignUp):
+async def signup(p: SignUp):
     uid = str(uuid.uuid4())
     now = datetime.utcnow()
+    senha = await _hasher.hash(p.password)  # antes de pegar conexão do pool
     try:
-        with pg_conn() as conn, conn.cursor() as cur:
-            cur.execute("""
+        async with metrics.backend("pg", "signup_insert"), pg_conn() as conn, conn.cursor() as cur:
+            await cur.execute("""
                 INSERT INTO usuarios (id, nome, email, senha, criado_em)
                 VALUES (%s, %s, %s, %s, %s)
-            """, (uid, p.name, p.email, hash_pwd(p.password), now))
-            conn.commit()
+            """, (uid, p.name, p.email, senha, now))
+            await conn.commit()
     except psycopg.errors.UniqueViolation:
         raise HTTPException(409, "E-mail já cadastrado")
     except Exception as e:
         raise HTTPException(500, f"Erro no cadastro: {e}")
-    return {"ok": True, "user_id": uid, "name": p.name, "email": p.email}
+    return {"ok": True, "user_id": uid, "name": p.name, "email": p.email,
+            **_issue_session(uid, p.name, p.email)}
 
 # --- Auth: Login ---
 @app.post("/auth/login")
-def login(p: Login):
-    with pg_conn() as conn, conn.cursor() as cur:
-        cur.execute("SELECT id, nome, senha FROM usuarios WHERE email=%s", (p.email,))
-        row = cur.fetchone()
-        if not row:
-            raise HTTPException(401, "Usuário não encontrado")
-        uid, name, stored = row
-        if stored != hash_pwd(p.password):
-            raise HTTPException(401, "Senha incorreta")
-        return {"ok": True, "user_id": str(uid), "name": name, "email": p.email}
+async def login(p: Login):
+    async with metrics.backend("pg", "login_select"), pg_conn() as conn, conn.cursor() as cur:
+        await cur.execute("SELECT id, nome, senha FROM usuarios WHERE email=%s", (p.email,))
+        row = await cur.fetchone()
+    if not row:
+        raise HTTPException(401, "Usuário não encontrado")
+    uid, name, stored = row
+    # verificação fora do `async with`: a conexão volta ao pool antes do scrypt
+    if not await _hasher.verify(p.password, stored):
+        raise HTTPException(401, "Senha incorreta")
+    if _hasher.needs_rehash(stored):
+        # senha legada (texto puro) ou custo antigo: regrava com os parâmetros atuais
+        novo = await _hasher.hash(p.password)
+        async with metrics.backend("pg", "login_rehash"), pg_conn() as conn, conn.cursor() as cur:
+            await cur.execute("UPDATE usuarios SET senha=%s WHERE id=%s AND senha=%s",
+                              (novo, uid, stored))
+            await conn.commit()
+    return {"ok": True, "user_id": str(uid), "name": name, "email": p.email,
+            **_issue_session(str(uid), name, p.email)}
+
+# --- Auth: Logout (revoga o token atual) ---
+@app.post("/auth/logout")
+async def logout(user: Optional[Dict[str, Any]] = Depends(current_user)):
+    if user:
+        _revoked.revoke(user["jti"], user["exp"])
+    return {"ok": True}
 
 # --- Catálogo (DB1) ---
+_catalog_cache = catalog_mod.CatalogCache(ttl=config.CATALOG_CACHE_TTL)
+
 @app.get("/db1/catalog")
-def catalog():
-    db = mongo_db()
-    out = {}
-    for col in ["characters","karts","wheels","gliders","tracks"]:
-        out[col] = list(db[col].find({}, {"_id":0}).limit(100))
-    return out
+async def catalog(request: Request):
+    body, etag = await _catalog_cache.get(mongo_db())
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if catalog_mod.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+@app.get("/db1/catalog/delta")
+async def catalog_delta(since: int = Query(0, ge=0), epoch: Optional[str] = None,
+                        format: str = Query("full", pattern="^(full|compact)$")):
+    """Só o que mudou desde `since` (ver catalog.delta); since=0 traz tudo.
+    format=compact manda cada item como linha [name, weight, speed, accel]."""
+    with metrics.backend("mongo", "catalog_delta"):
+        return await catalog_mod.delta(mongo_db(), epoch, since, compact=format == "compact")
+
+_builds = builds.BuildIndexCache(max_builds=config.BUILDS_MAX)
+
+@app.get("/db1/builds")
+async def list_builds(
+    max_weight: Optional[int] = Query(None, description="peso_total máximo"),
+    min_speed: Optional[int] = Query(None, description="velocidade mínima"),
+    min_accel: Optional[int] = Query(None, description="aceleração mínima"),
+    character: Optional[str] = None, kart: Optional[str] = None,
+    wheel: Optional[str] = None, glider: Optional[str] = None,
+    sort: str = Query("velocidade", pattern="^(velocidade|aceleracao|peso_total)$"),
+    limit: int = Query(20, ge=1, le=500),
+):
+    """Consulta o índice de builds (ex.: mais rápidas com peso_total <= N)."""
+    body, etag = await _catalog_cache.get(mongo_db())
+    try:
+        idx = _builds.get(body, etag)
+    except builds.TooManyBuilds as e:
+        raise HTTPException(503, f"Catálogo grande demais para o índice de builds: {e}")
+    fixed = {"characters": character, "karts": kart, "wheels": wheel, "gliders": glider}
+    matched, items = idx.query(max_weight, min_speed, min_accel, fixed, sort, limit)
+    return {"catalog": etag.strip('"'), "total_builds": idx.size, "matched": matched, "builds": items}
 
 # --- Iniciar corrida (DB2) ---
-@app.post("/race/start")
-def start_race(p: StartRace):
-    # cria runner + corrida + posição=1 (demo single player)
-    with neo4j_session() as s:
-        # constraints básicos
-        s.run("CREATE CONSTRAINT IF NOT EXISTS FOR (n:Runner)   REQUIRE n.runner_id IS UNIQUE").consume()
-        s.run("CREATE CONSTRAINT IF NOT EXISTS FOR (n:Race)     REQUIRE n.race_id IS UNIQUE").consume()
-        s.run("CREATE CONSTRAINT IF NOT EXISTS FOR (n:Character) REQUIRE n.name IS UNIQUE").consume()
-        s.run("CREATE CONSTRAINT IF NOT EXISTS FOR (n:Kart)      REQUIRE n.name IS UNIQUE").consume()
-        s.run("CREATE CONSTRAINT IF NOT EXISTS FOR (n:Wheel)     REQUIRE n.name IS UNIQUE").consume()
-        s.run("CREATE CONSTRAINT IF NOT EXISTS FOR (n:Glider)    REQUIRE n.name IS UNIQUE").consume()
-        s.run("CREATE CONSTRAINT IF NOT EXISTS FOR (n:Track)     REQUIRE n.name IS UNIQUE").consume()
-
-        # garante catálogo do nó (idempotente)
-        for lbl, val in [("Character", p.selection.character),
-                         ("Kart",      p.selection.kart),
-                         ("Wheel",     p.selection.wheel),
-                         ("Glider",    p.selection.glider),
-                         ("Track",     p.selection.track)]:
-            s.run(f"MERGE (n:{lbl} {{name:$name}})", name=val).consume()
-
-        runner_id = str(uuid.uuid4())
-        race_id   = str(uuid.uuid4())
-
-        # cria runner e vínculos
-        s.run("""
-MERGE (u:Runner {runner_id:$runner_id})
-  ON CREATE SET u.user_id=$user_id
-  ON MATCH SET  u.user_id=$user_id
-WITH u
-MATCH (c:Character {name:$character})
-MATCH (k:Kart      {name:$kart})
-MATCH (w:Wheel     {name:$wheel})
-MATCH (g:Glider    {name:$glider})
-MERGE (u)-[:CHOSE_CHARACTER]->(c)
-MERGE (u)-[:CHOSE_KART]->(k)
-MERGE (u)-[:CHOSE_WHEEL]->(w)
-MERGE (u)-[:CHOSE_GLIDER]->(g)
-""", runner_id=runner_id, user_id=p.user_id,
-     character=p.selection.character, kart=p.selection.kart,
-     wheel=p.selection.wheel, glider=p.selection.glider).consume()
-
-        # cria corrida e posição
-        s.run("""
-MERGE (r:Race {race_id:$race_id})
+# Um único statement parametrizado cria corrida, runners, escolhas e posições;
+# roda numa transação de escrita gerenciada (tudo ou nada, com retry do driver).
+REGISTER_GRID_CYPHER = """
+MERGE (t:Track {name:$track})
+CREATE (r:Race {race_id:$race_id})
+CREATE (r)-[:ON_TRACK]->(t)
 WITH r
-MATCH (t:Track {name:$track})
-MERGE (r)-[:ON_TRACK]->(t)
-""", race_id=race_id, track=p.selection.track).consume()
-
-        s.run("""
-MATCH (u:Runner {runner_id:$runner_id})
-MATCH (r:Race {race_id:$race_id})
-MERGE (pos:Position {race_id:$race_id, runner_id:$runner_id})
-  ON CREATE SET pos.place = 1
-MERGE (pos)-[:OF_RUNNER]->(u)
-MERGE (pos)-[:IN_RACE]->(r)
-MERGE (u)-[:PARTICIPATED_IN]->(r)
-""", runner_id=runner_id, race_id=race_id).consume()
+UNWIND $runners AS row
+MERGE (c:Character {name:row.character})
+MERGE (k:Kart      {name:row.kart})
+MERGE (w:Wheel     {name:row.wheel})
+MERGE (g:Glider    {name:row.glider})
+CREATE (u:Runner {runner_id:row.runner_id, user_id:row.user_id})
+CREATE (u)-[:CHOSE_CHARACTER]->(c)
+CREATE (u)-[:CHOSE_KART]->(k)
+CREATE (u)-[:CHOSE_WHEEL]->(w)
+CREATE (u)-[:CHOSE_GLIDER]->(g)
+CREATE (pos:Position {race_id:$race_id, runner_id:row.runner_id, place:row.place})
+CREATE (pos)-[:OF_RUNNER]->(u)
+CREATE (pos)-[:IN_RACE]->(r)
+CREATE (u)-[:PARTICIPATED_IN]->(r)
+"""
+
+async def register_grid(track: str, runners: List[Dict[str, Any]]) -> str:
+    """Grava a corrida e todo o grid em uma transação. `runners` já traz runner_id e place."""
+    race_id = str(uuid.uuid4())
+
+    async def _tx(tx):
+        res = await tx.run(REGISTER_GRID_CYPHER, race_id=race_id, track=track, runners=runners)
+        await res.consume()
 
+    async with metrics.backend("neo4j", "register_grid"), neo4j_session() as s:
+        await s.execute_write(_tx)
+    return race_id
+
+@app.post("/race/start")
+async def start_race(p: StartRace, user: Optional[Dict[str, Any]] = Depends(current_user)):
+    if user and p.user_id != user["user_id"]:
+        raise HTTPException(403, "user_id não corresponde ao token")
+    # cria runner + corrida + posição=1 (demo single player)
+    runner_id = str(uuid.uuid4())
+    race_id = await register_grid(p.selection.track, [{
+        "runner_id": runner_id, "user_id": p.user_id, "place": 1,
+        "character": p.selection.character, "kart": p.selection.kart,
+        "wheel": p.selection.wheel, "glider": p.selection.glider,
+    }])
     return {"ok": True, "race_id": race_id, "runner_id": runner_id}
 
+@app.post("/race/start/batch")
+async def start_race_batch(p: StartRaceBatch, user: Optional[Dict[str, Any]] = Depends(current_user),
+                           x_admin_key: Optional[str] = Header(default=None)):
+    # grid completo (até 8 corredores) em um round trip; quem chama tem que estar
+    # no grid (o host registra a partida) ou ser admin
+    if user and not _is_admin(x_admin_key) and all(e.user_id != user["user_id"] for e in p.runners):
+        raise HTTPException(403, "O usuário do token não está no grid")
+    runners = [{"runner_id": str(uuid.uuid4()), "place": i, **e.model_dump()}
+               for i, e in enumerate(p.runners, start=1)]
+    race_id = await register_grid(p.track, runners)
+    return {"ok": True, "race_id": race_id,
+            "runners": [{"user_id": r["user_id"], "runner_id": r["runner_id"], "place": r["place"]}
+                        for r in runners]}
+
 
 from fastapi import APIRouter
 rdb_router = APIRouter()
 
 @rdb_router.get("/rdb/users")
-def list_users():
-    with psycopg.connect(PG_DSN) as conn, conn.cursor() as cur:
-        cur.execute("""
+async def list_users():
+    async with metrics.backend("pg", "list_users_recent"), pg_conn() as conn, conn.cursor() as cur:
+        await cur.execute("""
             SELECT id::text, nome, email, to_char(criado_em,'YYYY-MM-DD HH24:MI')
             FROM usuarios
             ORDER BY criado_em DESC
             LIMIT 200
         """)
-        rows = cur.fetchall()
+        rows = await cur.fetchall()
     return [{"id": r[0], "name": r[1], "email": r[2], "created_at": r[3]} for r in rows]
 
 
@@ -202,29 +418,56 @@ from typing import Optional
 from fastapi import Query
 import os, psycopg
 
+# Amostra de adversários com custo ~constante no tamanho da tabela: cada ponto
+# aleatório vira uma busca no índice de rand_key (LIMIT 1). Se faltar gente
+# (tabela pequena / pontos caindo depois da última chave), completa com as
+# primeiras linhas do índice.
+SAMPLE_OPPONENTS_SQL = """
+WITH cand AS (
+    SELECT u.id, u.nome, u.email, u.criado_em, 0 AS pri
+    FROM unnest(%(pts)s::float8[]) AS pt
+    CROSS JOIN LATERAL (
+        SELECT id, nome, email, criado_em FROM usuarios
+        WHERE rand_key >= pt AND id IS DISTINCT FROM %(ex)s::uuid
+        ORDER BY rand_key
+        LIMIT 1
+    ) u
+    UNION ALL
+    (SELECT id, nome, email, criado_em, 1 AS pri FROM usuarios
+     WHERE id IS DISTINCT FROM %(ex)s::uuid
+     ORDER BY rand_key
+     LIMIT %(n)s)
+), uniq AS (
+    SELECT DISTINCT ON (id) id, nome, email, criado_em, pri FROM cand ORDER BY id, pri
+)
+SELECT id::text, nome, email, to_char(criado_em,'YYYY-MM-DD HH24:MI')
+FROM uniq
+ORDER BY pri, random()
+LIMIT %(n)s
+"""
+
+def _as_uuid(v: Optional[str]) -> Optional[str]:
+    try:
+        return str(uuid.UUID(v)) if v else None
+    except ValueError:
+        return None  # ids de bot/"you" não existem em usuarios
+
 @app.get("/rdb/users")
-def list_users(
+async def list_users(
     exclude_id: Optional[str] = Query(default=None),
     limit: int = Query(default=200, ge=1, le=500),
+    user: Optional[Dict[str, Any]] = Depends(current_user),
 ):
-    where = ""
-    params = [limit]
-    if exclude_id:
-        where = "WHERE id::text <> %s"
-        params = [exclude_id, limit]
-
-    sql = f"""
-        SELECT id::text, nome, email, to_char(criado_em,'YYYY-MM-DD HH24:MI')
-        FROM usuarios
-        {where}
-        ORDER BY RANDOM()
-        LIMIT %s
-    """
-
-    dsn = os.getenv("PG_DSN")
-    with psycopg.connect(dsn) as conn, conn.cursor() as cur:
-        cur.execute(sql, params)
-        rows = cur.fetchall()
+    if exclude_id is None and user:
+        exclude_id = user["user_id"]  # por padrão não sorteia o próprio jogador
+    params = {
+        "pts": [random.random() for _ in range(2 * limit)],
+        "ex": _as_uuid(exclude_id),
+        "n": limit,
+    }
+    async with metrics.backend("pg", "list_users_opponents"), pg_conn() as conn, conn.cursor() as cur:
+        await cur.execute(SAMPLE_OPPONENTS_SQL, params)
+        rows = await cur.fetchall()
 
     return [
         {"id": r[0], "name": r[1], "email": r[2], "created_at": r[3]}
@@ -232,16 +475,39 @@ def list_users(
     ]
 
 
+async def _body_lines(request: Request):
+    """Corpo da requisição linha a linha, sem carregar tudo em memória."""
+    dec = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    async for chunk in request.stream():
+        buf += dec.decode(chunk)
+        *lines, buf = buf.split("\n")
+        for line in lines:
+            yield line
+    buf += dec.decode(b"", final=True)
+    if buf:
+        yield buf
+
+@app.post("/rdb/users/import", dependencies=[Depends(require_admin)])
+async def import_users(request: Request, format: Optional[str] = Query(default=None)):
+    # NDJSON ou CSV em stream -> COPY para staging -> merge deduplicado em usuarios
+    ctype = request.headers.get("content-type", "")
+    fmt = format or ("csv" if "csv" in ctype else "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        raise HTTPException(400, "format deve ser ndjson ou csv")
+    try:
+        async with metrics.backend("pg", "import_users"), pg_conn() as conn:
+            return {"ok": True, **await bulk_import.import_users_async(conn, _body_lines(request), fmt)}
+    except psycopg.Error as e:
+        raise HTTPException(500, f"Erro na importação: {e}")
+
 # ==== MODELOS PARA /race/finish ====
 class Part(BaseModel):
+    """Item do catálogo no schema canônico (ver catalog.FIELDS)."""
     name: str
-    Peso: Optional[int] | Optional[str] = None
-    Velocidade: Optional[int] = 0
-    Aceleracao: Optional[int] | None = None
-    # Aceita também keys minúsculas do Mongo
-    peso: Optional[int] | Optional[str] = None
-    speed: Optional[int] = None
-    acceleration: Optional[int] = None
+    weight: int = 0
+    speed: int = 0
+    accel: int = 0
 
 class RaceFinishPlayer(BaseModel):
     id: str
@@ -279,89 +545,474 @@ class RaceFinishPlayer(BaseModel):
     glider: dict
     position: int
     stats: dict = {}
+    time_ms: Optional[int] = None   # tempo de chegada (motor de corrida do S1)
 
 class RaceFinishPayload(BaseModel):
     mode: str                 # "local" ou "online"
     track: dict               # {"name": "..."}
     players: list[RaceFinishPlayer]
+    # carimbado pela S2 ao aceitar a corrida (e guardado no outbox), para que
+    # um reenvio caia na mesma partição/chave do RDB
+    finished_at: Optional[datetime] = None
+    # chave de idempotência gerada pelo cliente: reenviar o mesmo payload (mesmo
+    # race_id e finished_at) não grava a corrida de novo; exige finished_at
+    race_id: Optional[uuid.UUID] = None
+
+def _check_finished_at(payloads: List[RaceFinishPayload], backfill_days: float):
+    """422 para finished_at fora de [agora - backfill_days, agora + RACE_CLOCK_SKEW]:
+    datas livres criariam partições em qualquer mês e distorceriam os rankings."""
+    now = datetime.now(timezone.utc)
+    lo, hi = now - timedelta(days=backfill_days), now + timedelta(seconds=config.RACE_CLOCK_SKEW)
+    for i, p in enumerate(payloads):
+        ts = _utc(p.finished_at)
+        if ts is not None and not lo <= ts <= hi:
+            raise HTTPException(422, f"finished_at fora da janela aceita ({lo.isoformat()} .. "
+                                     f"{hi.isoformat()}) na corrida {i}")
+
+def _race_id(payload: RaceFinishPayload) -> str:
+    """race_id do cliente ou um novo. Sem finished_at o reenvio ganharia outro
+    carimbo e cairia em outra chave do RDB, então os dois vêm juntos."""
+    if payload.race_id is None:
+        return str(uuid.uuid4())
+    if payload.finished_at is None:
+        raise HTTPException(422, "race_id do cliente exige finished_at")
+    return str(payload.race_id)
+
+def _stamp(payload: RaceFinishPayload) -> RaceFinishPayload:
+    if payload.finished_at is None:
+        payload.finished_at = datetime.now(timezone.utc)
+    elif payload.finished_at.tzinfo is None:
+        payload.finished_at = payload.finished_at.replace(tzinfo=timezone.utc)
+    return payload
+
+# Uma corrida inteira (ou um lote delas) = um único statement com UNWIND.
+# Devolve só os race_id criados agora: um replay do outbox não recontabiliza
+# os agregados de race_stats.
+SAVE_RACES_CYPHER = """
+UNWIND $races AS race
+MERGE (t:Track {name: race.track})
+MERGE (r:Race {id: race.race_id})
+ON CREATE SET r.mode = race.mode, r.created_at = race.ts, r.track = race.track, r._new = true
+WITH r, race, r._new IS NOT NULL AS is_new
+REMOVE r._new
+WITH r, race, is_new
+UNWIND race.players AS pl
+MERGE (p:Person {id: pl.id})
+ON CREATE SET p.name = pl.name
+MERGE (p)-[res:RACED_IN]->(r)
+SET res.position   = pl.position,
+    res.character  = pl.character,
+    res.kart       = pl.kart,
+    res.wheel      = pl.wheel,
+    res.glider     = pl.glider,
+    res.peso_total = pl.peso_total,
+    res.velocidade = pl.velocidade,
+    res.aceleracao = pl.aceleracao,
+    res.time_ms    = pl.time_ms
+WITH DISTINCT race.race_id AS race_id, is_new
+WHERE is_new
+RETURN race_id
+"""
+
+def _race_row(race_id: str, payload_dict: dict, ts: str) -> dict:
+    """Achata o payload no formato de parâmetro esperado por SAVE_RACES_CYPHER."""
+    players = []
+    for pl in payload_dict.get("players", []):
+        stats = pl.get("stats") or {}
+        players.append({
+            "id": pl.get("id"),
+            "name": pl.get("name"),
+            "position": pl.get("position"),
+            "character": (pl.get("character") or {}).get("name"),
+            "kart": (pl.get("kart") or {}).get("name"),
+            "wheel": (pl.get("wheel") or {}).get("name"),
+            "glider": (pl.get("glider") or {}).get("name"),
+            "peso_total": stats.get("peso_total"),
+            "velocidade": stats.get("velocidade"),
+            "aceleracao": stats.get("aceleracao"),
+            "time_ms": pl.get("time_ms"),
+        })
+    return {
+        "race_id": race_id,
+        "mode": payload_dict.get("mode"),
+        "track": (payload_dict.get("track") or {}).get("name"),
+        "ts": ts,
+        "players": players,
+    }
+
+async def save_races_to_neo4j(races: list[tuple[str, "RaceFinishPayload"]]) -> None:
+    """Grava [(race_id, payload), ...] em uma transação de escrita."""
+    driver, db = get_neo4j()
+    rows = [_race_row(rid, p.model_dump(),
+                      p.finished_at.astimezone(timezone.utc).replace(tzinfo=None).isoformat())
+            for rid, p in races]
+
+    async def _tx(tx, rows):
+        res = await tx.run(SAVE_RACES_CYPHER, races=rows)
+        new = {rec["race_id"] async for rec in res}
+        # contadores de uso/vitórias na mesma transação: ou entra tudo ou nada
+        await race_stats.apply(tx, [r for r in rows if r["race_id"] in new])
+
+    async with metrics.backend("neo4j", "save_races"), driver.session(database=db) as s:
+        await s.execute_write(_tx, rows)
+
+async def save_race_to_neo4j(payload: "RaceFinishPayload", race_id: Optional[str] = None) -> str:
+    race_id = race_id or str(uuid.uuid4())
+    await save_races_to_neo4j([(race_id, payload)])
+    return race_id
 
-def save_race_to_neo4j(payload: "RaceFinishPayload") -> str:
-    import uuid, datetime
-    driver, db = get_neo4j()  # definido anteriormente no arquivo
-    race_id = str(uuid.uuid4())
-    ts = datetime.datetime.utcnow().isoformat()
-
-    def _tx(tx, race_id, payload_dict, ts):
-        # Garante nós Race e Track
-        tx.run(
-            """
-            MERGE (t:Track {name: $track})
-            MERGE (r:Race {id: $race_id})
-            ON CREATE SET r.mode = $mode, r.created_at = $ts, r.track = $track
-            """,
-            race_id=race_id,
-            mode=payload_dict.get("mode"),
-            track=(payload_dict.get("track") or {}).get("name"),
-            ts=ts,
-        )
-
-        # Cria/atualiza resultados por jogador
-        for pl in payload_dict.get("players", []):
-            pid = pl.get("id")
-            pname = pl.get("name")
-            pos = pl.get("position")
-            ch = (pl.get("character") or {}).get("name")
-            kart = (pl.get("kart") or {}).get("name")
-            wheel = (pl.get("wheel") or {}).get("name")
-            glider = (pl.get("glider") or {}).get("name")
-            stats = pl.get("stats") or {}
-            peso_total = stats.get("peso_total")
-            vel = stats.get("velocidade")
-            acc = stats.get("aceleracao")
-
-            tx.run(
-                """
-                MATCH (r:Race {id: $race_id})
-                MERGE (p:Person {id: $pid})
-                ON CREATE SET p.name = $pname
-                MERGE (p)-[res:RACED_IN]->(r)
-                SET res.position   = $pos,
-                    res.character  = $ch,
-                    res.kart       = $kart,
-                    res.wheel      = $wheel,
-                    res.glider     = $glider,
-                    res.peso_total = $peso_total,
-                    res.velocidade = $vel,
-                    res.aceleracao = $acc
-                """,
-                race_id=race_id, pid=pid, pname=pname, pos=pos,
-                ch=ch, kart=kart, wheel=wheel, glider=glider,
-                peso_total=peso_total, vel=vel, acc=acc
-            )
-
-    # >>> sessão correta (sem parênteses extras)
-    with driver.session(database=db) as s:
-        s.execute_write(_tx, race_id, payload.model_dump(), ts)
+_partitions = race_results.PartitionGuard()
+_rating_params = ratings.Params.from_config()
+_ratings = ratings.RatingCache(config.RATING_CACHE_SIZE, config.RATING_CACHE_TTL)
 
-    return race_id
+async def ensure_race_partitions():
+    """Cria a partição do mês atual e das próximas RACE_PARTITIONS_AHEAD (startup)."""
+    if _pg_pool is None:
+        return
+    try:
+        async with pg_conn() as conn:
+            created = await _partitions.ensure_ahead(conn, config.RACE_PARTITIONS_AHEAD)
+            await conn.commit()
+        if created:
+            print(f"[race_results] {created} partições criadas")
+    except Exception as e:
+        # sem a migração v7 (ou PG fora do ar); a gravação tenta de novo por mês
+        print(f"[race_results] partições não verificadas no startup: {e}")
+
+async def save_races_to_pg(races: list[tuple[str, "RaceFinishPayload"]]) -> None:
+    """Grava o lote em races/race_results/player_totals com um único INSERT e
+    atualiza o rating dos participantes das corridas novas na mesma transação."""
+    batch = [(rid, p.model_dump(), p.finished_at) for rid, p in races]
+    async with metrics.backend("pg", "save_races"), pg_conn() as conn:
+        # partição de um mês novo (virada do mês, backfill) antes da escrita, commitada à parte
+        if await _partitions.ensure(conn, [ts for _, _, ts in batch]):
+            await conn.commit()
+        async with conn.cursor() as cur:
+            await cur.execute(race_results.INSERT_SQL, race_results.batch_params(batch))
+            new = {row[0] for row in await cur.fetchall()}
+            updated = await ratings.apply(cur, [r for r in batch if r[0] in new], _rating_params)
+        await conn.commit()
+    for uid, (rating, n) in updated.items():
+        _ratings.put(uid, rating, n)
+
+async def record_races(races: list[tuple[str, "RaceFinishPayload"]]) -> None:
+    """Tudo que uma corrida terminada grava; usado pelo caminho síncrono e pelo outbox.
+
+    As duas escritas são idempotentes por race_id (e finished_at no RDB): se uma
+    falhar, o reenvio pelo outbox não duplica a outra. Um reenvio do cliente
+    (falha ou resposta perdida) só é seguro com race_id e finished_at próprios
+    no payload; sem eles cada requisição vira uma corrida nova."""
+    races = [(rid, _stamp(p)) for rid, p in races]
+    await asyncio.gather(save_races_to_pg(races), save_races_to_neo4j(races))
+
+# --- Outbox (ingestão assíncrona de /race/finish) ---
+async def _flush_outbox(items: list[tuple[str, str]]):
+    await record_races([(rid, RaceFinishPayload.model_validate_json(p)) for rid, p in items])
+
+def start_outbox():
+    global _outbox, _outbox_task
+    from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
+    _outbox = Outbox(config.OUTBOX_PATH, batch_size=config.OUTBOX_BATCH,
+                     base_backoff=config.OUTBOX_BACKOFF, max_backoff=config.OUTBOX_MAX_BACKOFF,
+                     max_attempts=config.OUTBOX_MAX_ATTEMPTS,
+                     # o flush grava no PG e no Neo4j: queda de qualquer um só adia
+                     transient_errors=(ServiceUnavailable, SessionExpired, TransientError,
+                                       psycopg.OperationalError, PoolTimeout,
+                                       RuntimeError, OSError))
+    # o que ficou no arquivo de uma execução anterior é drenado aqui (replay)
+    _outbox_task = asyncio.create_task(_outbox.run(_flush_outbox))
+
+async def stop_outbox():
+    global _outbox, _outbox_task
+    if _outbox_task is not None:
+        _outbox_task.cancel()
+        try:
+            await _outbox_task
+        except asyncio.CancelledError:
+            pass
+    if _outbox is not None:
+        _outbox.close()
+    _outbox = _outbox_task = None
 
 @app.post("/race/finish")
-def race_finish(payload: RaceFinishPayload):
+async def race_finish(payload: RaceFinishPayload,
+                      ingest: str = Query(default=config.RACE_INGEST_DEFAULT, pattern="^(sync|async)$"),
+                      user: Optional[Dict[str, Any]] = Depends(current_user)):
+    _check_finished_at([payload], config.RACE_BACKFILL_DAYS)
+    race_id = _race_id(payload)
+    _stamp(payload)
+    if ingest == "async":
+        # grava no outbox local (durável) e responde 202; o flusher leva ao Neo4j
+        await _outbox.append(race_id, payload.model_dump_json())
+        return JSONResponse({"ok": True, "race_id": race_id, "queued": True}, status_code=202)
     try:
-        race_id = save_race_to_neo4j(payload)
+        await record_races([(race_id, payload)])
         return {"ok": True, "race_id": race_id}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao salvar corrida no Neo4j: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro ao salvar corrida: {e}")
+
+@app.get("/race/outbox")
+async def race_outbox():
+    # profundidade da fila e atraso do item mais antigo
+    return await asyncio.to_thread(_outbox.stats)
+
+class OutboxRequeue(BaseModel):
+    race_ids: Optional[List[str]] = None   # None = todo o dead-letter
+
+@app.post("/race/outbox/requeue", dependencies=[Depends(require_admin)])
+async def race_outbox_requeue(body: OutboxRequeue):
+    # devolve itens do outbox_dead para a fila depois de corrigida a causa
+    return {"ok": True, "requeued": await _outbox.requeue(body.race_ids)}
+
+@app.post("/race/finish/batch")
+async def race_finish_batch(payloads: List[RaceFinishPayload],
+                            user: Optional[Dict[str, Any]] = Depends(current_user),
+                            x_admin_key: Optional[str] = Header(default=None)):
+    # backfill / torneios: várias corridas, gravadas em transações de RACE_FINISH_CHUNK corridas
+    if len(payloads) > config.RACE_FINISH_BATCH_MAX:
+        raise HTTPException(413, f"Máximo de {config.RACE_FINISH_BATCH_MAX} corridas por lote")
+    # backfill de histórico antigo só com a chave de admin
+    _check_finished_at(payloads, config.RACE_BACKFILL_ADMIN_DAYS if _is_admin(x_admin_key)
+                       else config.RACE_BACKFILL_DAYS)
+    races = [(_race_id(p), _stamp(p)) for p in payloads]
+    saved: list[str] = []
+    for i in range(0, len(races), config.RACE_FINISH_CHUNK):
+        chunk = races[i:i + config.RACE_FINISH_CHUNK]
+        try:
+            await record_races(chunk)
+        except Exception as e:
+            # lotes anteriores já foram commitados; devolve o que foi salvo
+            raise HTTPException(status_code=500, detail={
+                "error": f"Erro ao salvar corridas: {e}",
+                "saved": len(saved), "race_ids": saved,
+            })
+        saved.extend(rid for rid, _ in chunk)
+    return {"ok": True, "saved": len(saved), "race_ids": saved}
+
+# --- Estatísticas agregadas (DB2) ---
+# Leem só os contadores mantidos por race_stats.apply: custo proporcional ao
+# catálogo, não ao número de corridas.
+STATS_SORT = "^(picks|wins|podiums|win_rate|avg_position)$"
+
+async def _read_stats(op: str, cypher: str, **params) -> list[dict]:
+    async with metrics.backend("neo4j", op), neo4j_session() as s:
+        res = await s.run(cypher, **params)
+        return [rec.data() async for rec in res]
+
+@app.get("/stats/parts/{kind}")
+async def stats_parts(kind: str, sort: str = Query("picks", pattern=STATS_SORT),
+                      limit: int = Query(20, ge=1, le=500)):
+    """Uso e vitórias por peça: kind = characters, karts, wheels ou gliders."""
+    slot = race_stats.KIND_TO_SLOT.get(kind)
+    if slot is None:
+        raise HTTPException(404, f"Tipo desconhecido: {kind}")
+    cypher = race_stats.PART_STATS_CYPHER.format(label=race_stats.PART_LABELS[slot],
+                                                 order=race_stats.SORTS[sort])
+    return {"kind": kind, "sort": sort, "items": await _read_stats("stats_parts", cypher, limit=limit)}
+
+@app.get("/stats/tracks")
+async def stats_tracks(limit: int = Query(50, ge=1, le=500)):
+    return {"items": await _read_stats("stats_tracks", race_stats.TRACK_STATS_CYPHER, limit=limit)}
+
+@app.get("/stats/combos")
+async def stats_combos(sort: str = Query("picks", pattern=STATS_SORT),
+                       min_picks: int = Query(1, ge=1, description="ignora combos com menos usos"),
+                       limit: int = Query(20, ge=1, le=500)):
+    """Combinações personagem+kart+roda+glider mais usadas / que mais vencem."""
+    cypher = race_stats.COMBO_STATS_CYPHER.format(order=race_stats.SORTS[sort])
+    return {"sort": sort, "items": await _read_stats("stats_combos", cypher, min_picks=min_picks, limit=limit)}
+
+@app.get("/stats/karts/{name}/users")
+async def stats_kart_users(name: str, limit: int = Query(20, ge=1, le=500)):
+    """Quem mais corre com o kart `name`."""
+    return {"kart": name, "items": await _read_stats("stats_kart_users", race_stats.KART_USERS_CYPHER, kart=name, limit=limit)}
+
+# --- Rankings (RDB) ---
+# period=all lê player_totals; os demais agregam race_results só nas
+# partições do intervalo (dia/semana/mês/ano UTC atual, ou since/until).
+def _utc(ts: Optional[datetime]) -> Optional[datetime]:
+    return ts.replace(tzinfo=timezone.utc) if ts is not None and ts.tzinfo is None else ts
+
+async def _leaderboard(period: str, since: Optional[datetime], until: Optional[datetime],
+                       track: Optional[str], limit: int) -> dict:
+    if period == "all" and since is None and until is None and track is None:
+        op, sql, params = "leaderboard_totals", race_results.TOTALS_SQL, {"limit": limit}
+    else:
+        if period == "all":
+            lo, hi = datetime(2000, 1, 1, tzinfo=timezone.utc), datetime.now(timezone.utc)
+        else:
+            lo, hi = race_results.period_bounds(period)
+        lo, hi = (_utc(since) or lo), (_utc(until) or hi)
+        sql = race_results.PERIOD_SQL.format(track="AND track = %(track)s" if track else "")
+        op, params = "leaderboard_period", {"since": lo, "until": hi, "track": track, "limit": limit}
+    async with metrics.backend("pg", op), pg_conn() as conn, conn.cursor() as cur:
+        await cur.execute(sql, params)
+        rows = await cur.fetchall()
+    items = [dict(zip(race_results.COLUMNS, r), rank=i + 1) for i, r in enumerate(rows)]
+    return {"period": period, "track": track, "items": items}
+
+@app.get("/leaderboard")
+async def leaderboard(period: str = Query("all", pattern="^(all|day|week|month|year)$"),
+                      since: Optional[datetime] = None, until: Optional[datetime] = None,
+                      limit: int = Query(50, ge=1, le=config.LEADERBOARD_MAX)):
+    """Ranking global por pontos (desempate: vitórias)."""
+    return await _leaderboard(period, since, until, None, limit)
+
+@app.get("/leaderboard/tracks/{track}")
+async def leaderboard_track(track: str,
+                            period: str = Query("month", pattern="^(all|day|week|month|year)$"),
+                            since: Optional[datetime] = None, until: Optional[datetime] = None,
+                            limit: int = Query(50, ge=1, le=config.LEADERBOARD_MAX)):
+    """Ranking de uma pista; period=all percorre todas as partições pelo índice (track, finished_at)."""
+    return await _leaderboard(period, since, until, track, limit)
+
+# --- Rating de habilidade (RDB + cache) ---
+async def _rating(user_id: str) -> tuple[float, int]:
+    """(rating, corridas) do cache ou do RDB; quem não tem linha fica com o default."""
+    hit = _ratings.get(user_id)
+    if hit is None:
+        async with metrics.backend("pg", "rating_lookup"), pg_conn() as conn, conn.cursor() as cur:
+            await cur.execute("SELECT rating, races FROM ratings WHERE user_id = %s", (user_id,))
+            row = await cur.fetchone()
+        hit = (row[0], row[1]) if row else (_rating_params.default, 0)
+        _ratings.put(user_id, *hit)
+    return hit
+
+@app.get("/ratings")
+async def ratings_top(limit: int = Query(50, ge=1, le=config.LEADERBOARD_MAX)):
+    async with metrics.backend("pg", "ratings_top"), pg_conn() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            SELECT r.user_id::text, u.nome, r.rating, r.races FROM ratings r
+            LEFT JOIN usuarios u ON u.id = r.user_id
+            ORDER BY r.rating DESC LIMIT %s
+        """, (limit,))
+        rows = await cur.fetchall()
+    return {"items": [{"rank": i + 1, "user_id": uid, "name": name, "rating": round(rating, 1), "races": n}
+                      for i, (uid, name, rating, n) in enumerate(rows)]}
+
+@app.get("/ratings/{user_id}")
+async def rating_of(user_id: str):
+    """Rating atual; quem ainda não correu tem RATING_DEFAULT e provisional=true."""
+    try:
+        user_id = str(uuid.UUID(user_id))
+    except ValueError:
+        raise HTTPException(422, "user_id deve ser um UUID")
+    rating, n = await _rating(user_id)
+    return {"user_id": user_id, "rating": round(rating, 1), "races": n,
+            "provisional": n < _rating_params.provisional}
+
+# --- Matchmaking (lobby em memória) ---
+def start_lobby():
+    global _lobby_task
+    _lobby_task = asyncio.create_task(_lobby.run())
+
+async def stop_lobby():
+    global _lobby_task
+    if _lobby_task is not None:
+        _lobby_task.cancel()
+        try:
+            await _lobby_task
+        except asyncio.CancelledError:
+            pass
+    _lobby_task = None
+
+class MatchRequest(BaseModel):
+    ping_ms: Optional[float] = Field(default=None, ge=0)
+    character: Optional[str] = None
+    kart: Optional[str] = None
+    wheel: Optional[str] = None
+    glider: Optional[str] = None
+    track: Optional[str] = None
+
+def _ticket_view(t: matchmaking.Ticket) -> dict:
+    if t.match is not None:
+        return {"status": "matched", "ticket_id": t.ticket_id, "match": t.match}
+    return {"status": "waiting", "ticket_id": t.ticket_id,
+            "waited_s": round(_lobby.clock() - t.enqueued_at, 1), "queue": _lobby.waiting_count()}
+
+def _own_ticket(ticket_id: str, user: Optional[Dict[str, Any]]) -> matchmaking.Ticket:
+    t = _lobby.get(ticket_id)
+    if t is None:
+        raise HTTPException(404, "Ticket desconhecido, expirado ou cancelado")
+    if user and t.user_id != user["user_id"]:
+        raise HTTPException(403, "Ticket de outro usuário")
+    return t
+
+@app.post("/match/queue")
+async def match_enqueue(p: MatchRequest, user: Optional[Dict[str, Any]] = Depends(current_user)):
+    """Entra na fila; o grid sai por GET /match/queue/{ticket_id} (long-poll)."""
+    if not user:
+        raise HTTPException(401, "Matchmaking exige login")
+    try:
+        rating, _ = await _rating(user["user_id"])
+    except Exception:
+        rating = _rating_params.default  # RDB fora do ar não impede a fila
+    build = {k: v for k, v in p.model_dump().items() if k in ("character", "kart", "wheel", "glider") and v}
+    t = _lobby.enqueue(user["user_id"], user.get("name") or "Player", rating, p.ping_ms, build, p.track)
+    return JSONResponse(_ticket_view(t), status_code=202 if t.match is None else 200)
+
+@app.get("/match/queue/{ticket_id}")
+async def match_poll(ticket_id: str, wait: float = Query(config.MATCH_WAIT_MAX, ge=0, le=config.MATCH_WAIT_MAX),
+                     user: Optional[Dict[str, Any]] = Depends(current_user)):
+    _own_ticket(ticket_id, user)
+    t = await _lobby.wait(ticket_id, wait)
+    if t is None:
+        raise HTTPException(404, "Ticket cancelado")
+    return _ticket_view(t)
+
+@app.delete("/match/queue/{ticket_id}")
+async def match_cancel(ticket_id: str, user: Optional[Dict[str, Any]] = Depends(current_user)):
+    t = _own_ticket(ticket_id, user)
+    if t.match is not None:
+        raise HTTPException(409, "Grid já formado")
+    _lobby.cancel(ticket_id)
+    return {"ok": True}
+
+@app.get("/match/stats")
+async def match_stats():
+    return _lobby.stats()
+
+# --- Métricas (Prometheus) ---
+# Gauges lidos no scrape: ocupação dos pools (as mesmas contas do /health),
+# outbox e lobby. O stats do outbox vai ao SQLite, então é lido numa thread
+# antes do render e o gauge só devolve o último valor.
+_outbox_snapshot: Dict[str, Any] = {}
+
+def _pool_gauge() -> dict:
+    out = {}
+    for backend, usage in _health.usage.items():
+        u = usage()
+        if u:
+            out[(backend, "in_use")] = u["in_use"]
+            out[(backend, "idle")] = u["size"] - u["in_use"]
+            out[(backend, "max")] = u["max"]
+            if "waiting" in u:
+                out[(backend, "waiting")] = u["waiting"]
+    return out
+
+metrics.REGISTRY.gauge("s2_pool_connections", "Conexões dos pools por estado",
+                       ("backend", "state"), _pool_gauge)
+metrics.REGISTRY.gauge("s2_outbox_items", "Corridas no outbox (depth), em retentativa e no dead-letter",
+                       ("state",), lambda: {("depth",): _outbox_snapshot.get("depth"),
+                                            ("retrying",): _outbox_snapshot.get("retrying"),
+                                            ("dead",): _outbox_snapshot.get("dead")})
+metrics.REGISTRY.gauge("s2_outbox_flush_lag_seconds", "Idade do item mais antigo do outbox", (),
+                       lambda: {(): _outbox_snapshot.get("flush_lag_s")})
+metrics.REGISTRY.gauge("s2_match_waiting", "Tickets na fila de matchmaking", (),
+                       lambda: {(): _lobby.waiting_count()})
+metrics.REGISTRY.gauge("s2_matches_total", "Grids formados pelo lobby", (),
+                       lambda: {(): _lobby.matches_total}, kind="counter")
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    if _outbox is not None:
+        _outbox_snapshot.update(await asyncio.to_thread(_outbox.stats))
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
 # ====== FIM DO BLOCO LIMPO ======
 
 
 def get_neo4j():
-    """Retorna (driver, db) usando NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD e NEO4J_DB (padrão 'neo4j')."""
-    uri = os.getenv("NEO4J_URI")
-    user = os.getenv("NEO4J_USER")
-    pwd = os.getenv("NEO4J_PASSWORD")
-    db = os.getenv("NEO4J_DB", "neo4j")
-    if not uri or not user or not pwd:
+    """Retorna (driver, db) do driver Neo4j compartilhado (não feche o driver)."""
+    if _neo4j_driver is None:
         raise RuntimeError("Variáveis NEO4J_URI/USER/PASSWORD ausentes no ambiente do container.")
-    driver = GraphDatabase.driver(uri, auth=(user, pwd))
-    return driver, db
+    return server_timing.TimedDriver(_neo4j_driver), NEO4J_DB
@@ -0,0 +1,100 @@
+"""
+Índice de builds (personagem x kart x roda x glider) com os totais pré-calculados.
+
+Cada peça do catálogo vira um id inteiro (posição na sua coleção) e os totais
+de peso/velocidade/aceleração de todas as combinações ficam num único array
+int16 (N, 3), em ordem C sobre (personagem, kart, roda, glider). Com o
+catálogo do PopDB1.py são 8^4 = 4096 builds (~24 KB). O índice é reconstruído
+só quando o catálogo muda (ETag do CatalogCache) e atende /db1/builds.
+
+Os itens já estão no schema canônico (catalog.normalize_item): weight,
+speed e accel inteiros; personagens só contribuem com weight.
+"""
+import json
+from typing import Optional
+
+import numpy as np
+
+KINDS = ["characters", "karts", "wheels", "gliders"]
+SORT_KEYS = {"velocidade": 1, "aceleracao": 2, "peso_total": 0}
+
+
+class TooManyBuilds(Exception):
+    pass
+
+
+def part_stats(part: dict) -> tuple[int, int, int]:
+    return part.get("weight", 0), part.get("speed", 0), part.get("accel", 0)
+
+
+class BuildIndex:
+    def __init__(self, catalog: dict, max_builds: int):
+        self.names = [[p.get("name") for p in catalog.get(kind, [])] for kind in KINDS]
+        self.shape = tuple(len(n) for n in self.names)
+        self.size = int(np.prod(self.shape, dtype=np.int64))
+        if self.size > max_builds:
+            raise TooManyBuilds(f"{self.size} builds (limite {max_builds})")
+        self.ids = [{name: i for i, name in enumerate(n)} for n in self.names]
+        # (peças, 3) por coleção; a soma via broadcasting dá (c, k, w, g, 3)
+        parts = [np.array([part_stats(p) for p in catalog.get(kind, [])], dtype=np.int16).reshape(-1, 3)
+                 for kind in KINDS]
+        totals = (parts[0][:, None, None, None, :] + parts[1][None, :, None, None, :]
+                  + parts[2][None, None, :, None, :] + parts[3][None, None, None, :, :])
+        self.totals = np.ascontiguousarray(totals.reshape(-1, 3))
+
+    def query(self, max_weight: Optional[int] = None, min_speed: Optional[int] = None,
+              min_accel: Optional[int] = None, fixed: Optional[dict] = None,
+              sort: str = "velocidade", limit: int = 20) -> tuple[int, list[dict]]:
+        """Filtra e ordena (desc, exceto peso_total asc). Devolve (total_filtrado, builds)."""
+        view = self.totals.reshape(*self.shape, 3)
+        # peças fixas (ex.: character="Mario") viram fatias do array 4D
+        sel: list = [slice(None)] * 4
+        for axis, kind in enumerate(KINDS):
+            name = (fixed or {}).get(kind)
+            if name is not None:
+                if name not in self.ids[axis]:
+                    return 0, []
+                i = self.ids[axis][name]
+                sel[axis] = slice(i, i + 1)
+        sub = view[tuple(sel)]
+        offsets = [np.arange(self.shape[a])[sel[a]] for a in range(4)]
+        t = sub.reshape(-1, 3)
+        mask = np.ones(len(t), dtype=bool)
+        if max_weight is not None:
+            mask &= t[:, 0] <= max_weight
+        if min_speed is not None:
+            mask &= t[:, 1] >= min_speed
+        if min_accel is not None:
+            mask &= t[:, 2] >= min_accel
+        hits = np.flatnonzero(mask)
+        col = SORT_KEYS[sort]
+        key = t[hits, col].astype(np.int32)
+        if sort != "peso_total":
+            key = -key
+        # desempate: mais velocidade, depois mais aceleração, depois menos peso
+        order = np.lexsort((t[hits, 0], -t[hits, 2].astype(np.int32), -t[hits, 1].astype(np.int32), key))
+        top = hits[order[:limit]]
+        coords = np.unravel_index(top, sub.shape[:4])
+        out = []
+        for j, flat in enumerate(top):
+            w, s, a = (int(x) for x in t[flat])
+            ids = [int(offsets[axis][coords[axis][j]]) for axis in range(4)]
+            out.append({"character": self.names[0][ids[0]], "kart": self.names[1][ids[1]],
+                        "wheel": self.names[2][ids[2]], "glider": self.names[3][ids[3]],
+                        "peso_total": w, "velocidade": s, "aceleracao": a})
+        return len(hits), out
+
+
+class BuildIndexCache:
+    """Mantém um BuildIndex por versão do catálogo (ETag do CatalogCache)."""
+
+    def __init__(self, max_builds: int):
+        self.max_builds = max_builds
+        self.etag: Optional[str] = None
+        self.index: Optional[BuildIndex] = None
+
+    def get(self, catalog_body: bytes, etag: str) -> BuildIndex:
+        if self.index is None or etag != self.etag:
+            self.index = BuildIndex(json.loads(catalog_body), self.max_builds)
+            self.etag = etag
+        return self.index
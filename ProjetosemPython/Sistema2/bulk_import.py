@@ -0,0 +1,131 @@
+"""
+Importação em massa de usuários (RDB) via COPY.
+
+As linhas (NDJSON ou CSV com cabeçalho) são validadas uma a uma e enviadas por
+COPY para uma tabela temporária; no fim um único INSERT ... SELECT faz o merge
+em `usuarios`, deduplicando o próprio arquivo por e-mail (vale a primeira
+ocorrência) e ignorando conflitos com contas existentes (usuarios_email_key ou
+id repetido). Tudo roda numa transação: ou entra o lote inteiro ou nada.
+
+Aceita chaves em PT ou EN: id, nome/name, email, senha/password,
+criado_em/created_at. Senhas que não estão no formato scrypt$... ficam como
+legadas e são convertidas no primeiro login (ver passwords.py).
+
+No CSV cada registro deve ocupar uma linha (sem quebras dentro de aspas).
+"""
+import csv, json, uuid
+from datetime import datetime
+from typing import Optional
+
+STAGING_DDL = """
+CREATE TEMP TABLE usuarios_import (
+    seq BIGINT GENERATED ALWAYS AS IDENTITY,
+    id UUID, nome TEXT, email TEXT, senha TEXT, criado_em TIMESTAMP
+) ON COMMIT DROP
+"""
+
+COPY_SQL = "COPY usuarios_import (id, nome, email, senha, criado_em) FROM STDIN"
+
+MERGE_SQL = """
+WITH dedup AS (
+    SELECT DISTINCT ON (email) id, nome, email, senha, COALESCE(criado_em, NOW()) AS criado_em
+    FROM usuarios_import
+    ORDER BY email, seq
+), ins AS (
+    INSERT INTO usuarios (id, nome, email, senha, criado_em)
+    SELECT id, nome, email, senha, criado_em FROM dedup
+    ON CONFLICT DO NOTHING
+    RETURNING 1
+)
+SELECT (SELECT count(*) FROM usuarios_import),
+       (SELECT count(*) FROM dedup),
+       (SELECT count(*) FROM ins)
+"""
+
+
+class RowParser:
+    """Converte linhas de texto em tuplas (id, nome, email, senha, criado_em)."""
+
+    def __init__(self, fmt: str):
+        if fmt not in ("ndjson", "csv"):
+            raise ValueError(f"formato não suportado: {fmt}")
+        self.fmt = fmt
+        self.header: Optional[list[str]] = None
+        self.invalid = 0
+
+    def feed(self, line: str) -> Optional[tuple]:
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            if self.fmt == "ndjson":
+                rec = json.loads(line)
+            else:
+                fields = next(csv.reader([line]))
+                if self.header is None:
+                    self.header = [f.strip().lower() for f in fields]
+                    return None
+                rec = dict(zip(self.header, fields))
+            row = _normalize(rec)
+        except (ValueError, TypeError, AttributeError, StopIteration):
+            row = None
+        if row is None:
+            self.invalid += 1
+        return row
+
+
+def _normalize(rec: dict) -> Optional[tuple]:
+    nome = (rec.get("nome") or rec.get("name") or "").strip()
+    email = (rec.get("email") or "").strip()
+    senha = rec.get("senha") or rec.get("password") or ""
+    if not nome or "@" not in email or not senha:
+        return None
+    uid = rec.get("id")
+    uid = uuid.UUID(str(uid)) if uid else uuid.uuid4()
+    criado = rec.get("criado_em") or rec.get("created_at") or None
+    if criado:
+        criado = datetime.fromisoformat(str(criado).replace("Z", "+00:00")).replace(tzinfo=None)
+    return (uid, nome, email, senha, criado)
+
+
+def _report(counts: tuple, invalid: int) -> dict:
+    staged, distinct, inserted = counts
+    return {
+        "received": staged + invalid,
+        "invalid": invalid,
+        "duplicates_in_file": staged - distinct,
+        "conflicts": distinct - inserted,   # e-mail (ou id) já existente em usuarios
+        "inserted": inserted,
+    }
+
+
+def import_users(conn, lines, fmt: str) -> dict:
+    """Versão síncrona (CLI): `lines` é qualquer iterável de str."""
+    parser = RowParser(fmt)
+    with conn.cursor() as cur:
+        cur.execute(STAGING_DDL)
+        with cur.copy(COPY_SQL) as copy:
+            for line in lines:
+                row = parser.feed(line)
+                if row is not None:
+                    copy.write_row(row)
+        cur.execute(MERGE_SQL)
+        counts = cur.fetchone()
+    conn.commit()
+    return _report(counts, parser.invalid)
+
+
+async def import_users_async(conn, lines, fmt: str) -> dict:
+    """Versão assíncrona (API): `lines` é um async iterável de str."""
+    parser = RowParser(fmt)
+    async with conn.cursor() as cur:
+        await cur.execute(STAGING_DDL)
+        async with cur.copy(COPY_SQL) as copy:
+            async for line in lines:
+                row = parser.feed(line)
+                if row is not None:
+                    await copy.write_row(row)
+        await cur.execute(MERGE_SQL)
+        counts = await cur.fetchone()
+    await conn.commit()
+    return _report(counts, parser.invalid)
@@ -0,0 +1,240 @@
+"""
+Cache em processo do catálogo (DB1) e controle de versão do catálogo.
+
+Quem altera uma coleção do catálogo (PopDB1.py, ferramentas de admin) chama
+`record_changes(db, ...)` com os nomes alterados/removidos, ou
+`bump_version(db)` quando não sabe dizer o que mudou. Os dois incrementam o
+documento de versão em `catalog_meta`. A S2 guarda o JSON serializado + ETag e
+só relê o Mongo quando a versão muda; entre checagens (CATALOG_CACHE_TTL
+segundos) nem a versão é consultada.
+
+Sincronização incremental (/db1/catalog/delta, usada pelo cache em disco do
+S1): cada item alterado por `record_changes` recebe `_v` = versão da mudança e
+cada remoção deixa uma lápide em `catalog_tombstones`; um cliente na versão N
+recebe só o que tem `_v > N`. `bump_version` sobe o `floor`, e clientes com
+versão abaixo dele recebem o catálogo completo.
+
+Schema canônico: todo item é {name, weight, speed, accel} (inteiros >= 0;
+pistas só têm name). `normalize_item` converte qualquer formato antigo
+(Peso/Velocidade/Aceleração, "light/medium/heavy"...) uma única vez, na
+gravação/seed, e o validador $jsonSchema do Mongo recusa o resto. Com
+format=compact o delta manda cada item como uma linha na ordem de FIELDS.
+"""
+import asyncio, hashlib, json, time, uuid
+from typing import Optional
+
+import metrics
+
+CATALOG_COLLECTIONS = ["characters", "karts", "wheels", "gliders", "tracks"]
+CATALOG_LIMIT = 100
+
+META_COLLECTION = "catalog_meta"
+META_ID = "catalog"
+TOMBSTONES = "catalog_tombstones"
+ITEM_VERSION = "_v"
+PROJECTION = {"_id": 0, ITEM_VERSION: 0}
+
+
+# ---- Schema canônico dos itens ----
+
+FIELDS = {col: ("name", "weight", "speed", "accel") for col in CATALOG_COLLECTIONS}
+FIELDS["tracks"] = ("name",)
+WEIGHT_LABELS = {"light": 1, "medium": 2, "heavy": 3}
+ALIASES = {
+    "weight": ("weight", "Peso", "peso"),
+    "speed": ("speed", "Velocidade", "velocidade"),
+    "accel": ("accel", "Aceleração", "Aceleracao", "aceleracao", "acceleration"),
+}
+DEFAULT_CHARACTER_WEIGHT = WEIGHT_LABELS["medium"]
+
+
+def _to_int(v, default: int) -> int:
+    if v is None:
+        return default
+    if isinstance(v, str):
+        label = v.strip().lower()
+        if label in WEIGHT_LABELS:
+            return WEIGHT_LABELS[label]
+        v = label
+    return max(0, int(v))
+
+
+def normalize_item(col: str, raw: dict) -> dict:
+    """Item em qualquer formato antigo -> formato canônico. ValueError se não der."""
+    name = raw.get("name") or raw.get("Nome")
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError(f"item de {col} sem nome: {raw!r}")
+    out = {"name": name.strip()}
+    for field in FIELDS[col][1:]:
+        value = next((raw[k] for k in ALIASES[field] if raw.get(k) is not None), None)
+        default = DEFAULT_CHARACTER_WEIGHT if (col == "characters" and field == "weight") else 0
+        out[field] = _to_int(value, default)
+    return out
+
+
+def json_schema(col: str) -> dict:
+    props = {"_id": {}, ITEM_VERSION: {"bsonType": ["int", "long"]},
+             "name": {"bsonType": "string", "minLength": 1}}
+    for field in FIELDS[col][1:]:
+        props[field] = {"bsonType": ["int", "long"], "minimum": 0}
+    return {"bsonType": "object", "required": list(FIELDS[col]),
+            "properties": props, "additionalProperties": False}
+
+
+def to_row(col: str, item: dict) -> list:
+    return [item.get(f) for f in FIELDS[col]]
+
+
+def canonicalize(db):
+    """Migração (pymongo síncrono): regrava itens fora do formato canônico e
+    liga o validador $jsonSchema em cada coleção do catálogo."""
+    changed: dict[str, list[str]] = {}
+    existing = set(db.list_collection_names())
+    for col in CATALOG_COLLECTIONS:
+        for doc in db[col].find({}):
+            try:
+                canon = normalize_item(col, doc)
+            except ValueError:
+                continue  # sem nome: o validador barra a próxima escrita
+            if any(doc.get(k) != v for k, v in canon.items()) or set(doc) - {"_id", ITEM_VERSION, *canon}:
+                keep = {k: doc[k] for k in ("_id", ITEM_VERSION) if k in doc}
+                db[col].replace_one({"_id": doc["_id"]}, {**keep, **canon})
+                changed.setdefault(col, []).append(canon["name"])
+        validator = {"$jsonSchema": json_schema(col)}
+        if col in existing:
+            db.command("collMod", col, validator=validator, validationLevel="strict")
+        else:
+            db.create_collection(col, validator=validator)
+    if changed:
+        record_changes(db, changed)
+
+
+def _next_version(db, extra: dict) -> dict:
+    """Incrementa a versão atomicamente (update com pipeline) e aplica `extra`,
+    que pode usar "$$new" para se referir à versão nova."""
+    from pymongo import ReturnDocument
+    new = {"$add": [{"$ifNull": ["$version", 0]}, 1]}
+    stage = {"version": new, "epoch": {"$ifNull": ["$epoch", uuid.uuid4().hex]}}
+    stage.update({k: {"$let": {"vars": {"new": new}, "in": v}} for k, v in extra.items()})
+    doc = db[META_COLLECTION].find_one_and_update(
+        {"_id": META_ID}, [{"$set": stage}], upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return {"epoch": doc["epoch"], "version": doc["version"]}
+
+
+def bump_version(db) -> dict:
+    """Marca o catálogo como alterado (pymongo síncrono). Devolve {epoch, version}.
+
+    `epoch` nasce junto com o documento; se o banco for apagado e populado de
+    novo, o epoch muda e nenhum cache antigo confunde as versões. Como não se
+    sabe o que mudou, clientes de /db1/catalog/delta voltam a baixar tudo."""
+    return _next_version(db, {"floor": "$$new"})
+
+
+def record_changes(db, changed: dict[str, list[str]], deleted: Optional[dict[str, list[str]]] = None) -> dict:
+    """Registra itens alterados/removidos (por nome) numa versão nova do catálogo.
+
+    Enquanto os itens são carimbados a versão fica em `stamping`, e o delta
+    responde com a versão anterior; assim nenhum cliente avança para uma
+    versão cujos itens ainda não estão todos marcados."""
+    deleted = deleted or {}
+    v = _next_version(db, {"stamping": {"$concatArrays": [{"$ifNull": ["$stamping", []]}, ["$$new"]]}})
+    n = v["version"]
+    for col, names in changed.items():
+        if names:
+            db[col].update_many({"name": {"$in": names}}, {"$set": {ITEM_VERSION: n}})
+            db[TOMBSTONES].delete_many({"col": col, "name": {"$in": names}})
+    for col, names in deleted.items():
+        for name in names:
+            db[TOMBSTONES].update_one({"_id": f"{col}:{name}"},
+                                      {"$set": {"col": col, "name": name, ITEM_VERSION: n}}, upsert=True)
+    db[META_COLLECTION].update_one({"_id": META_ID}, {"$pull": {"stamping": n}})
+    return v
+
+
+def published_version(meta: Optional[dict]) -> int:
+    """Maior versão cujos itens já estão todos carimbados."""
+    if not meta:
+        return 0
+    stamping = meta.get("stamping") or []
+    return min(stamping) - 1 if stamping else meta.get("version", 0)
+
+
+async def delta(db, epoch: Optional[str], since: int, compact: bool = False) -> dict:
+    """Mudanças do catálogo desde a versão `since` do cliente (pymongo assíncrono).
+
+    Devolve o catálogo completo (`full: true`) quando o cliente não tem versão,
+    está noutro epoch, ou ficou para trás de um `bump_version`. Com `compact`,
+    cada item vai como lista na ordem de `fields`."""
+    meta = await db[META_COLLECTION].find_one({"_id": META_ID}) or {}
+    cur_epoch, version = meta.get("epoch"), published_version(meta)
+    out = {"epoch": cur_epoch, "version": version}
+    if compact:
+        out["fields"] = {col: list(f) for col, f in FIELDS.items()}
+    shape = (lambda col, items: [to_row(col, it) for it in items]) if compact else (lambda col, items: items)
+    if since <= 0 or epoch != cur_epoch or since < meta.get("floor", 0) or since > version:
+        out["full"] = True
+        out["items"] = {col: shape(col, await db[col].find({}, PROJECTION).to_list())
+                        for col in CATALOG_COLLECTIONS}
+        return out
+    out["full"] = False
+    out["changed"], out["deleted"] = {}, {}
+    if since == version:
+        return out
+    window = {ITEM_VERSION: {"$gt": since}}
+    for col in CATALOG_COLLECTIONS:
+        items = await db[col].find(window, PROJECTION).to_list()
+        if items:
+            out["changed"][col] = shape(col, items)
+    async for t in db[TOMBSTONES].find(window, {"_id": 0, "col": 1, "name": 1}):
+        out["deleted"].setdefault(t["col"], []).append(t["name"])
+    return out
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class CatalogCache:
+    """JSON do catálogo já serializado, com ETag (sha256 do corpo)."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.key = None            # (epoch, versão publicada) do que está em cache
+        self.body: Optional[bytes] = None
+        self.etag: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self.body = None
+
+    async def get(self, db) -> tuple[bytes, str]:
+        """Devolve (corpo, etag), relendo o Mongo só se a versão publicada mudou."""
+        if self.body is not None and time.monotonic() - self._checked_at < self.ttl:
+            return self.body, self.etag
+        async with self._lock:
+            if self.body is not None and time.monotonic() - self._checked_at < self.ttl:
+                return self.body, self.etag  # outra task acabou de checar
+            with metrics.backend("mongo", "catalog_version"):
+                meta = await db[META_COLLECTION].find_one({"_id": META_ID})
+            # versão publicada, como no delta: um record_changes ainda carimbando
+            # não invalida os clientes nem refaz o BuildIndex
+            key = (meta.get("epoch"), published_version(meta)) if meta else None
+            if self.body is None or key != self.key:
+                out = {}
+                with metrics.backend("mongo", "catalog_load"):
+                    for col in CATALOG_COLLECTIONS:
+                        out[col] = await db[col].find({}, PROJECTION).limit(CATALOG_LIMIT).to_list()
+                body = json.dumps(out, ensure_ascii=False, separators=(",", ":")).encode()
+                self.body, self.key = body, key
+                self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+            self._checked_at = time.monotonic()
+            return self.body, self.etag
@@ -0,0 +1,52 @@
+"""
+Corpos de requisição com Content-Encoding: gzip.
+
+O Starlette já comprime respostas (GZipMiddleware), mas não descomprime o que
+chega. Este middleware ASGI descomprime o corpo em streaming, antes de a rota
+ler, então /rdb/users/import continua lendo linha a linha sem carregar o
+arquivo inteiro. O tamanho descomprimido é limitado (GZIP_MAX_REQUEST_BYTES)
+para que um corpo pequeno não vire gigabytes em memória.
+"""
+import zlib
+
+from fastapi import HTTPException
+
+
+class GzipRequestMiddleware:
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = scope["headers"]
+        if not any(k == b"content-encoding" and v.strip().lower() == b"gzip" for k, v in headers):
+            return await self.app(scope, receive, send)
+
+        # altera o scope em vez de copiar: o router grava scope["route"] nele e os
+        # middlewares de fora (metrics) leem o template da rota dali
+        scope["headers"] = [(k, v) for k, v in headers
+                            if k not in (b"content-encoding", b"content-length")]
+        dec = zlib.decompressobj(wbits=31)  # 31 = formato gzip
+        total = 0
+
+        async def receive_plain():
+            nonlocal total
+            msg = await receive()
+            if msg["type"] != "http.request":
+                return msg
+            # max_length: um chunk pequeno não expande além do limite antes da checagem
+            room = self.max_bytes - total
+            try:
+                body = dec.decompress(msg.get("body", b""), room + 1)
+                if len(body) <= room and not msg.get("more_body", False):
+                    body += dec.flush()
+            except zlib.error:
+                raise HTTPException(400, "Corpo gzip inválido")
+            total += len(body)
+            if total > self.max_bytes:
+                raise HTTPException(413, "Corpo descomprimido grande demais")
+            return {**msg, "body": body}
+
+        await self.app(scope, receive_plain, send)
@@ -12,3 +12,98 @@ NEO4J_URI = os.getenv("NEO4J_URI")
 NEO4J_USER = os.getenv("NEO4J_USER", os.getenv("NEO4J_USERNAME", "neo4j"))
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
 NEO4J_DATABASE = os.getenv("NEO4J_DATABASE", "neo4j")
+
+# ---- Pools de conexão (compartilhados pela API S2) ----
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "1"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "10"))
+PG_POOL_TIMEOUT = float(os.getenv("PG_POOL_TIMEOUT", "10"))
+
+MONGO_POOL_MIN = int(os.getenv("MONGO_POOL_MIN", "0"))
+MONGO_POOL_MAX = int(os.getenv("MONGO_POOL_MAX", "50"))
+
+NEO4J_POOL_MAX = int(os.getenv("NEO4J_POOL_MAX", "50"))
+NEO4J_ACQUIRE_TIMEOUT = float(os.getenv("NEO4J_ACQUIRE_TIMEOUT", "10"))
+
+# ---- /health (health.py) ----
+HEALTH_TIMEOUT = float(os.getenv("HEALTH_TIMEOUT", "2"))       # prazo de cada probe (s)
+HEALTH_CACHE_TTL = float(os.getenv("HEALTH_CACHE_TTL", "2"))   # janela de cache do resultado (s)
+
+# ---- Server-Timing (server_timing.py) ----
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1") == "1"              # header com o tempo em cada banco
+SERVER_TIMING_DEBUG = os.getenv("SERVER_TIMING_DEBUG", "1") == "1"  # aceita X-Debug-Timing: 1 ("_timing" no JSON)
+
+# ---- Schema (schema.py) ----
+SCHEMA_AUTO_APPLY = os.getenv("SCHEMA_AUTO_APPLY", "1") == "1"
+
+# ---- /race/finish/batch ----
+RACE_FINISH_CHUNK = int(os.getenv("RACE_FINISH_CHUNK", "100"))        # corridas por transação
+RACE_FINISH_BATCH_MAX = int(os.getenv("RACE_FINISH_BATCH_MAX", "5000"))
+
+# ---- Resultados no RDB (race_results.py) ----
+RACE_PARTITIONS_AHEAD = int(os.getenv("RACE_PARTITIONS_AHEAD", "3"))  # meses criados além do atual
+LEADERBOARD_MAX = int(os.getenv("LEADERBOARD_MAX", "500"))
+# janela aceita para finished_at enviado pelo cliente (cada mês novo cria partições)
+RACE_BACKFILL_DAYS = float(os.getenv("RACE_BACKFILL_DAYS", "2"))              # passado, clientes comuns
+RACE_BACKFILL_ADMIN_DAYS = float(os.getenv("RACE_BACKFILL_ADMIN_DAYS", "3650"))  # /race/finish/batch com X-Admin-Key
+RACE_CLOCK_SKEW = float(os.getenv("RACE_CLOCK_SKEW", "300"))                  # futuro tolerado (s)
+
+# ---- Rating de habilidade (ratings.py) ----
+RATING_DEFAULT = float(os.getenv("RATING_DEFAULT", "1500"))
+RATING_K = float(os.getenv("RATING_K", "24"))
+RATING_K_NEW = float(os.getenv("RATING_K_NEW", "48"))                # nas primeiras RATING_PROVISIONAL corridas
+RATING_PROVISIONAL = int(os.getenv("RATING_PROVISIONAL", "20"))
+RATING_CACHE_SIZE = int(os.getenv("RATING_CACHE_SIZE", "100000"))
+RATING_CACHE_TTL = float(os.getenv("RATING_CACHE_TTL", "30"))        # segundos
+
+# ---- Matchmaking (matchmaking.py) ----
+MATCH_TICK = float(os.getenv("MATCH_TICK", "0.25"))                 # segundos entre rodadas
+MATCH_BAND_BASE = float(os.getenv("MATCH_BAND_BASE", "50"))         # faixa de rating inicial (±)
+MATCH_BAND_GROWTH = float(os.getenv("MATCH_BAND_GROWTH", "20"))     # por segundo de espera
+MATCH_BAND_MAX = float(os.getenv("MATCH_BAND_MAX", "600"))
+MATCH_PING_BASE = float(os.getenv("MATCH_PING_BASE", "40"))         # diferença de ping aceita (ms)
+MATCH_PING_GROWTH = float(os.getenv("MATCH_PING_GROWTH", "10"))
+MATCH_PING_MAX = float(os.getenv("MATCH_PING_MAX", "250"))
+MATCH_FILL_AFTER = float(os.getenv("MATCH_FILL_AFTER", "45"))       # depois disso completa com bots
+MATCH_SCAN_MAX = int(os.getenv("MATCH_SCAN_MAX", "64"))
+MATCH_MAX_ANCHORS = int(os.getenv("MATCH_MAX_ANCHORS", "1024"))     # tentativas por tick
+MATCH_TICK_BUDGET_MS = float(os.getenv("MATCH_TICK_BUDGET_MS", "25"))  # CPU máxima do laço de um tick
+MATCH_WAIT_MAX = float(os.getenv("MATCH_WAIT_MAX", "25"))           # long-poll de /match/queue/{ticket}
+
+# ---- Cache do catálogo (catalog.py) ----
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "2"))  # segundos entre checagens de versão
+
+# ---- Hash de senhas (passwords.py) ----
+PWD_SCRYPT_N = int(os.getenv("PWD_SCRYPT_N", str(2 ** 14)))
+PWD_SCRYPT_R = int(os.getenv("PWD_SCRYPT_R", "8"))
+PWD_SCRYPT_P = int(os.getenv("PWD_SCRYPT_P", "1"))
+PWD_HASH_WORKERS = int(os.getenv("PWD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PWD_HASH_MAX_PENDING = int(os.getenv("PWD_HASH_MAX_PENDING", "256"))
+
+# ---- Sessão (tokens.py) ----
+JWT_SECRET = os.getenv("JWT_SECRET")
+if not JWT_SECRET:
+    # sem segredo configurado os tokens só valem até o processo reiniciar
+    import secrets
+    JWT_SECRET = secrets.token_urlsafe(32)
+    print("[config] JWT_SECRET não definido; usando segredo aleatório deste processo.")
+TOKEN_TTL = int(os.getenv("TOKEN_TTL", str(12 * 3600)))       # segundos
+AUTH_REQUIRED = os.getenv("AUTH_REQUIRED", "1") == "1"
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+
+# ---- Rotas administrativas (X-Admin-Key) ----
+ADMIN_KEY = os.getenv("ADMIN_KEY")  # vazio = rotas de admin desligadas
+
+# ---- Outbox de /race/finish (outbox.py) ----
+RACE_INGEST_DEFAULT = os.getenv("RACE_INGEST_DEFAULT", "sync")   # "sync" ou "async" (202 + outbox)
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "outbox.sqlite3")
+OUTBOX_BATCH = int(os.getenv("OUTBOX_BATCH", "200"))
+OUTBOX_BACKOFF = float(os.getenv("OUTBOX_BACKOFF", "1"))
+OUTBOX_MAX_BACKOFF = float(os.getenv("OUTBOX_MAX_BACKOFF", "300"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))  # erros não transitórios até o dead-letter (0 = sem limite)
+
+# ---- Compressão HTTP (compression.py) ----
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))                   # respostas menores vão sem gzip
+GZIP_MAX_REQUEST_BYTES = int(os.getenv("GZIP_MAX_REQUEST_BYTES", str(256 * 1024 * 1024)))  # descomprimido
+
+# ---- Índice de builds (builds.py) ----
+BUILDS_MAX = int(os.getenv("BUILDS_MAX", "2000000"))  # combinações; acima disso /db1/builds responde 503
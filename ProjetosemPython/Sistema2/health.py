@@ -0,0 +1,131 @@
+"""
+Probes de saúde dos três bancos para /health.
+
+Os probes rodam em paralelo, cada um com prazo de HEALTH_TIMEOUT segundos,
+e usam as conexões dos pools (nada é aberto só para o health check). O
+resultado fica em cache por HEALTH_CACHE_TTL segundos; pedidos que chegam
+enquanto um probe está em andamento esperam o mesmo probe em vez de abrir
+outro, então o polling do balanceador custa no máximo uma rodada por janela.
+
+Cada banco reporta ok, latência do round-trip, erro e a ocupação do pool:
+- pg: estatísticas do psycopg_pool;
+- mongo: conexões emprestadas contadas por MongoPoolCounter (listener do driver);
+- neo4j: conexões em uso lidas do pool interno do driver (quando disponível).
+"""
+import asyncio, time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Optional
+
+from pymongo import monitoring
+
+Probe = Callable[[], Awaitable[Any]]
+
+
+class MongoPoolCounter(monitoring.ConnectionPoolListener):
+    """Conta conexões abertas e emprestadas do pool do pymongo (todos os servidores)."""
+
+    def __init__(self):
+        self.open = 0
+        self.in_use = 0
+
+    def connection_created(self, event):
+        self.open += 1
+
+    def connection_closed(self, event):
+        self.open = max(0, self.open - 1)
+
+    def connection_checked_out(self, event):
+        self.in_use += 1
+
+    def connection_checked_in(self, event):
+        self.in_use = max(0, self.in_use - 1)
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+    def connection_check_out_failed(self, event): pass
+
+
+def pg_pool_usage(pool) -> Optional[dict]:
+    if pool is None:
+        return None
+    st = pool.get_stats()
+    size, free = st.get("pool_size", 0), st.get("pool_available", 0)
+    return _usage(size, size - free, pool.max_size, st.get("requests_waiting", 0))
+
+
+def mongo_pool_usage(counter: MongoPoolCounter, max_size: int) -> dict:
+    return _usage(counter.open, counter.in_use, max_size, None)
+
+
+def neo4j_pool_usage(driver, max_size: int) -> Optional[dict]:
+    # o driver não expõe métricas do pool; lê a estrutura interna se ela existir
+    pool = getattr(driver, "_pool", None)
+    conns = getattr(pool, "connections", None)
+    if not isinstance(conns, dict):
+        return None
+    alive = [c for q in conns.values() for c in q]
+    return _usage(len(alive), sum(1 for c in alive if getattr(c, "in_use", False)), max_size, None)
+
+
+def _usage(size: int, in_use: int, max_size: int, waiting: Optional[int]) -> dict:
+    out = {"size": size, "in_use": in_use, "max": max_size,
+           "saturation": round(in_use / max_size, 3) if max_size else None}
+    if waiting is not None:
+        out["waiting"] = waiting
+    return out
+
+
+class HealthCheck:
+    def __init__(self, probes: dict[str, Probe], usage: dict[str, Callable[[], Optional[dict]]],
+                 timeout: float, ttl: float):
+        self.probes = probes
+        self.usage = usage
+        self.timeout = timeout
+        self.ttl = ttl
+        self._result: Optional[dict] = None
+        self._at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+
+    async def _probe(self, name: str, probe: Probe) -> dict:
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(probe(), self.timeout)
+            ok, err = True, None
+        except asyncio.TimeoutError:
+            ok, err = False, f"timeout ({self.timeout:g}s)"
+        except Exception as e:
+            ok, err = False, f"{type(e).__name__}: {e}"
+        out = {"ok": ok, "latency_ms": round((time.perf_counter() - t0) * 1000, 2), "error": err}
+        try:
+            out["pool"] = self.usage[name]() if name in self.usage else None
+        except Exception:
+            out["pool"] = None
+        return out
+
+    async def _run(self) -> dict:
+        names = list(self.probes)
+        results = await asyncio.gather(*(self._probe(n, self.probes[n]) for n in names))
+        backends = dict(zip(names, results))
+        up = sum(1 for r in results if r["ok"])
+        return {"status": "ok" if up == len(results) else ("down" if up == 0 else "degraded"),
+                "checked_at": datetime.now(timezone.utc).isoformat(), **backends}
+
+    async def _refresh(self):
+        try:
+            self._result = await self._run()
+            self._at = time.monotonic()
+        finally:
+            self._inflight = None
+
+    async def get(self) -> dict:
+        """Resultado em cache (com a idade em age_s) ou uma rodada nova de probes."""
+        if self._result is None or time.monotonic() - self._at >= self.ttl:
+            if self._inflight is None:
+                self._inflight = asyncio.create_task(self._refresh())
+            # shield: quem desiste do pedido não cancela o probe dos outros
+            await asyncio.shield(self._inflight)
+        return {**self._result, "age_s": round(time.monotonic() - self._at, 3)}
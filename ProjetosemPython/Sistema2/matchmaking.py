@@ -0,0 +1,318 @@
+"""
+Lobby de matchmaking em memória: junta jogadores na fila em grids de 8.
+
+Cada jogador entra com um ticket (rating do ratings.py, ping até a S2, build
+e pista preferida). A cada MATCH_TICK segundos o lobby:
+
+1. ordena os tickets em espera por rating (NumPy) e calcula a faixa de cada
+   um: MATCH_BAND_BASE + MATCH_BAND_GROWTH * espera, até MATCH_BAND_MAX; a
+   tolerância de ping cresce do mesmo jeito (MATCH_PING_*);
+2. percorre os tickets do mais antigo para o mais novo; quem tem pelo menos
+   8 jogadores na faixa pega os vizinhos mais próximos em rating (no máximo
+   MATCH_SCAN_MAX olhados) desde que a diferença de ping entre quaisquer
+   dois do grid caiba na menor tolerância entre eles; o laço para em
+   MATCH_MAX_ANCHORS tentativas ou depois de MATCH_TICK_BUDGET_MS de CPU no
+   laço; um tick cortado pelo orçamento é repetido logo depois de devolver
+   o event loop, então o loop fica preso no máximo por esse orçamento mais o
+   preparo vetorizado (rating/ping/entrada ficam em colunas NumPy mantidas
+   no enqueue, ~O(n log n) por tick);
+3. quem esperou MATCH_FILL_AFTER segundos sai com o que houver e o resto
+   do grid vira bot — o tempo até a partida tem teto.
+
+O grid formado é entregue a todos os tickets dele (long-poll em
+/match/queue/{ticket}): jogadores com builds, pista, `host` (o ticket mais
+antigo do grid, quem registra o resultado) e `seed`, para todos os consoles
+simularem a mesma corrida. O estado é do processo: com vários workers, o
+matchmaking precisa de roteamento fixo (ou um worker só).
+
+`python matchmaking.py --bench` simula filas de mil a dezenas de milhares de
+jogadores e mostra o custo de cada tick e o tempo até a partida.
+"""
+import asyncio, random, sys, time, uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import numpy as np
+
+GRID_SIZE = 8
+
+
+@dataclass
+class Ticket:
+    ticket_id: str
+    user_id: str
+    name: str
+    rating: float
+    ping_ms: float
+    build: dict
+    track: Optional[str]
+    enqueued_at: float
+    match: Optional[dict] = None
+    done_at: Optional[float] = None
+    event: Optional[asyncio.Event] = field(default=None, repr=False)
+    slot: int = field(default=-1, repr=False)   # linha nas colunas do Lobby enquanto espera
+
+
+class Lobby:
+    def __init__(self, tick: float = 0.25, band_base: float = 50, band_growth: float = 20,
+                 band_max: float = 600, ping_base: float = 40, ping_growth: float = 10,
+                 ping_max: float = 250, fill_after: float = 45, scan_max: int = 64,
+                 max_anchors: int = 1024, budget_ms: float = 25, keep_done: float = 60,
+                 size: int = GRID_SIZE,
+                 clock: Callable[[], float] = time.monotonic):
+        self.tick_every = tick
+        self.band_base, self.band_growth, self.band_max = band_base, band_growth, band_max
+        self.ping_base, self.ping_growth, self.ping_max = ping_base, ping_growth, ping_max
+        self.fill_after = fill_after
+        self.scan_max = scan_max
+        self.max_anchors = max_anchors
+        self.budget = budget_ms / 1000
+        self.keep_done = keep_done
+        self.size = size
+        self.clock = clock
+        self._waiting: dict[str, Ticket] = {}
+        # colunas por slot (rating, ping, entrada) mantidas no enqueue/saída, para o
+        # tick não reconstruir arrays de todos os tickets a cada rodada
+        self._cap = 0
+        self._rating = self._ping = self._enq = np.empty(0)
+        self._alive = np.zeros(0, dtype=bool)
+        self._slots: list[Optional[Ticket]] = []
+        self._free: list[int] = []
+        self._by_user: dict[str, str] = {}
+        self._done: OrderedDict[str, Ticket] = OrderedDict()
+        self._waits: deque = deque(maxlen=5000)
+        self.matches_total = 0
+        self.last_tick_ms = 0.0
+        self.cut = False   # último tick parou no orçamento com âncoras pendentes
+
+    @classmethod
+    def from_config(cls) -> "Lobby":
+        import config
+        return cls(tick=config.MATCH_TICK, band_base=config.MATCH_BAND_BASE,
+                   band_growth=config.MATCH_BAND_GROWTH, band_max=config.MATCH_BAND_MAX,
+                   ping_base=config.MATCH_PING_BASE, ping_growth=config.MATCH_PING_GROWTH,
+                   ping_max=config.MATCH_PING_MAX, fill_after=config.MATCH_FILL_AFTER,
+                   scan_max=config.MATCH_SCAN_MAX, max_anchors=config.MATCH_MAX_ANCHORS,
+                   budget_ms=config.MATCH_TICK_BUDGET_MS)
+
+    # ---- fila ----
+
+    def enqueue(self, user_id: str, name: str, rating: float, ping_ms: Optional[float] = None,
+                build: Optional[dict] = None, track: Optional[str] = None) -> Ticket:
+        """Entra na fila; se o usuário já está esperando, devolve o mesmo ticket."""
+        tid = self._by_user.get(user_id)
+        if tid is not None:
+            return self._waiting[tid]
+        t = Ticket(str(uuid.uuid4()), user_id, name, rating, ping_ms if ping_ms is not None else 0.0,
+                   build or {}, track, self.clock())
+        self._waiting[t.ticket_id] = t
+        self._by_user[user_id] = t.ticket_id
+        self._add_slot(t)
+        return t
+
+    def _add_slot(self, t: Ticket):
+        if not self._free:
+            old, self._cap = self._cap, max(1024, self._cap * 2)
+            grow = lambda a, fill: np.concatenate([a, np.full(self._cap - old, fill, dtype=a.dtype)])
+            self._rating, self._ping, self._enq = (grow(self._rating, 0.0), grow(self._ping, 0.0),
+                                                   grow(self._enq, 0.0))
+            self._alive = grow(self._alive, False)
+            self._slots.extend([None] * (self._cap - old))
+            self._free = list(range(self._cap - 1, old - 1, -1))
+        i = self._free.pop()
+        self._rating[i], self._ping[i], self._enq[i] = t.rating, t.ping_ms, t.enqueued_at
+        self._alive[i] = True
+        self._slots[i] = t
+        t.slot = i
+
+    def _drop_slot(self, t: Ticket):
+        self._alive[t.slot] = False
+        self._slots[t.slot] = None
+        self._free.append(t.slot)
+        t.slot = -1
+
+    def waiting_count(self) -> int:
+        return len(self._waiting)
+
+    def get(self, ticket_id: str) -> Optional[Ticket]:
+        return self._waiting.get(ticket_id) or self._done.get(ticket_id)
+
+    def cancel(self, ticket_id: str) -> bool:
+        t = self._waiting.pop(ticket_id, None)
+        if t is None:
+            return False
+        self._by_user.pop(t.user_id, None)
+        self._drop_slot(t)
+        if t.event is not None:
+            t.event.set()
+        return True
+
+    async def wait(self, ticket_id: str, timeout: float) -> Optional[Ticket]:
+        """Espera o grid do ticket por até `timeout` s. None = ticket desconhecido/cancelado."""
+        t = self.get(ticket_id)
+        if t is None or t.match is not None:
+            return t
+        if t.event is None:
+            t.event = asyncio.Event()
+        try:
+            await asyncio.wait_for(t.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.get(ticket_id)
+
+    # ---- formação dos grids ----
+
+    def tick(self, now: Optional[float] = None) -> list[dict]:
+        t0 = time.perf_counter()
+        self.cut = False
+        now = self.clock() if now is None else now
+        # _done está em ordem de done_at: só o começo pode ter expirado
+        while self._done and now - next(iter(self._done.values())).done_at > self.keep_done:
+            self._done.popitem(last=False)
+        idx = np.flatnonzero(self._alive)
+        n = len(idx)
+        if n == 0:
+            self.last_tick_ms = (time.perf_counter() - t0) * 1000
+            return []
+        r, ping, enq = self._rating[idx], self._ping[idx], self._enq[idx]
+        wait = now - enq
+        order = np.argsort(r, kind="stable")
+        sr = r[order]
+        rank = np.empty(n, dtype=np.int64)
+        rank[order] = np.arange(n)
+        band = np.minimum(self.band_base + self.band_growth * wait, self.band_max)
+        pband = np.minimum(self.ping_base + self.ping_growth * wait, self.ping_max)
+        # consultas em ordem de rating: searchsorted bem mais rápido que em ordem aleatória
+        lo, hi = np.empty(n, dtype=np.int64), np.empty(n, dtype=np.int64)
+        lo[order] = np.searchsorted(sr, sr - band[order], "left")
+        hi[order] = np.searchsorted(sr, sr + band[order], "right")
+        fill = wait >= self.fill_after
+        # âncoras do mais antigo para o mais novo, no máximo max_anchors por tick
+        anchors = np.flatnonzero((hi - lo >= self.size) | fill)
+        anchors = anchors[np.argsort(enq[anchors], kind="stable")][:self.max_anchors]
+
+        # o laço só olha vizinhos; listas Python são mais rápidas que escalares NumPy aqui
+        sr_l, order_l, ping_l, pband_l = sr.tolist(), order.tolist(), ping.tolist(), pband.tolist()
+        a_rank, a_lo, a_hi, a_fill = (rank[anchors].tolist(), lo[anchors].tolist(),
+                                      hi[anchors].tolist(), fill[anchors].tolist())
+        slots = self._slots
+        idx_l = idx.tolist()
+        taken = bytearray(n)
+        matches = []
+        deadline = time.perf_counter() + self.budget   # o preparo acima não conta
+        for k, i in enumerate(anchors.tolist()):
+            # só corta depois de formar um grid: um tick cortado sempre avançou a fila,
+            # senão run() repetiria o mesmo tick sem fim
+            if matches and time.perf_counter() > deadline:
+                self.cut = True
+                break
+            if taken[i]:
+                continue
+            picks = [i]
+            ri = sr_l[a_rank[k]]
+            # ping: o grid inteiro tem que caber na menor tolerância dos escolhidos
+            pmin = pmax = ping_l[i]
+            tol = pband_l[i]
+            left, right, lo_i, hi_i = a_rank[k] - 1, a_rank[k] + 1, a_lo[k], a_hi[k]
+            scanned = 0
+            while len(picks) < self.size and scanned < self.scan_max and (left >= lo_i or right < hi_i):
+                if right < hi_i and (left < lo_i or sr_l[right] - ri <= ri - sr_l[left]):
+                    j = order_l[right]
+                    right += 1
+                else:
+                    j = order_l[left]
+                    left -= 1
+                scanned += 1
+                if taken[j]:
+                    continue
+                pj, tj = ping_l[j], min(tol, pband_l[j])
+                if max(pmax, pj) - min(pmin, pj) <= tj:
+                    picks.append(j)
+                    pmin, pmax, tol = min(pmin, pj), max(pmax, pj), tj
+            if len(picks) == self.size or a_fill[k]:
+                for j in picks:
+                    taken[j] = 1
+                matches.append(self._form([slots[idx_l[j]] for j in picks], float(band[i]), now))
+        self.last_tick_ms = (time.perf_counter() - t0) * 1000
+        return matches
+
+    def _form(self, tickets: list[Ticket], band: float, now: float) -> dict:
+        # a âncora pode ser mais nova que um vizinho escolhido: host = o mais antigo
+        host = min(tickets, key=lambda t: t.enqueued_at)
+        match = {
+            "match_id": str(uuid.uuid4()),
+            "seed": random.getrandbits(63),
+            "track": host.track or next((t.track for t in tickets if t.track), None),
+            "host": host.user_id,
+            "band": round(band, 1),
+            "bots": self.size - len(tickets),
+            "players": [{"user_id": t.user_id, "name": t.name, "rating": round(t.rating, 1), **t.build}
+                        for t in sorted(tickets, key=lambda t: t.enqueued_at)],
+        }
+        for t in tickets:
+            del self._waiting[t.ticket_id]
+            self._by_user.pop(t.user_id, None)
+            self._drop_slot(t)
+            t.match, t.done_at = match, now
+            self._done[t.ticket_id] = t
+            self._waits.append(now - t.enqueued_at)
+            if t.event is not None:
+                t.event.set()
+        self.matches_total += 1
+        return match
+
+    async def run(self):
+        while True:
+            self.tick()
+            # tick cortado pelo orçamento: devolve o loop às requisições e continua logo
+            await asyncio.sleep(0 if self.cut else self.tick_every)
+
+    def stats(self) -> dict:
+        xs = sorted(self._waits)
+        pick = lambda q: round(xs[min(len(xs) - 1, int(len(xs) * q))], 2) if xs else None
+        return {"waiting": self.waiting_count(), "matches_total": self.matches_total,
+                "wait_p50_s": pick(0.50), "wait_p95_s": pick(0.95), "wait_max_s": xs[-1] if xs else None,
+                "last_tick_ms": round(self.last_tick_ms, 2)}
+
+
+# ---- benchmark (fila simulada, relógio virtual) ----
+
+def bench(queue_sizes=(1000, 10000, 50000), seconds: float = 60, seed: int = 0):
+    """Fila pré-carregada com Q jogadores e chegadas de Q/20 por segundo durante `seconds`."""
+    print(f"{'fila':>7} {'chegadas/s':>10} {'fila média':>10} {'tick médio':>11} {'tick máx':>9} "
+          f"{'espera p50':>11} {'p95':>7} {'máx':>7} {'c/ bots':>8}")
+    for q in queue_sizes:
+        rng = np.random.default_rng(seed)
+        clock = [0.0]
+        lobby = Lobby(clock=lambda: clock[0])
+        rate = q / 20
+        uid = 0
+
+        def arrive(k):
+            nonlocal uid
+            for rating, ping in zip(rng.normal(1500, 300, k), rng.lognormal(3.5, 0.6, k)):
+                lobby.enqueue(f"u{uid}", f"P{uid}", float(rating), float(ping))
+                uid += 1
+
+        arrive(q)
+        ticks, sizes, bots = [], [], 0
+        while clock[0] < seconds:
+            clock[0] += lobby.tick_every
+            sizes.append(lobby.waiting_count())
+            bots += sum(1 for m in lobby.tick() if m["bots"])
+            ticks.append(lobby.last_tick_ms)
+            while lobby.cut:   # como run(): repete no mesmo instante
+                bots += sum(1 for m in lobby.tick() if m["bots"])
+                ticks.append(lobby.last_tick_ms)
+            arrive(int(rng.poisson(rate * lobby.tick_every)))
+        s = lobby.stats()
+        print(f"{q:>7} {rate:>10.0f} {np.mean(sizes):>10.0f} {np.mean(ticks):>9.1f}ms {max(ticks):>7.1f}ms "
+              f"{s['wait_p50_s']:>10.2f}s {s['wait_p95_s']:>6.2f}s {s['wait_max_s']:>6.2f}s {bots:>8}")
+
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        bench()
+    else:
+        print("uso: python matchmaking.py --bench")
@@ -0,0 +1,258 @@
+"""
+Métricas em processo no formato de texto do Prometheus (/metrics).
+
+Coletores próprios, sem dependência extra: cada observação é um bisect na
+lista de buckets e alguns incrementos de inteiro, e tudo roda no event loop
+(sem locks). A soma cumulativa dos buckets e o texto só são montados no
+scrape. Gauges são funções chamadas no scrape (pools, outbox, lobby), então
+não custam nada por requisição.
+
+- MetricsMiddleware (ASGI puro): latência por rota (o template, ex.
+  /match/queue/{ticket_id}, nunca o path cru), contagem por status e
+  exceções não tratadas.
+- `backend(banco, operação)`: `async with metrics.backend("pg", "login_select"), pg_conn() as conn:`
+  (ou `with`) mede o bloco e conta erros por operação.
+
+`python metrics.py --bench` mede o custo por observação e por requisição.
+"""
+import sys, time
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+import server_timing
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _esc(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_esc(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._v: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._v[labels] = self._v.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for k, v in self._v.items():
+            yield f"{self.name}{_labels(self.labels, k)} {_num(v)}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, labels
+        self.bounds = tuple(buckets)
+        self._series: dict[tuple, list] = {}   # labels -> [contagens por bucket..., +Inf, soma]
+
+    def observe(self, value: float, *labels):
+        s = self._series.get(labels)
+        if s is None:
+            s = self._series[labels] = [0] * (len(self.bounds) + 1) + [0.0]
+        s[bisect_left(self.bounds, value)] += 1
+        s[-1] += value
+
+    def samples(self) -> Iterable[str]:
+        for k, s in self._series.items():
+            acc = 0
+            for bound, n in zip(self.bounds + (float("inf"),), s[:-1]):
+                acc += n
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_num(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labels, k, le)} {acc}"
+            yield f"{self.name}_sum{_labels(self.labels, k)} {repr(s[-1])}"
+            yield f"{self.name}_count{_labels(self.labels, k)} {acc}"
+
+
+class Gauge:
+    """Valor lido no scrape: `fn()` devolve {(rótulos...): valor}.
+    kind="counter" para contadores que já existem em outro objeto (ex. o lobby)."""
+
+    def __init__(self, name: str, help: str, labels: tuple, fn: Callable[[], dict], kind: str = "gauge"):
+        self.name, self.help, self.labels, self.fn, self.kind = name, help, labels, fn, kind
+
+    def samples(self) -> Iterable[str]:
+        try:
+            values = self.fn() or {}
+        except Exception:
+            return
+        for k, v in values.items():
+            if v is not None:
+                yield f"{self.name}{_labels(self.labels, k)} {_num(v)}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list = []
+
+    def register(self, m):
+        self.metrics.append(m)
+        return m
+
+    def counter(self, name, help, labels=()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, labels, fn, kind="gauge") -> Gauge:
+        return self.register(Gauge(name, help, labels, fn, kind))
+
+    def render(self) -> str:
+        out = []
+        for m in self.metrics:
+            out.append(f"# HELP {m.name} {m.help}")
+            out.append(f"# TYPE {m.name} {m.kind}")
+            out.extend(m.samples())
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+HTTP_LATENCY = REGISTRY.histogram("s2_http_request_duration_seconds",
+                                  "Latência das requisições por rota", ("method", "route"))
+HTTP_REQUESTS = REGISTRY.counter("s2_http_requests_total", "Requisições por rota e status",
+                                 ("method", "route", "status"))
+HTTP_EXCEPTIONS = REGISTRY.counter("s2_http_exceptions_total", "Exceções não tratadas por rota",
+                                   ("method", "route"))
+HTTP_IN_FLIGHT = [0]
+REGISTRY.gauge("s2_http_in_flight", "Requisições em andamento", (), lambda: {(): HTTP_IN_FLIGHT[0]})
+BACKEND_LATENCY = REGISTRY.histogram("s2_backend_duration_seconds",
+                                     "Tempo das operações em cada banco", ("backend", "op"))
+BACKEND_ERRORS = REGISTRY.counter("s2_backend_errors_total", "Erros por banco e operação", ("backend", "op"))
+
+
+class backend:
+    """`with backend("pg", "list_users_opponents"):` mede o bloco (inclusive os awaits).
+
+    Na mesma linha do helper: `async with backend("pg", "op"), pg_conn() as conn:`."""
+    __slots__ = ("labels", "t0")
+
+    def __init__(self, backend: str, op: str):
+        self.labels = (backend, op)
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        dt = time.perf_counter() - self.t0
+        BACKEND_LATENCY.observe(dt, *self.labels)
+        t = server_timing.current()
+        if t is not None:
+            t.op(*self.labels, dt)   # só guarda em debug (bloco "_timing")
+        if exc_type is not None:
+            BACKEND_ERRORS.inc(*self.labels)
+        return False
+
+    # também como `async with`, para ir na mesma linha de `async with pg_conn() as conn`
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+class MetricsMiddleware:
+    """Latência/status por template de rota; rotas desconhecidas viram "<sem rota>"."""
+
+    def __init__(self, app, skip: tuple = ("/metrics",)):
+        self.app = app
+        self.skip = skip
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip:
+            return await self.app(scope, receive, send)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT[0] += 1
+        t0 = time.perf_counter()
+        failed = False
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            HTTP_IN_FLIGHT[0] -= 1
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "<sem rota>"
+            method = scope["method"]
+            HTTP_LATENCY.observe(time.perf_counter() - t0, method, path)
+            HTTP_REQUESTS.inc(method, path, str(status[0]))
+            if failed:
+                HTTP_EXCEPTIONS.inc(method, path)
+
+
+# ---- benchmark de overhead ----
+
+def bench(n: int = 200000):
+    import asyncio
+    h = Histogram("x", "", ("a", "b"))
+    t0 = time.perf_counter()
+    for i in range(n):
+        h.observe(0.003, "GET", "/db1/catalog")
+    per_obs = (time.perf_counter() - t0) / n * 1e9
+
+    t0 = time.perf_counter()
+    for _ in range(n):
+        with backend("pg", "bench"):
+            pass
+    per_timer = (time.perf_counter() - t0) / n * 1e9
+
+    class Route:
+        path = "/bench/{id}"
+
+    async def app(scope, receive, send):
+        scope["route"] = Route
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def noop(message):
+        pass
+
+    async def run(a, reqs):
+        scope = {"type": "http", "method": "GET", "path": "/bench/1"}
+        t0 = time.perf_counter()
+        for _ in range(reqs):
+            await a(dict(scope), None, noop)
+        return (time.perf_counter() - t0) / reqs * 1e9
+
+    reqs = n // 4
+    base = asyncio.run(run(app, reqs))
+    wrapped = asyncio.run(run(MetricsMiddleware(app), reqs))
+    t0 = time.perf_counter()
+    body = REGISTRY.render()
+    render_ms = (time.perf_counter() - t0) * 1000
+    print(f"Histogram.observe:        {per_obs:8.0f} ns")
+    print(f"with backend(...):        {per_timer:8.0f} ns")
+    print(f"MetricsMiddleware:        {wrapped - base:8.0f} ns por requisição "
+          f"(app nua {base:.0f} ns, com middleware {wrapped:.0f} ns)")
+    print(f"render (/metrics):        {render_ms:8.2f} ms, {len(body)} bytes")
+
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        bench()
+    else:
+        print("uso: python metrics.py --bench")
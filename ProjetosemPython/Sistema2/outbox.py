@@ -0,0 +1,254 @@
+"""
+Outbox durável para resultados de corrida (ingestão assíncrona de /race/finish).
+
+O payload validado é gravado num SQLite local (WAL, synchronous=FULL) antes de
+responder 202; um flusher em background drena a fila para o Neo4j em lotes,
+com retry exponencial. Como a fila está em disco, o que não foi confirmado é
+reenviado depois de um crash/restart. A gravação no grafo é idempotente por
+race_id, então reenviar um lote já gravado não duplica nada.
+
+Cada lote retirado recebe um "lease" (next_try no futuro) antes de ser enviado,
+então mais de um processo pode compartilhar o mesmo arquivo sem pegar as
+mesmas linhas.
+
+Se um lote falha com erro não transitório (ex.: payload que o Neo4j recusa), os
+itens são reenviados um a um para que um registro ruim não trave a fila. Um
+item que falha com erro não transitório `max_attempts` vezes vai para a tabela
+outbox_dead (dead-letter, contada em stats()["dead"]) e sai da fila, para não
+manter depth/flush_lag_s acima de zero para sempre. Erros transitórios (banco
+fora do ar) nunca descartam: o item espera com backoff até o banco voltar.
+
+Depois de corrigir a causa, os itens do dead-letter voltam para a fila com
+requeue_dead() (POST /race/outbox/requeue ou `python outbox.py --requeue`).
+"""
+import asyncio, sqlite3, sys, threading, time
+from typing import Awaitable, Callable, Optional
+
+DDL = """
+CREATE TABLE IF NOT EXISTS outbox (
+    seq         INTEGER PRIMARY KEY AUTOINCREMENT,
+    race_id     TEXT NOT NULL UNIQUE,
+    payload     TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    next_try    REAL NOT NULL DEFAULT 0,
+    last_error  TEXT
+)
+"""
+
+DEAD_DDL = """
+CREATE TABLE IF NOT EXISTS outbox_dead (
+    seq         INTEGER PRIMARY KEY,
+    race_id     TEXT NOT NULL,
+    payload     TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    attempts    INTEGER NOT NULL,
+    last_error  TEXT,
+    dead_at     REAL NOT NULL
+)
+"""
+
+FlushFn = Callable[[list[tuple[str, str]]], Awaitable[None]]
+
+
+class Outbox:
+    def __init__(self, path: str, batch_size: int = 200, lease: float = 60.0,
+                 base_backoff: float = 1.0, max_backoff: float = 300.0, idle_wait: float = 1.0,
+                 transient_errors: tuple = (), max_attempts: int = 5):
+        self.path = path
+        self.batch_size = batch_size
+        self.lease = lease
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.idle_wait = idle_wait
+        self.transient_errors = transient_errors
+        self.max_attempts = max_attempts   # 0 = sem limite
+        self._lock = threading.Lock()
+        self._wake = asyncio.Event()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute(DDL)
+        self._db.execute(DEAD_DDL)
+        self.flushed_total = 0
+        self.last_flush_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    # ---- operações no SQLite (síncronas; chamadas via to_thread) ----
+
+    def _append(self, race_id: str, payload: str):
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO outbox (race_id, payload, enqueued_at) VALUES (?, ?, ?)",
+                             (race_id, payload, time.time()))
+
+    def _take(self) -> list[tuple[int, str, str]]:
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    "SELECT seq, race_id, payload FROM outbox WHERE next_try <= ? ORDER BY seq LIMIT ?",
+                    (now, self.batch_size)).fetchall()
+                if rows:
+                    self._db.executemany("UPDATE outbox SET next_try = ? WHERE seq = ?",
+                                         [(now + self.lease, r[0]) for r in rows])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return rows
+
+    def _ack(self, seqs: list[int]):
+        with self._lock:
+            self._db.executemany("DELETE FROM outbox WHERE seq = ?", [(s,) for s in seqs])
+
+    def _fail(self, seqs: list[int], err: str, permanent: bool = False) -> int:
+        """Reagenda com backoff; erro não transitório no limite de tentativas vai
+        para outbox_dead. Devolve quantos itens foram descartados."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(
+                    """UPDATE outbox SET attempts = attempts + 1, last_error = ?,
+                           next_try = ? + MIN(?, ? * (1 << MIN(attempts, 16)))
+                       WHERE seq = ?""",
+                    [(err, now, self.max_backoff, self.base_backoff, s) for s in seqs])
+                dead = 0
+                if permanent and self.max_attempts:
+                    marks = ",".join("?" * len(seqs))
+                    cond = f"seq IN ({marks}) AND attempts >= ?"
+                    dead = self._db.execute(
+                        f"""INSERT INTO outbox_dead (seq, race_id, payload, enqueued_at, attempts, last_error, dead_at)
+                            SELECT seq, race_id, payload, enqueued_at, attempts, last_error, ?
+                            FROM outbox WHERE {cond}""", (now, *seqs, self.max_attempts)).rowcount
+                    self._db.execute(f"DELETE FROM outbox WHERE {cond}", (*seqs, self.max_attempts))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return dead
+
+    def requeue_dead(self, race_ids: Optional[list[str]] = None) -> int:
+        """Devolve itens do outbox_dead para a fila (todos, ou só os race_ids
+        dados) com as tentativas zeradas. Devolve quantos voltaram."""
+        cond, args = "", ()
+        if race_ids is not None:
+            if not race_ids:
+                return 0
+            cond, args = f"WHERE race_id IN ({','.join('?' * len(race_ids))})", tuple(race_ids)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # INSERT OR IGNORE: o mesmo race_id pode ter sido reenviado e estar na fila
+                n = self._db.execute(
+                    f"""INSERT OR IGNORE INTO outbox (race_id, payload, enqueued_at)
+                        SELECT race_id, payload, enqueued_at FROM outbox_dead {cond} ORDER BY seq""",
+                    args).rowcount
+                self._db.execute(f"DELETE FROM outbox_dead {cond}", args)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return n
+
+    def stats(self) -> dict:
+        with self._lock:
+            depth, oldest, retrying = self._db.execute(
+                "SELECT COUNT(*), MIN(enqueued_at), COALESCE(SUM(attempts > 0), 0) FROM outbox").fetchone()
+            dead, last_dead = self._db.execute("SELECT COUNT(*), MAX(dead_at) FROM outbox_dead").fetchone()
+        now = time.time()
+        return {
+            "depth": depth,
+            "retrying": retrying,
+            "flush_lag_s": round(now - oldest, 3) if oldest else 0.0,  # idade do item mais antigo
+            "dead": dead,                # descartados após max_attempts erros não transitórios
+            "last_dead_at": last_dead,
+            "flushed_total": self.flushed_total,
+            "last_flush_at": self.last_flush_at,
+            "last_error": self.last_error,
+        }
+
+    # ---- API assíncrona ----
+
+    async def append(self, race_id: str, payload: str):
+        """Grava de forma durável (fsync) e acorda o flusher."""
+        await asyncio.to_thread(self._append, race_id, payload)
+        self._wake.set()
+
+    async def requeue(self, race_ids: Optional[list[str]] = None) -> int:
+        """requeue_dead() fora do event loop; acorda o flusher."""
+        n = await asyncio.to_thread(self.requeue_dead, race_ids)
+        if n:
+            self._wake.set()
+        return n
+
+    async def flush_once(self, flush: FlushFn) -> int:
+        rows = await asyncio.to_thread(self._take)
+        if not rows:
+            return 0
+        seqs = [r[0] for r in rows]
+        try:
+            await flush([(r[1], r[2]) for r in rows])
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            transient = isinstance(e, self.transient_errors)
+            if len(rows) == 1 or transient:
+                await asyncio.to_thread(self._fail, seqs, self.last_error, not transient)
+                raise
+            return await self._flush_one_by_one(rows, flush)
+        await self._done(seqs)
+        return len(rows)
+
+    async def _flush_one_by_one(self, rows, flush: FlushFn) -> int:
+        ok, err = [], None
+        for seq, race_id, payload in rows:
+            try:
+                await flush([(race_id, payload)])
+                ok.append(seq)
+            except Exception as e:
+                err = f"{type(e).__name__}: {e}"
+                await asyncio.to_thread(self._fail, [seq], err, not isinstance(e, self.transient_errors))
+        if ok:
+            await self._done(ok)
+        if err is not None:
+            self.last_error = err
+        return len(ok)
+
+    async def _done(self, seqs: list[int]):
+        await asyncio.to_thread(self._ack, seqs)
+        self.flushed_total += len(seqs)
+        self.last_flush_at = time.time()
+        self.last_error = None
+
+    async def run(self, flush: FlushFn):
+        """Loop do flusher: drena enquanto houver itens prontos, senão espera."""
+        while True:
+            try:
+                n = await self.flush_once(flush)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                n = 0  # já reagendado com backoff em _fail
+            if n == 0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.idle_wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+if __name__ == "__main__":
+    if "--requeue" in sys.argv:
+        # com a API no ar o flusher pega os itens no próximo ciclo (idle_wait)
+        import config
+        ids = sys.argv[sys.argv.index("--requeue") + 1:] or None
+        box = Outbox(config.OUTBOX_PATH)
+        print(f"[outbox] {box.requeue_dead(ids)} itens devolvidos à fila")
+        box.close()
+    else:
+        print("uso: python outbox.py --requeue [race_id ...]")
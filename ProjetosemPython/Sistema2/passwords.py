@@ -0,0 +1,113 @@
+"""
+Hash de senhas com scrypt, executado fora do event loop.
+
+Formato gravado em usuarios.senha:
+
+    scrypt$<n>$<r>$<p>$<salt b64>$<hash b64>
+
+Qualquer valor fora desse formato é tratado como senha legada em texto puro
+(seeds do PopRDB.py / migrate_pwd_plain.py) e é regravado com scrypt no
+próximo login bem-sucedido, assim como hashes com custo diferente do atual.
+Um valor que começa com "scrypt$" mas está corrompido (ex.: vindo de uma
+importação em massa) nunca confere: o login falha com 401, não com 500.
+
+hashlib.scrypt libera o GIL durante o cálculo, então um ThreadPoolExecutor
+limitado usa vários núcleos sem travar os workers que atendem requests.
+"""
+import asyncio, base64, binascii, hashlib, hmac, os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+PREFIX = "scrypt"
+SALT_BYTES = 16
+KEY_BYTES = 32
+# teto dos parâmetros lidos do banco: um valor corrompido não pode pedir GBs ao scrypt
+MAX_N, MAX_R, MAX_P = 1 << 20, 32, 16
+
+
+def _b64(b: bytes) -> str:
+    return base64.b64encode(b).decode("ascii")
+
+def _maxmem(n: int, r: int, p: int) -> int:
+    # scrypt precisa de ~128*r*(n+p) bytes; folga para o OpenSSL
+    return 128 * r * (n + p) + 1024 * 1024
+
+def hash_password(password: str, n: int, r: int, p: int) -> str:
+    salt = os.urandom(SALT_BYTES)
+    dk = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                        maxmem=_maxmem(n, r, p), dklen=KEY_BYTES)
+    return f"{PREFIX}${n}${r}${p}${_b64(salt)}${_b64(dk)}"
+
+def is_legacy(stored: str) -> bool:
+    return not stored.startswith(PREFIX + "$")
+
+def _params(stored: str) -> tuple[int, int, int, bytes, bytes]:
+    """Campos de um hash scrypt; ValueError se o valor estiver corrompido."""
+    try:
+        _, n, r, p, salt, dk = stored.split("$")
+        n, r, p = int(n), int(r), int(p)
+        salt, dk = base64.b64decode(salt, validate=True), base64.b64decode(dk, validate=True)
+    except (ValueError, binascii.Error) as e:
+        raise ValueError(f"hash scrypt inválido: {e}") from None
+    if not (1 < n <= MAX_N and n & (n - 1) == 0 and 0 < r <= MAX_R and 0 < p <= MAX_P and salt and dk):
+        raise ValueError("hash scrypt com parâmetros fora do aceito")
+    return n, r, p, salt, dk
+
+def verify_password(password: str, stored: str) -> bool:
+    if is_legacy(stored):
+        return hmac.compare_digest(stored.encode(), password.encode())
+    try:
+        n, r, p, salt, dk = _params(stored)
+    except ValueError:
+        return False
+    got = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                         maxmem=_maxmem(n, r, p), dklen=len(dk))
+    return hmac.compare_digest(got, dk)
+
+def needs_rehash(stored: str, n: int, r: int, p: int) -> bool:
+    if is_legacy(stored):
+        return True
+    try:
+        return _params(stored)[:3] != (n, r, p)
+    except ValueError:
+        return True
+
+
+class Hasher:
+    """Pool limitado de threads para hash/verificação + fila de espera limitada.
+
+    Como os pools dos bancos, abre no startup (`open()`) e fecha no shutdown
+    (`shutdown()`); pode ser reaberto (vários lifespans no mesmo processo)."""
+
+    def __init__(self, workers: int, n: int, r: int, p: int, max_pending: int):
+        self.n, self.r, self.p = n, r, p
+        self.workers, self.max_pending = workers, max_pending
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def open(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pwd-hash")
+            self._slots = asyncio.Semaphore(self.max_pending)
+
+    async def _submit(self, fn, *args):
+        if self._pool is None:
+            raise RuntimeError("Hasher fechado (open() não chamado no startup).")
+        async with self._slots:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(hash_password, password, self.n, self.r, self.p)
+
+    async def verify(self, password: str, stored: str) -> bool:
+        if is_legacy(stored):
+            return verify_password(password, stored)  # comparação barata, não ocupa o pool
+        return await self._submit(verify_password, password, stored)
+
+    def needs_rehash(self, stored: str) -> bool:
+        return needs_rehash(stored, self.n, self.r, self.p)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._slots = None
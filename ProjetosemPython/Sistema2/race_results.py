@@ -0,0 +1,289 @@
+"""
+Resultados de corrida no RDB (Postgres), particionados por mês.
+
+Tabelas (migração v7 do schema.py):
+
+- races (race_id, finished_at, mode, track, players)
+- race_results (uma linha por jogador: posição, pontos, tempo e as peças);
+  a chave é (race_id, finished_at, slot), slot = ordem do jogador no
+  payload, porque empates repetem a posição (migração v9)
+- player_totals (acumulado por usuário; atende o ranking "de sempre")
+
+races e race_results são PARTITION BY RANGE (finished_at), uma partição por
+mês UTC (races_202610, race_results_202610, ...). As partições são criadas pela
+função SQL mk_ensure_race_partitions: a migração e o startup da API criam o
+mês atual e os próximos RACE_PARTITIONS_AHEAD; a gravação garante o mês de
+qualquer corrida fora disso (backfill). Rankings por período/pista filtram
+por finished_at e só leem as partições do intervalo.
+
+Um lote inteiro de corridas é gravado por um único INSERT: os arrays de
+colunas entram via unnest, corridas já gravadas (replay do outbox) são
+ignoradas pela chave primária e só as linhas novas somam em player_totals;
+o statement devolve os race_id gravados agora.
+Jogadores sem UUID (bots, "you") entram com user_id NULL e ficam fora dos
+rankings.
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+# pontos por posição (1º..12º); posições além da tabela valem 0
+POINTS = (15, 12, 10, 9, 8, 7, 6, 5, 4, 3, 2, 1)
+
+PERIODS = ("all", "day", "week", "month", "year")
+
+ENSURE_PARTITIONS_FN = """
+CREATE OR REPLACE FUNCTION mk_ensure_race_partitions(start_at TIMESTAMPTZ, months INT)
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    m TIMESTAMP := date_trunc('month', start_at AT TIME ZONE 'UTC');
+    lo TIMESTAMPTZ;
+    hi TIMESTAMPTZ;
+    created INT := 0;
+BEGIN
+    -- serializa workers criando a mesma partição
+    PERFORM pg_advisory_xact_lock(hashtext('mk_race_partitions'));
+    FOR i IN 0 .. months - 1 LOOP
+        lo := (m + make_interval(months => i)) AT TIME ZONE 'UTC';
+        hi := (m + make_interval(months => i + 1)) AT TIME ZONE 'UTC';
+        IF to_regclass('races_' || to_char(lo AT TIME ZONE 'UTC', 'YYYYMM')) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I PARTITION OF races FOR VALUES FROM (%L) TO (%L)',
+                           'races_' || to_char(lo AT TIME ZONE 'UTC', 'YYYYMM'), lo, hi);
+            created := created + 1;
+        END IF;
+        IF to_regclass('race_results_' || to_char(lo AT TIME ZONE 'UTC', 'YYYYMM')) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I PARTITION OF race_results FOR VALUES FROM (%L) TO (%L)',
+                           'race_results_' || to_char(lo AT TIME ZONE 'UTC', 'YYYYMM'), lo, hi);
+            created := created + 1;
+        END IF;
+    END LOOP;
+    RETURN created;
+END $$
+"""
+
+# passos pg da migração v9: empates (mesma posição) não violam mais a chave.
+# Linhas antigas têm posições distintas por corrida, então slot = position basta.
+SLOT_MIGRATION_SQL = [
+    "ALTER TABLE race_results ADD COLUMN IF NOT EXISTS slot SMALLINT",
+    "UPDATE race_results SET slot = position WHERE slot IS NULL",
+    "ALTER TABLE race_results ALTER COLUMN slot SET NOT NULL",
+    "ALTER TABLE race_results DROP CONSTRAINT IF EXISTS race_results_pkey",
+    "ALTER TABLE race_results ADD PRIMARY KEY (race_id, finished_at, slot)",
+]
+
+# passos pg da migração v7
+MIGRATION_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS races (
+        race_id     UUID NOT NULL,
+        finished_at TIMESTAMPTZ NOT NULL,
+        mode        TEXT,
+        track       TEXT,
+        players     SMALLINT NOT NULL,
+        PRIMARY KEY (race_id, finished_at)
+    ) PARTITION BY RANGE (finished_at)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS race_results (
+        race_id     UUID NOT NULL,
+        finished_at TIMESTAMPTZ NOT NULL,
+        position    SMALLINT NOT NULL,
+        user_id     UUID,
+        name        TEXT,
+        track       TEXT,
+        points      SMALLINT NOT NULL,
+        time_ms     INT,
+        character   TEXT,
+        kart        TEXT,
+        wheel       TEXT,
+        glider      TEXT,
+        PRIMARY KEY (race_id, finished_at, position)
+    ) PARTITION BY RANGE (finished_at)
+    """,
+    "CREATE INDEX IF NOT EXISTS races_track_idx ON races (track, finished_at)",
+    # ranking por período: agrega por usuário dentro das partições do intervalo
+    "CREATE INDEX IF NOT EXISTS race_results_user_idx ON race_results (user_id, finished_at) "
+    "WHERE user_id IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS race_results_track_idx ON race_results (track, finished_at) "
+    "INCLUDE (user_id, points, position) WHERE user_id IS NOT NULL",
+    """
+    CREATE TABLE IF NOT EXISTS player_totals (
+        user_id UUID PRIMARY KEY,
+        name    TEXT,
+        races   INT NOT NULL DEFAULT 0,
+        wins    INT NOT NULL DEFAULT 0,
+        podiums INT NOT NULL DEFAULT 0,
+        points  BIGINT NOT NULL DEFAULT 0,
+        best_ms INT,
+        last_race_at TIMESTAMPTZ
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS player_totals_rank_idx ON player_totals (points DESC, wins DESC)",
+    ENSURE_PARTITIONS_FN,
+    # mês atual e os dois seguintes; o startup da API estende até RACE_PARTITIONS_AHEAD
+    "SELECT mk_ensure_race_partitions(now(), 3)",
+]
+
+INSERT_SQL = """
+WITH batch AS (
+    SELECT * FROM unnest(%(race_id)s::uuid[], %(finished_at)s::timestamptz[], %(mode)s::text[],
+                         %(track)s::text[], %(players)s::smallint[])
+        AS b(race_id, finished_at, mode, track, players)
+), new_races AS (
+    INSERT INTO races (race_id, finished_at, mode, track, players)
+    SELECT race_id, finished_at, mode, track, players FROM batch
+    ON CONFLICT DO NOTHING
+    RETURNING race_id, finished_at
+), new_results AS (
+    INSERT INTO race_results (race_id, finished_at, slot, position, user_id, name, track, points,
+                              time_ms, character, kart, wheel, glider)
+    SELECT r.race_id, r.finished_at, r.slot, r.position, r.user_id, r.name, r.track, r.points,
+           r.time_ms, r.character, r.kart, r.wheel, r.glider
+    FROM unnest(%(r_race_id)s::uuid[], %(r_finished_at)s::timestamptz[], %(r_slot)s::smallint[],
+                %(r_position)s::smallint[], %(r_user_id)s::uuid[], %(r_name)s::text[],
+                %(r_track)s::text[], %(r_points)s::smallint[], %(r_time_ms)s::int[],
+                %(r_character)s::text[], %(r_kart)s::text[], %(r_wheel)s::text[], %(r_glider)s::text[])
+        AS r(race_id, finished_at, slot, position, user_id, name, track, points,
+             time_ms, character, kart, wheel, glider)
+    JOIN new_races USING (race_id, finished_at)
+    RETURNING user_id, name, position, points, time_ms, finished_at
+), totals AS (
+    INSERT INTO player_totals AS t (user_id, name, races, wins, podiums, points, best_ms, last_race_at)
+    SELECT user_id, max(name), count(*), count(*) FILTER (WHERE position = 1),
+           count(*) FILTER (WHERE position <= 3), sum(points), min(time_ms), max(finished_at)
+    FROM new_results
+    WHERE user_id IS NOT NULL
+    GROUP BY user_id
+    ORDER BY user_id  -- mesma ordem de locks entre lotes concorrentes
+    ON CONFLICT (user_id) DO UPDATE SET
+        name = EXCLUDED.name,
+        races = t.races + EXCLUDED.races,
+        wins = t.wins + EXCLUDED.wins,
+        podiums = t.podiums + EXCLUDED.podiums,
+        points = t.points + EXCLUDED.points,
+        best_ms = LEAST(t.best_ms, EXCLUDED.best_ms),
+        last_race_at = GREATEST(t.last_race_at, EXCLUDED.last_race_at)
+)
+-- só as corridas gravadas agora (o rating é atualizado só para elas)
+SELECT race_id::text FROM new_races
+"""
+
+TOTALS_SQL = """
+SELECT user_id::text, name, races, wins, podiums, points, best_ms
+FROM player_totals
+ORDER BY points DESC, wins DESC
+LIMIT %(limit)s
+"""
+
+# o filtro em finished_at deixa o planner podar as partições; {track} vira
+# "AND track = %(track)s" no ranking de uma pista (usa race_results_track_idx)
+PERIOD_SQL = """
+WITH top AS (
+    SELECT user_id, count(*) AS races, count(*) FILTER (WHERE position = 1) AS wins,
+           count(*) FILTER (WHERE position <= 3) AS podiums, sum(points) AS points,
+           min(time_ms) AS best_ms
+    FROM race_results
+    WHERE user_id IS NOT NULL
+      AND finished_at >= %(since)s AND finished_at < %(until)s
+      {track}
+    GROUP BY user_id
+    ORDER BY points DESC, wins DESC
+    LIMIT %(limit)s
+)
+SELECT top.user_id::text, coalesce(u.nome, t.name), top.races, top.wins, top.podiums, top.points, top.best_ms
+FROM top
+LEFT JOIN usuarios u ON u.id = top.user_id
+LEFT JOIN player_totals t ON t.user_id = top.user_id
+ORDER BY top.points DESC, top.wins DESC
+"""
+
+COLUMNS = ("user_id", "name", "races", "wins", "podiums", "points", "best_ms")
+
+
+def points_for(position: Optional[int]) -> int:
+    if not position or position < 1 or position > len(POINTS):
+        return 0
+    return POINTS[position - 1]
+
+
+def _uuid(v) -> Optional[str]:
+    try:
+        return str(uuid.UUID(str(v)))
+    except (TypeError, ValueError):
+        return None
+
+
+def month_start(ts: datetime) -> datetime:
+    ts = ts.astimezone(timezone.utc)
+    return ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def batch_params(races: list[tuple[str, dict, datetime]]) -> dict:
+    """[(race_id, payload_dict, finished_at)] -> arrays por coluna para INSERT_SQL."""
+    p = {k: [] for k in ("race_id", "finished_at", "mode", "track", "players")}
+    r = {k: [] for k in ("race_id", "finished_at", "slot", "position", "user_id", "name", "track",
+                         "points", "time_ms", "character", "kart", "wheel", "glider")}
+    for race_id, payload, ts in races:
+        track = (payload.get("track") or {}).get("name")
+        players = payload.get("players", [])
+        for k, v in (("race_id", race_id), ("finished_at", ts), ("mode", payload.get("mode")),
+                     ("track", track), ("players", len(players))):
+            p[k].append(v)
+        for slot, pl in enumerate(players, 1):
+            row = {
+                "race_id": race_id, "finished_at": ts, "slot": slot, "position": pl.get("position"),
+                "user_id": _uuid(pl.get("id")), "name": pl.get("name"), "track": track,
+                "points": points_for(pl.get("position")), "time_ms": pl.get("time_ms"),
+                "character": (pl.get("character") or {}).get("name"),
+                "kart": (pl.get("kart") or {}).get("name"),
+                "wheel": (pl.get("wheel") or {}).get("name"),
+                "glider": (pl.get("glider") or {}).get("name"),
+            }
+            for k, v in row.items():
+                r[k].append(v)
+    return {**p, **{"r_" + k: v for k, v in r.items()}}
+
+
+def period_bounds(period: str, now: Optional[datetime] = None) -> tuple[datetime, datetime]:
+    """Início do dia/semana/mês/ano atual (UTC) até o fim do mesmo período."""
+    now = (now or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "day":
+        return day, day + timedelta(days=1)
+    if period == "week":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=7)
+    if period == "month":
+        start = month_start(now)
+        return start, (start + timedelta(days=32)).replace(day=1)
+    if period == "year":
+        start = day.replace(month=1, day=1)
+        return start, start.replace(year=start.year + 1)
+    raise ValueError(f"período desconhecido: {period}")
+
+
+class PartitionGuard:
+    """Lembra quais meses já têm partição neste processo; só vai ao banco para um mês novo."""
+
+    def __init__(self):
+        self.months: set[datetime] = set()
+
+    async def ensure(self, conn, timestamps) -> int:
+        created = 0
+        for m in sorted({month_start(ts) for ts in timestamps} - self.months):
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT mk_ensure_race_partitions(%s, 1)", (m,))
+                created += (await cur.fetchone())[0]
+            self.months.add(m)
+        return created
+
+    async def ensure_ahead(self, conn, months: int) -> int:
+        now = month_start(datetime.now(timezone.utc))
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT mk_ensure_race_partitions(%s, %s)", (now, months + 1))
+            created = (await cur.fetchone())[0]
+        m = now
+        for _ in range(months + 1):
+            self.months.add(m)
+            m = (m + timedelta(days=32)).replace(day=1)
+        return created
@@ -0,0 +1,198 @@
+"""
+Agregados de uso e vitórias mantidos no grafo (DB2) a cada corrida gravada.
+
+Na mesma transação que grava as corridas (api.save_races_to_neo4j):
+
+- cada peça (:Character/:Kart/:Wheel/:Glider) acumula picks, wins, podiums e
+  pos_sum (posição média = pos_sum / picks);
+- cada :Track acumula races e runners;
+- cada combinação personagem+kart+roda+glider vira um nó :Combo com os
+  mesmos contadores;
+- (:Person)-[:USES {picks, wins}]->(:Kart) responde "quem mais usa cada kart".
+
+Só corridas criadas agora entram na conta (SAVE_RACES_CYPHER devolve quais
+race_id eram novos), então reenviar um lote pelo outbox não conta duas vezes.
+Os deltas do lote são somados em Python e aplicados em ordem de chave, o que
+reduz escritas nos nós mais disputados e mantém a mesma ordem de locks entre
+transações concorrentes.
+
+As rotas /stats/* leem só esses contadores: o custo depende do tamanho do
+catálogo, não do número de corridas no grafo.
+"""
+from collections import defaultdict
+
+PART_LABELS = {"character": "Character", "kart": "Kart", "wheel": "Wheel", "glider": "Glider"}
+KIND_TO_SLOT = {"characters": "character", "karts": "kart", "wheels": "wheel", "gliders": "glider"}
+UNKNOWN = "Desconhecido"
+
+PART_CYPHER = """
+UNWIND $rows AS row
+MERGE (n:{label} {{name: row.name}})
+SET n.picks   = coalesce(n.picks, 0)   + row.picks,
+    n.wins    = coalesce(n.wins, 0)    + row.wins,
+    n.podiums = coalesce(n.podiums, 0) + row.podiums,
+    n.pos_sum = coalesce(n.pos_sum, 0) + row.pos_sum
+"""
+
+TRACK_CYPHER = """
+UNWIND $rows AS row
+MERGE (t:Track {name: row.name})
+SET t.races   = coalesce(t.races, 0)   + row.races,
+    t.runners = coalesce(t.runners, 0) + row.runners
+"""
+
+COMBO_CYPHER = """
+UNWIND $rows AS row
+MERGE (c:Combo {key: row.key})
+ON CREATE SET c.character = row.character, c.kart = row.kart,
+              c.wheel = row.wheel, c.glider = row.glider
+SET c.picks   = coalesce(c.picks, 0)   + row.picks,
+    c.wins    = coalesce(c.wins, 0)    + row.wins,
+    c.podiums = coalesce(c.podiums, 0) + row.podiums,
+    c.pos_sum = coalesce(c.pos_sum, 0) + row.pos_sum
+"""
+
+USES_CYPHER = """
+UNWIND $rows AS row
+MATCH (p:Person {id: row.person})
+MERGE (k:Kart {name: row.kart})
+MERGE (p)-[u:USES]->(k)
+SET u.picks = coalesce(u.picks, 0) + row.picks,
+    u.wins  = coalesce(u.wins, 0)  + row.wins
+"""
+
+
+def _names(pl: dict) -> tuple:
+    return tuple(pl.get(slot) or UNKNOWN for slot in PART_LABELS)
+
+
+def aggregate(races: list[dict]) -> dict:
+    """Soma os deltas de um lote de corridas (linhas de api._race_row)."""
+    parts = {slot: defaultdict(lambda: [0, 0, 0, 0]) for slot in PART_LABELS}
+    combos = defaultdict(lambda: [0, 0, 0, 0])
+    tracks = defaultdict(lambda: [0, 0])
+    uses = defaultdict(lambda: [0, 0])
+    for race in races:
+        t = tracks[race.get("track") or UNKNOWN]
+        t[0] += 1
+        t[1] += len(race["players"])
+        for pl in race["players"]:
+            pos = pl.get("position") or 0
+            d = (1, int(pos == 1), int(1 <= pos <= 3), pos)
+            names = _names(pl)
+            for slot, name in zip(PART_LABELS, names):
+                acc = parts[slot][name]
+                for i in range(4):
+                    acc[i] += d[i]
+            acc = combos[names]
+            for i in range(4):
+                acc[i] += d[i]
+            if pl.get("id"):
+                u = uses[(pl["id"], names[1])]
+                u[0] += 1
+                u[1] += d[1]
+
+    def counters(c):
+        return {"picks": c[0], "wins": c[1], "podiums": c[2], "pos_sum": c[3]}
+
+    return {
+        "parts": {slot: [{"name": n, **counters(c)} for n, c in sorted(rows.items())]
+                  for slot, rows in parts.items()},
+        "combos": [{"key": "|".join(k), "character": k[0], "kart": k[1], "wheel": k[2], "glider": k[3],
+                    **counters(c)} for k, c in sorted(combos.items())],
+        "tracks": [{"name": n, "races": c[0], "runners": c[1]} for n, c in sorted(tracks.items())],
+        "uses": [{"person": p, "kart": k, "picks": c[0], "wins": c[1]} for (p, k), c in sorted(uses.items())],
+    }
+
+
+async def apply(tx, races: list[dict]):
+    """Aplica os agregados de `races` (só as corridas novas) dentro da transação `tx`."""
+    if not races:
+        return
+    agg = aggregate(races)
+    for slot, label in PART_LABELS.items():
+        res = await tx.run(PART_CYPHER.format(label=label), rows=agg["parts"][slot])
+        await res.consume()
+    for cypher, rows in ((TRACK_CYPHER, agg["tracks"]), (COMBO_CYPHER, agg["combos"]),
+                         (USES_CYPHER, agg["uses"])):
+        res = await tx.run(cypher, rows=rows)
+        await res.consume()
+
+
+# ---- leitura (/stats/*) ----
+
+SORTS = {
+    "picks": "picks DESC", "wins": "wins DESC", "podiums": "podiums DESC",
+    "win_rate": "win_rate DESC, picks DESC", "avg_position": "avg_position ASC, picks DESC",
+}
+
+PART_STATS_CYPHER = """
+MATCH (n:{label}) WHERE n.picks > 0
+WITH n.name AS name, n.picks AS picks, n.wins AS wins, n.podiums AS podiums,
+     toFloat(n.pos_sum) / n.picks AS avg_position, toFloat(n.wins) / n.picks AS win_rate
+RETURN name, picks, wins, podiums, avg_position, win_rate
+ORDER BY {order} LIMIT $limit
+"""
+
+COMBO_STATS_CYPHER = """
+MATCH (c:Combo) WHERE c.picks >= $min_picks
+WITH c.character AS character, c.kart AS kart, c.wheel AS wheel, c.glider AS glider,
+     c.picks AS picks, c.wins AS wins, c.podiums AS podiums,
+     toFloat(c.pos_sum) / c.picks AS avg_position, toFloat(c.wins) / c.picks AS win_rate
+RETURN character, kart, wheel, glider, picks, wins, podiums, avg_position, win_rate
+ORDER BY {order} LIMIT $limit
+"""
+
+TRACK_STATS_CYPHER = """
+MATCH (t:Track) WHERE t.races > 0
+RETURN t.name AS name, t.races AS races, t.runners AS runners
+ORDER BY races DESC LIMIT $limit
+"""
+
+KART_USERS_CYPHER = """
+MATCH (p:Person)-[u:USES]->(:Kart {name: $kart})
+RETURN p.id AS id, p.name AS name, u.picks AS picks, u.wins AS wins
+ORDER BY picks DESC, wins DESC LIMIT $limit
+"""
+
+# preenche os contadores a partir das corridas que já existiam (migração v6)
+BACKFILL_CYPHER = [
+    """
+    MATCH (:Person)-[res:RACED_IN]->(:Race)
+    WITH coalesce(res.{slot}, '{unknown}') AS name, count(*) AS picks,
+         sum(CASE WHEN res.position = 1 THEN 1 ELSE 0 END) AS wins,
+         sum(CASE WHEN res.position <= 3 THEN 1 ELSE 0 END) AS podiums,
+         sum(coalesce(res.position, 0)) AS pos_sum
+    MERGE (n:{label} {{name: name}})
+    SET n.picks = picks, n.wins = wins, n.podiums = podiums, n.pos_sum = pos_sum
+    """.format(slot=slot, label=label, unknown=UNKNOWN)
+    for slot, label in PART_LABELS.items()
+] + [
+    """
+    MATCH (r:Race) WHERE r.track IS NOT NULL
+    OPTIONAL MATCH (:Person)-[res:RACED_IN]->(r)
+    WITH r.track AS name, r, count(res) AS n
+    WITH name, count(r) AS races, sum(n) AS runners
+    MERGE (t:Track {name: name}) SET t.races = races, t.runners = runners
+    """,
+    f"""
+    MATCH (:Person)-[res:RACED_IN]->(:Race)
+    WITH [coalesce(res.character, '{UNKNOWN}'), coalesce(res.kart, '{UNKNOWN}'),
+          coalesce(res.wheel, '{UNKNOWN}'), coalesce(res.glider, '{UNKNOWN}')] AS k,
+         count(*) AS picks,
+         sum(CASE WHEN res.position = 1 THEN 1 ELSE 0 END) AS wins,
+         sum(CASE WHEN res.position <= 3 THEN 1 ELSE 0 END) AS podiums,
+         sum(coalesce(res.position, 0)) AS pos_sum
+    MERGE (c:Combo {{key: k[0] + '|' + k[1] + '|' + k[2] + '|' + k[3]}})
+    SET c.character = k[0], c.kart = k[1], c.wheel = k[2], c.glider = k[3],
+        c.picks = picks, c.wins = wins, c.podiums = podiums, c.pos_sum = pos_sum
+    """,
+    f"""
+    MATCH (p:Person)-[res:RACED_IN]->(:Race)
+    WITH p, coalesce(res.kart, '{UNKNOWN}') AS kart, count(*) AS picks,
+         sum(CASE WHEN res.position = 1 THEN 1 ELSE 0 END) AS wins
+    MERGE (k:Kart {{name: kart}})
+    MERGE (p)-[u:USES]->(k)
+    SET u.picks = picks, u.wins = wins
+    """,
+]
@@ -0,0 +1,300 @@
+"""
+Rating de habilidade (Elo multijogador) atualizado a cada corrida terminada.
+
+Cada corrida vale como N-1 confrontos por jogador: contra cada adversário o
+resultado é 1 (chegou na frente), 0.5 (empate) ou 0, e o esperado vem da
+diferença de rating (curva logística do Elo, escala 400). O ajuste é
+K * soma(resultado - esperado) / (N - 1); jogadores com menos de
+RATING_PROVISIONAL corridas usam RATING_K_NEW, para convergir mais rápido.
+Bots e jogadores sem UUID entram com RATING_DEFAULT fixo: contam como
+adversários, mas não têm rating guardado.
+
+Online: save_races_to_pg chama `apply` na mesma transação que grava as
+corridas novas (replays do outbox não contam duas vezes). As linhas de
+`ratings` dos participantes são travadas em ordem de user_id, então workers
+concorrentes nunca perdem atualização. RatingCache guarda em memória o que
+foi lido/escrito, por RATING_CACHE_TTL segundos.
+
+Recomputação (`python ratings.py --recompute`): lê o histórico de
+race_results mês a mês (uma linha por corrida, jogadores em arrays) e roda o
+mesmo cálculo em lote com NumPy. As corridas são divididas em "ondas" em que
+nenhum jogador aparece duas vezes; cada onda é atualizada de uma vez e a
+ordem das corridas de cada jogador é preservada, então o resultado é igual
+ao de aplicar uma corrida por vez. `--synthetic N` mede só o cálculo com N
+corridas aleatórias, sem banco.
+"""
+import sys, time, uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import numpy as np
+
+import config
+
+BOT = -1     # jogador sem rating guardado (rating fixo = default)
+EMPTY = -2   # posição vazia no grid (corridas com menos jogadores)
+
+MIGRATION_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS ratings (
+        user_id    UUID PRIMARY KEY,
+        rating     DOUBLE PRECISION NOT NULL,
+        races      INT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ratings_rating_idx ON ratings (rating DESC)",
+]
+
+
+@dataclass(frozen=True)
+class Params:
+    default: float = 1500.0
+    k: float = 24.0
+    k_new: float = 48.0
+    provisional: int = 20
+
+    @classmethod
+    def from_config(cls) -> "Params":
+        return cls(config.RATING_DEFAULT, config.RATING_K, config.RATING_K_NEW, config.RATING_PROVISIONAL)
+
+
+def deltas(r: np.ndarray, n: np.ndarray, pos: np.ndarray, slot: np.ndarray, rated: np.ndarray,
+           p: Params) -> np.ndarray:
+    """Ajuste de rating de cada jogador de W corridas independentes.
+
+    Todos os arrays são (W, P): rating atual, corridas já jogadas, posição,
+    slot ocupado e "tem rating guardado". Devolve (W, P) com 0 onde não se aplica."""
+    # esperado[w, i, j] = P(i chega na frente de j)
+    expected = 1.0 / (1.0 + 10.0 ** ((r[:, None, :] - r[:, :, None]) / 400.0))
+    score = (pos[:, :, None] < pos[:, None, :]) + 0.5 * (pos[:, :, None] == pos[:, None, :])
+    pair = slot[:, :, None] & slot[:, None, :]
+    pair &= ~np.eye(r.shape[1], dtype=bool)
+    opponents = np.maximum(slot.sum(axis=1, keepdims=True) - 1, 1)
+    k = np.where(n < p.provisional, p.k_new, p.k)
+    d = k * np.where(pair, score - expected, 0.0).sum(axis=2) / opponents
+    return np.where(rated & slot, d, 0.0)
+
+
+def waves(idx: np.ndarray) -> np.ndarray:
+    """Onda de cada corrida: 1 + a última onda em que algum dos seus jogadores apareceu."""
+    last: dict[int, int] = {}
+    out = np.empty(len(idx), dtype=np.int64)
+    for r, row in enumerate(idx.tolist()):
+        w = 0
+        for u in row:
+            if u >= 0:
+                lw = last.get(u, -1) + 1
+                if lw > w:
+                    w = lw
+        for u in row:
+            if u >= 0:
+                last[u] = w
+        out[r] = w
+    return out
+
+
+def run(idx: np.ndarray, pos: np.ndarray, ratings: np.ndarray, counts: np.ndarray, p: Params):
+    """Aplica R corridas em ordem sobre `ratings`/`counts` (U,), no lugar.
+
+    idx (R, P): índice do jogador em `ratings`, BOT ou EMPTY; pos (R, P): posição."""
+    if len(idx) == 0:
+        return
+    wave = waves(idx)
+    order = np.argsort(wave, kind="stable")
+    bounds = np.searchsorted(wave[order], np.arange(wave.max() + 2))
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        sel = order[a:b]
+        i, ps = idx[sel], pos[sel]
+        slot, rated = i != EMPTY, i >= 0
+        safe = np.where(rated, i, 0)
+        r = np.where(rated, ratings[safe], p.default)
+        n = np.where(rated, counts[safe], 0)
+        d = deltas(r, n, ps, slot, rated, p)
+        ratings[i[rated]] += d[rated]
+        counts[i[rated]] += 1
+
+
+def _uuid(v) -> Optional[str]:
+    try:
+        return str(uuid.UUID(str(v)))
+    except (TypeError, ValueError):
+        return None
+
+
+class RatingCache:
+    """LRU {user_id: (rating, races)} com validade de RATING_CACHE_TTL segundos."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._d: "OrderedDict[str, tuple[float, int, float]]" = OrderedDict()
+
+    def put(self, uid: str, rating: float, races: int):
+        self._d[uid] = (rating, races, time.monotonic())
+        self._d.move_to_end(uid)
+        while len(self._d) > self.max_size:
+            self._d.popitem(last=False)
+
+    def get(self, uid: str) -> Optional[tuple[float, int]]:
+        hit = self._d.get(uid)
+        if hit is None or time.monotonic() - hit[2] > self.ttl:
+            return None
+        self._d.move_to_end(uid)
+        return hit[0], hit[1]
+
+    def clear(self):
+        self._d.clear()
+
+
+async def apply(cur, races: list[tuple[str, dict, datetime]], p: Params) -> dict[str, tuple[float, int]]:
+    """Atualiza `ratings` com as corridas novas (mesma transação da gravação).
+
+    Devolve {user_id: (rating, races)} para o chamador pôr no cache após o commit."""
+    races = sorted(races, key=lambda r: (r[2], r[0]))  # mesma ordem da recomputação
+    users = sorted({u for _, payload, _ in races for pl in payload.get("players", [])
+                    if (u := _uuid(pl.get("id")))})
+    if not users:
+        return {}
+    # cria quem ainda não tem rating e trava todos em ordem de user_id
+    await cur.execute("""
+        INSERT INTO ratings (user_id, rating)
+        SELECT u, %s FROM unnest(%s::uuid[]) AS u ORDER BY u
+        ON CONFLICT DO NOTHING
+    """, (p.default, users))
+    await cur.execute("SELECT user_id::text, rating, races FROM ratings WHERE user_id = ANY(%s::uuid[]) "
+                      "ORDER BY user_id FOR UPDATE", (users,))
+    rows = await cur.fetchall()
+    ids = {u: i for i, (u, _, _) in enumerate(rows)}
+    ratings = np.array([r for _, r, _ in rows], dtype=np.float64)
+    counts = np.array([n for _, _, n in rows], dtype=np.int64)
+
+    width = max(len(payload.get("players", [])) for _, payload, _ in races)
+    idx = np.full((len(races), width), EMPTY, dtype=np.int64)
+    pos = np.zeros((len(races), width), dtype=np.int64)
+    for r, (_, payload, _) in enumerate(races):
+        for j, pl in enumerate(payload.get("players", [])):
+            u = _uuid(pl.get("id"))
+            idx[r, j] = ids[u] if u else BOT
+            pos[r, j] = pl.get("position") or 0
+    run(idx, pos, ratings, counts, p)
+
+    await cur.execute("""
+        UPDATE ratings AS t SET rating = v.rating, races = v.races, updated_at = now()
+        FROM unnest(%s::uuid[], %s::float8[], %s::int[]) AS v(user_id, rating, races)
+        WHERE t.user_id = v.user_id
+    """, (list(ids), ratings.tolist(), counts.tolist()))
+    return {u: (float(ratings[i]), int(counts[i])) for u, i in ids.items()}
+
+
+# ---- recomputação completa ----
+
+HISTORY_SQL = """
+SELECT array_agg(user_id::text ORDER BY position), array_agg(position ORDER BY position)
+FROM race_results
+WHERE finished_at >= %s AND finished_at < %s
+GROUP BY race_id, finished_at
+ORDER BY finished_at, race_id
+"""
+
+# corridas mais recentes que isso são relidas com `ratings` travada
+TAIL_MARGIN = timedelta(minutes=10)
+
+
+def _months(conn, until: datetime):
+    row = conn.execute("SELECT min(finished_at) FROM races").fetchone()
+    if row[0] is None:
+        return
+    m = row[0].astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while m < until:
+        nxt = (m + timedelta(days=32)).replace(day=1)
+        yield m, min(nxt, until)
+        m = nxt
+
+
+def _load(conn, lo: datetime, hi: datetime, ids: dict[str, int], width: int = 12):
+    idx_rows, pos_rows = [], []
+    with conn.cursor(name="mk_ratings_history") as cur:
+        cur.itersize = 20000
+        cur.execute(HISTORY_SQL, (lo, hi))
+        for users, positions in cur:
+            row = [EMPTY] * width
+            for j, u in enumerate(users[:width]):
+                row[j] = BOT if u is None else ids.setdefault(u, len(ids))
+            idx_rows.append(row)
+            pos_rows.append((positions[:width] + [0] * width)[:width])
+    return (np.array(idx_rows, dtype=np.int64).reshape(-1, width),
+            np.array(pos_rows, dtype=np.int64).reshape(-1, width))
+
+
+def _grow(a: np.ndarray, size: int, fill) -> np.ndarray:
+    if len(a) >= size:
+        return a
+    return np.concatenate([a, np.full(max(size, 2 * len(a)) - len(a), fill, dtype=a.dtype)])
+
+
+def recompute(dsn: str, p: Params, verbose: bool = True) -> int:
+    """Recalcula todos os ratings a partir de race_results e regrava a tabela. Devolve o nº de corridas."""
+    import psycopg
+    t0 = time.perf_counter()
+    ids: dict[str, int] = {}
+    ratings = np.empty(0, dtype=np.float64)
+    counts = np.empty(0, dtype=np.int64)
+    total = 0
+
+    def step(conn, lo, hi):
+        nonlocal ratings, counts, total
+        idx, pos = _load(conn, lo, hi, ids)
+        ratings = _grow(ratings, len(ids), p.default)
+        counts = _grow(counts, len(ids), 0)
+        run(idx, pos, ratings, counts, p)
+        total += len(idx)
+        if verbose:
+            print(f"[ratings] {lo:%Y-%m}: {len(idx)} corridas ({time.perf_counter() - t0:.1f}s)")
+
+    cutoff = datetime.now(timezone.utc) - TAIL_MARGIN
+    with psycopg.connect(dsn) as conn:
+        for lo, hi in _months(conn, cutoff):
+            step(conn, lo, hi)
+        conn.commit()
+        # o fim do histórico é relido com a tabela travada: corridas que chegarem
+        # durante a regravação esperam o commit e se aplicam sobre o resultado
+        conn.execute("LOCK TABLE ratings IN ACCESS EXCLUSIVE MODE")
+        step(conn, cutoff, datetime.now(timezone.utc) + timedelta(days=1))
+        conn.execute("TRUNCATE ratings")
+        with conn.cursor().copy("COPY ratings (user_id, rating, races) FROM STDIN") as cp:
+            for u, i in ids.items():
+                cp.write_row((u, float(ratings[i]), int(counts[i])))
+        conn.commit()
+    if verbose:
+        print(f"[ratings] {total} corridas, {len(ids)} jogadores em {time.perf_counter() - t0:.1f}s")
+    return total
+
+
+def synthetic(n_races: int, n_users: int = 100000, players: int = 8, seed: int = 0):
+    """Mede `run` com corridas aleatórias (sem banco)."""
+    rng = np.random.default_rng(seed)
+    idx = np.stack([rng.choice(n_users, players, replace=False) for _ in range(min(n_races, 1000))])
+    idx = idx[rng.integers(0, len(idx), n_races)] if n_races > 1000 else idx
+    idx = (idx + rng.integers(0, n_users, (n_races, 1))) % n_users  # desloca o grid todo: sem repetidos
+    pos = np.argsort(rng.random((n_races, players)), axis=1) + 1
+    ratings = np.full(n_users, 1500.0)
+    counts = np.zeros(n_users, dtype=np.int64)
+    t0 = time.perf_counter()
+    run(idx, pos, ratings, counts, Params())
+    dt = time.perf_counter() - t0
+    print(f"{n_races} corridas / {n_users} jogadores: {dt:.2f}s ({n_races / dt:,.0f} corridas/s); "
+          f"rating min {ratings.min():.0f} max {ratings.max():.0f}")
+
+
+if __name__ == "__main__":
+    if "--synthetic" in sys.argv:
+        synthetic(int(sys.argv[sys.argv.index("--synthetic") + 1]))
+    elif "--recompute" in sys.argv:
+        if not config.PG_DSN:
+            sys.exit("PG_DSN não definido")
+        recompute(config.PG_DSN, Params.from_config())
+    else:
+        print("uso: python ratings.py --recompute | --synthetic N")
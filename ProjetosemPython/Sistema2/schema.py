@@ -0,0 +1,270 @@
+"""
+Schema versionado dos três bancos da S2 (RDB, DB1 e DB2).
+
+Cada migração tem um número de versão e os passos de cada banco. A versão
+aplicada fica registrada no próprio banco (tabela/coleção/nó `schema_version`),
+então rodar de novo só aplica o que estiver pendente.
+
+Uso (dentro de Sistema2/):
+    python schema.py            # aplica migrações pendentes nos três bancos
+    python schema.py --status   # mostra a versão aplicada em cada banco
+
+A API também chama `apply_all()` uma vez no startup (SCHEMA_AUTO_APPLY=1).
+"""
+import sys
+from datetime import datetime
+
+import config
+from catalog import CATALOG_COLLECTIONS, ITEM_VERSION, TOMBSTONES, canonicalize
+import race_results
+import race_stats
+import ratings
+
+MIGRATIONS = [
+    {
+        "version": 1,
+        "name": "schema inicial (usuarios, constraints do grafo, índices do catálogo)",
+        "pg": [
+            """
+            CREATE TABLE IF NOT EXISTS usuarios (
+                id UUID PRIMARY KEY,
+                nome TEXT NOT NULL,
+                email TEXT NOT NULL,
+                senha TEXT NOT NULL,
+                criado_em TIMESTAMP DEFAULT NOW()
+            )
+            """,
+            "CREATE UNIQUE INDEX IF NOT EXISTS usuarios_email_key ON usuarios(email)",
+        ],
+        "mongo": [(col, "name", {"unique": True}) for col in CATALOG_COLLECTIONS],
+        "neo4j": [
+            "CREATE CONSTRAINT IF NOT EXISTS FOR (n:Runner)    REQUIRE n.runner_id IS UNIQUE",
+            "CREATE CONSTRAINT IF NOT EXISTS FOR (n:Race)      REQUIRE n.race_id IS UNIQUE",
+            "CREATE CONSTRAINT IF NOT EXISTS FOR (n:Character) REQUIRE n.name IS UNIQUE",
+            "CREATE CONSTRAINT IF NOT EXISTS FOR (n:Kart)      REQUIRE n.name IS UNIQUE",
+            "CREATE CONSTRAINT IF NOT EXISTS FOR (n:Wheel)     REQUIRE n.name IS UNIQUE",
+            "CREATE CONSTRAINT IF NOT EXISTS FOR (n:Glider)    REQUIRE n.name IS UNIQUE",
+            "CREATE CONSTRAINT IF NOT EXISTS FOR (n:Track)     REQUIRE n.name IS UNIQUE",
+        ],
+    },
+    {
+        "version": 2,
+        "name": "chaves usadas por /race/finish (Race.id, Person.id) e Position",
+        "pg": [],
+        "mongo": [],
+        "neo4j": [
+            "CREATE CONSTRAINT IF NOT EXISTS FOR (n:Race)   REQUIRE n.id IS UNIQUE",
+            "CREATE CONSTRAINT IF NOT EXISTS FOR (n:Person) REQUIRE n.id IS UNIQUE",
+            "CREATE INDEX IF NOT EXISTS FOR (n:Position) ON (n.race_id, n.runner_id)",
+        ],
+    },
+    {
+        "version": 3,
+        "name": "chave aleatória indexada para amostrar adversários (/rdb/users)",
+        "pg": [
+            # DEFAULT volátil: cada linha existente recebe o seu próprio random()
+            "ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS rand_key DOUBLE PRECISION NOT NULL DEFAULT random()",
+            "CREATE INDEX IF NOT EXISTS usuarios_rand_key_idx ON usuarios(rand_key)",
+        ],
+        "mongo": [],
+        "neo4j": [],
+    },
+    {
+        "version": 4,
+        "name": "versão por item do catálogo para /db1/catalog/delta",
+        "pg": [],
+        "mongo": [(col, ITEM_VERSION, {}) for col in CATALOG_COLLECTIONS + [TOMBSTONES]],
+        "neo4j": [],
+    },
+    {
+        "version": 5,
+        "name": "catálogo no schema canônico {name, weight, speed, accel} + validador $jsonSchema",
+        "pg": [],
+        "mongo": [canonicalize],
+        "neo4j": [],
+    },
+    {
+        "version": 6,
+        "name": "contadores de uso/vitórias por peça, pista, combo e (Person)-[:USES]->(Kart)",
+        "pg": [],
+        "mongo": [],
+        "neo4j": [
+            "CREATE CONSTRAINT IF NOT EXISTS FOR (n:Combo) REQUIRE n.key IS UNIQUE",
+            *race_stats.BACKFILL_CYPHER,
+        ],
+    },
+    {
+        "version": 7,
+        "name": "races/race_results particionadas por mês + player_totals para rankings",
+        "pg": race_results.MIGRATION_SQL,
+        "mongo": [],
+        "neo4j": [],
+    },
+    {
+        "version": 8,
+        "name": "rating de habilidade por usuário (ratings)",
+        "pg": ratings.MIGRATION_SQL,
+        "mongo": [],
+        "neo4j": [],
+    },
+    {
+        "version": 9,
+        "name": "race_results com chave por slot (empates na mesma posição)",
+        "pg": race_results.SLOT_MIGRATION_SQL,
+        "mongo": [],
+        "neo4j": [],
+    },
+]
+
+LATEST = max(m["version"] for m in MIGRATIONS)
+
+
+# ---- RDB (Postgres) ----
+
+def pg_version(conn) -> int:
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('public.schema_version')")
+        if cur.fetchone()[0] is None:
+            return 0
+        cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        return cur.fetchone()[0]
+
+def apply_pg(conn) -> list[int]:
+    """Aplica as migrações pendentes numa conexão psycopg (síncrona)."""
+    applied = []
+    with conn.cursor() as cur:
+        # serializa workers que sobem ao mesmo tempo
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('mk_schema'))")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INT PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT NOW()
+            )
+        """)
+        cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        current = cur.fetchone()[0]
+        for m in MIGRATIONS:
+            if m["version"] <= current:
+                continue
+            for sql in m["pg"]:
+                cur.execute(sql)
+            cur.execute("INSERT INTO schema_version (version, name) VALUES (%s, %s)",
+                        (m["version"], m["name"]))
+            applied.append(m["version"])
+    conn.commit()
+    return applied
+
+
+# ---- DB1 (MongoDB) ----
+
+def mongo_version(db) -> int:
+    doc = db["schema_version"].find_one(sort=[("_id", -1)])
+    return doc["_id"] if doc else 0
+
+def apply_mongo(db) -> list[int]:
+    """Aplica as migrações pendentes num Database do pymongo (síncrono)."""
+    applied = []
+    current = mongo_version(db)
+    for m in MIGRATIONS:
+        if m["version"] <= current:
+            continue
+        for step in m["mongo"]:
+            if callable(step):
+                step(db)
+            else:
+                col, keys, opts = step
+                db[col].create_index(keys, **opts)
+        db["schema_version"].update_one(
+            {"_id": m["version"]},
+            {"$setOnInsert": {"name": m["name"], "applied_at": datetime.utcnow()}},
+            upsert=True,
+        )
+        applied.append(m["version"])
+    return applied
+
+
+# ---- DB2 (Neo4j) ----
+
+def neo4j_version(session) -> int:
+    rec = session.run("MATCH (v:SchemaVersion) RETURN max(v.version) AS v").single()
+    return (rec["v"] if rec else None) or 0
+
+def apply_neo4j(session) -> list[int]:
+    """Aplica as migrações pendentes numa sessão do driver Neo4j (síncrono)."""
+    applied = []
+    current = neo4j_version(session)
+    for m in MIGRATIONS:
+        if m["version"] <= current:
+            continue
+        # DDL do Neo4j não pode ser misturado com escrita na mesma transação
+        for q in m["neo4j"]:
+            session.run(q).consume()
+        session.run(
+            "MERGE (v:SchemaVersion {version:$v}) ON CREATE SET v.name=$name, v.applied_at=$ts",
+            v=m["version"], name=m["name"], ts=datetime.utcnow().isoformat(),
+        ).consume()
+        applied.append(m["version"])
+    return applied
+
+
+# ---- Orquestração ----
+
+def _backends():
+    """Nomes dos bancos com variáveis de conexão configuradas."""
+    if config.PG_DSN:
+        yield "pg"
+    if config.MONGO_URI:
+        yield "mongo"
+    if config.NEO4J_URI and config.NEO4J_USER and config.NEO4J_PASSWORD:
+        yield "neo4j"
+
+def _with_backend(name: str, fn_pg, fn_mongo, fn_neo4j):
+    if name == "pg":
+        import psycopg
+        with psycopg.connect(config.PG_DSN) as conn:
+            return fn_pg(conn)
+    if name == "mongo":
+        from pymongo import MongoClient
+        cli = MongoClient(config.MONGO_URI, serverSelectionTimeoutMS=6000)
+        try:
+            return fn_mongo(cli[config.MONGO_DB])
+        finally:
+            cli.close()
+    from neo4j import GraphDatabase
+    with GraphDatabase.driver(config.NEO4J_URI, auth=(config.NEO4J_USER, config.NEO4J_PASSWORD)) as driver:
+        with driver.session(database=config.NEO4J_DATABASE) as s:
+            return fn_neo4j(s)
+
+def apply_all(verbose: bool = True) -> dict:
+    """Aplica as migrações pendentes em todos os bancos configurados.
+
+    Falha de um banco não impede os outros; o erro vai no resultado."""
+    out = {}
+    for name in _backends():
+        try:
+            out[name] = _with_backend(name, apply_pg, apply_mongo, apply_neo4j)
+        except Exception as e:
+            out[name] = f"ERRO: {e}"
+        if verbose:
+            print(f"[schema] {name}: {out[name] or 'já na versão ' + str(LATEST)}")
+    return out
+
+def status() -> dict:
+    out = {}
+    for name in _backends():
+        try:
+            out[name] = _with_backend(name, pg_version, mongo_version, neo4j_version)
+        except Exception as e:
+            out[name] = f"ERRO: {e}"
+    return out
+
+
+if __name__ == "__main__":
+    if "--status" in sys.argv:
+        for k, v in status().items():
+            print(f"{k}: versão {v} (última: {LATEST})")
+    else:
+        res = apply_all()
+        if any(isinstance(v, str) for v in res.values()):
+            sys.exit(1)
@@ -0,0 +1,189 @@
+"""
+Server-Timing por requisição: quanto do tempo de cada resposta foi gasto em
+cada banco.
+
+O middleware abre um `Timings` por requisição (num ContextVar, então as tasks
+filhas de um gather contam para a mesma requisição) e, no início da resposta,
+escreve o header:
+
+    Server-Timing: pg;dur=3.1;desc="2x, espera 0.2ms", neo4j;dur=41.7;desc="1x",
+                   app;dur=6.0, total;dur=50.8
+
+(`2x` = conexões/sessões/comandos usados; o header é ASCII.)
+
+A medição entra pelos helpers do api.py, sem mexer nos call sites:
+- pg_conn(): tempo com a conexão emprestada do pool (inclui a espera pelo pool);
+- neo4j_session() / get_neo4j(): tempo de vida da sessão;
+- mongo_db(): soma dos comandos do driver (MongoCommandTimer, listener do pymongo).
+
+`app` é o total menos os bancos (validação, regra, serialização); com escritas
+em paralelo (pg e neo4j no mesmo gather) a soma dos bancos pode passar do
+total e `app` fica em 0. Com o header `X-Debug-Timing: 1` (e SERVER_TIMING_DEBUG
+ligado), respostas JSON em objeto ganham também um bloco "_timing" com a
+lista das operações medidas por metrics.backend.
+"""
+import json, time
+from contextvars import ContextVar
+from typing import Optional
+
+from pymongo import monitoring
+
+
+class Timings:
+    __slots__ = ("t0", "dur", "calls", "wait", "ops")
+
+    def __init__(self, debug: bool = False):
+        self.t0 = time.perf_counter()
+        self.dur: dict[str, float] = {}
+        self.calls: dict[str, int] = {}
+        self.wait: dict[str, float] = {}
+        self.ops: Optional[list] = [] if debug else None
+
+    def add(self, backend: str, seconds: float, wait: float = 0.0):
+        self.dur[backend] = self.dur.get(backend, 0.0) + seconds
+        self.calls[backend] = self.calls.get(backend, 0) + 1
+        if wait:
+            self.wait[backend] = self.wait.get(backend, 0.0) + wait
+
+    def op(self, backend: str, op: str, seconds: float):
+        if self.ops is not None:
+            self.ops.append({"backend": backend, "op": op, "ms": round(seconds * 1000, 2)})
+
+    def header(self, total: float) -> str:
+        parts = []
+        for b, d in self.dur.items():
+            desc = f"{self.calls[b]}x"
+            if b in self.wait:
+                desc += f", espera {self.wait[b] * 1000:.1f}ms"
+            parts.append(f'{b};dur={d * 1000:.1f};desc="{desc}"')
+        app = max(0.0, total - sum(self.dur.values()))
+        parts.append(f"app;dur={app * 1000:.1f}")
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+    def debug(self, total: float) -> dict:
+        return {
+            "total_ms": round(total * 1000, 2),
+            "app_ms": round(max(0.0, total - sum(self.dur.values())) * 1000, 2),
+            "backends": {b: {"ms": round(d * 1000, 2), "calls": self.calls[b],
+                             "wait_ms": round(self.wait.get(b, 0.0) * 1000, 2)}
+                         for b, d in self.dur.items()},
+            "ops": self.ops or [],
+        }
+
+
+_current: ContextVar[Optional[Timings]] = ContextVar("s2_server_timing", default=None)
+
+
+def current() -> Optional[Timings]:
+    return _current.get()
+
+
+class timed:
+    """Envolve o context manager de um helper (pool.connection(), driver.session())."""
+    __slots__ = ("backend", "cm", "t", "t0", "t1")
+
+    def __init__(self, backend: str, cm):
+        self.backend, self.cm = backend, cm
+
+    async def __aenter__(self):
+        self.t = _current.get()
+        if self.t is None:
+            return await self.cm.__aenter__()
+        self.t0 = time.perf_counter()
+        try:
+            res = await self.cm.__aenter__()
+        except BaseException:
+            # timeout do pool também é tempo gasto no banco
+            self.t.add(self.backend, time.perf_counter() - self.t0, time.perf_counter() - self.t0)
+            raise
+        self.t1 = time.perf_counter()
+        return res
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            return await self.cm.__aexit__(exc_type, exc, tb)
+        finally:
+            if self.t is not None:
+                self.t.add(self.backend, time.perf_counter() - self.t0, self.t1 - self.t0)
+
+
+class TimedDriver:
+    """Driver do Neo4j cujas sessões entram no Server-Timing (para get_neo4j())."""
+
+    def __init__(self, driver):
+        self._driver = driver
+
+    def session(self, **kw):
+        return timed("neo4j", self._driver.session(**kw))
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Soma a duração de cada comando do Mongo na requisição corrente."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        t = _current.get()
+        if t is not None:
+            t.add("mongo", event.duration_micros / 1e6)
+
+    def failed(self, event):
+        self.succeeded(event)
+
+
+class ServerTimingMiddleware:
+    """Abre o Timings da requisição e escreve o Server-Timing (e o "_timing" em debug)."""
+
+    def __init__(self, app, debug_allowed: bool = False):
+        self.app = app
+        self.debug_allowed = debug_allowed
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        debug = self.debug_allowed and (b"x-debug-timing", b"1") in scope["headers"]
+        t = Timings(debug)
+        token = _current.set(t)
+        held: list = []   # em debug: start + corpo JSON seguram até o fim para receber o bloco
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                total = time.perf_counter() - t.t0
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", t.header(total).encode()))
+                message = {**message, "headers": headers}
+                if debug and any(k == b"content-type" and v.startswith(b"application/json")
+                                 for k, v in headers):
+                    held.append(message)
+                    return
+            elif held:
+                held.append(message)
+                if message.get("more_body"):
+                    return
+                return await _send_debug(send, held, t)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+
+
+async def _send_debug(send, held: list, t: Timings):
+    start, body = held[0], b"".join(m.get("body", b"") for m in held[1:])
+    try:
+        data = json.loads(body)
+    except ValueError:
+        data = None
+    if isinstance(data, dict):
+        data["_timing"] = t.debug(time.perf_counter() - t.t0)
+        body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+        start = {**start, "headers": [(k, str(len(body)).encode() if k == b"content-length" else v)
+                                      for k, v in start["headers"]]}
+    await send(start)
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,5 @@
+# Testes das partes puras da S2 (sem bancos): `python -m pytest tests` dentro de Sistema2/.
+# Os módulos da S2 são importados pelo nome (import config, import outbox...).
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
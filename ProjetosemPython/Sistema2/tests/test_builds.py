@@ -0,0 +1,86 @@
+import itertools
+import json
+
+import pytest
+
+import builds
+
+CATALOG = {
+    "characters": [{"name": "Mario", "weight": 3}, {"name": "Bowser", "weight": 6}],
+    "karts": [{"name": "Pipe", "weight": 1, "speed": 2, "accel": 3},
+              {"name": "Blue", "weight": 2, "speed": 4, "accel": 1}],
+    "wheels": [{"name": "Std", "weight": 1, "speed": 1, "accel": 1},
+               {"name": "Slick", "weight": 2, "speed": 3, "accel": 0},
+               {"name": "Roller", "weight": 0, "speed": 0, "accel": 4}],
+    "gliders": [{"name": "Super", "weight": 1, "speed": 1, "accel": 1}],
+}
+
+
+def brute_force():
+    """Todas as combinações, somadas em Python."""
+    out = []
+    for combo in itertools.product(*(CATALOG[k] for k in builds.KINDS)):
+        w, s, a = (sum(builds.part_stats(p)[i] for p in combo) for i in range(3))
+        out.append({"character": combo[0]["name"], "kart": combo[1]["name"],
+                    "wheel": combo[2]["name"], "glider": combo[3]["name"],
+                    "peso_total": w, "velocidade": s, "aceleracao": a})
+    return out
+
+
+def key(b):
+    return (b["character"], b["kart"], b["wheel"], b["glider"])
+
+
+@pytest.fixture(scope="module")
+def index():
+    return builds.BuildIndex(CATALOG, max_builds=1000)
+
+
+def test_totals_match_brute_force(index):
+    total, got = index.query(limit=100)
+    expected = brute_force()
+    assert total == index.size == len(expected) == 12
+    assert {key(b): b for b in got} == {key(b): b for b in expected}
+
+
+@pytest.mark.parametrize("filters", [
+    {"max_weight": 8},
+    {"min_speed": 6},
+    {"min_accel": 5, "max_weight": 9},
+    {"fixed": {"characters": "Bowser"}},
+    {"fixed": {"karts": "Blue", "wheels": "Slick"}, "min_speed": 1},
+])
+def test_filters_match_brute_force(index, filters):
+    fixed = filters.get("fixed") or {}
+    expected = [b for b in brute_force()
+                if b["peso_total"] <= filters.get("max_weight", 99)
+                and b["velocidade"] >= filters.get("min_speed", 0)
+                and b["aceleracao"] >= filters.get("min_accel", 0)
+                and all(b[k[:-1]] == v for k, v in fixed.items())]
+    total, got = index.query(**filters, limit=100)
+    assert total == len(expected)
+    assert sorted(map(key, got)) == sorted(map(key, expected))
+
+
+def test_sort_and_limit(index):
+    _, fast = index.query(sort="velocidade", limit=3)
+    assert [b["velocidade"] for b in fast] == sorted((b["velocidade"] for b in brute_force()), reverse=True)[:3]
+    _, light = index.query(sort="peso_total", limit=2)
+    assert [b["peso_total"] for b in light] == sorted(b["peso_total"] for b in brute_force())[:2]
+
+
+def test_unknown_fixed_part_returns_nothing(index):
+    assert index.query(fixed={"karts": "Nope"}) == (0, [])
+
+
+def test_too_many_builds():
+    with pytest.raises(builds.TooManyBuilds):
+        builds.BuildIndex(CATALOG, max_builds=11)
+
+
+def test_cache_rebuilds_only_on_new_etag():
+    cache = builds.BuildIndexCache(max_builds=1000)
+    body = json.dumps(CATALOG).encode()
+    first = cache.get(body, '"a"')
+    assert cache.get(body, '"a"') is first
+    assert cache.get(body, '"b"') is not first
@@ -0,0 +1,78 @@
+import asyncio
+
+import catalog
+
+
+class FakeCollection:
+    def __init__(self, items=()):
+        self.meta = None
+        self.items = list(items)
+        self.loads = 0
+
+    async def find_one(self, query):
+        return self.meta
+
+    def find(self, *args):
+        self.loads += 1
+        items = self.items
+
+        class Cursor:
+            def limit(self, n):
+                return self
+
+            async def to_list(self):
+                return items
+        return Cursor()
+
+
+class FakeDB(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection()
+        return self[name]
+
+
+def test_published_version_waits_for_stamping():
+    assert catalog.published_version(None) == 0
+    assert catalog.published_version({"version": 7}) == 7
+    assert catalog.published_version({"version": 9, "stamping": [8, 9]}) == 7
+
+
+def test_cache_reloads_only_on_published_version():
+    db = FakeDB()
+    db["karts"].items = [{"name": "Pipe"}]
+    meta = db[catalog.META_COLLECTION]
+    meta.meta = {"epoch": "e1", "version": 3}
+    cache = catalog.CatalogCache(ttl=0)
+
+    body, etag = asyncio.run(cache.get(db))
+    assert b"Pipe" in body and db["karts"].loads == 1
+
+    meta.meta = {"epoch": "e1", "version": 4, "stamping": [4]}   # record_changes no meio
+    assert asyncio.run(cache.get(db)) == (body, etag)
+    assert db["karts"].loads == 1
+
+    db["karts"].items = [{"name": "Blue"}]
+    meta.meta = {"epoch": "e1", "version": 4}                     # publicada
+    body2, etag2 = asyncio.run(cache.get(db))
+    assert b"Blue" in body2 and etag2 != etag and db["karts"].loads == 2
+
+    meta.meta = {"epoch": "e2", "version": 4}                     # banco repopulado
+    asyncio.run(cache.get(db))
+    assert db["karts"].loads == 3
+
+
+def test_ttl_skips_version_check():
+    db = FakeDB()
+    db[catalog.META_COLLECTION].meta = {"epoch": "e", "version": 1}
+    cache = catalog.CatalogCache(ttl=3600)
+    asyncio.run(cache.get(db))
+    db[catalog.META_COLLECTION].meta = {"epoch": "e", "version": 2}
+    asyncio.run(cache.get(db))
+    assert db["karts"].loads == 1
+
+
+def test_etag_matches():
+    assert catalog.etag_matches('"a", W/"b"', '"b"')
+    assert catalog.etag_matches("*", '"x"')
+    assert not catalog.etag_matches(None, '"x"')
+    assert not catalog.etag_matches('"a"', '"b"')
@@ -0,0 +1,72 @@
+import asyncio
+import gzip
+import tracemalloc
+
+import pytest
+from fastapi import HTTPException
+
+from compression import GzipRequestMiddleware
+
+
+def send_through(body: bytes, limit: int, chunk: int = 1 << 16, encoding=b"gzip"):
+    """Passa `body` em chunks pelo middleware; devolve (corpo visto pela rota, scope)."""
+    seen, scopes = [], []
+
+    async def app(scope, receive, send):
+        scopes.append(scope)
+        while True:
+            msg = await receive()
+            seen.append(msg["body"])
+            if not msg.get("more_body"):
+                break
+
+    parts = [body[i:i + chunk] for i in range(0, len(body), chunk)] or [b""]
+    queue = iter(parts)
+    sent = [0]
+
+    async def receive():
+        sent[0] += 1
+        return {"type": "http.request", "body": next(queue), "more_body": sent[0] < len(parts)}
+
+    scope = {"type": "http", "headers": [(b"content-encoding", encoding), (b"content-length", b"1")]}
+    asyncio.run(GzipRequestMiddleware(app, limit)(scope, receive, None))
+    return b"".join(seen), scopes[0]
+
+
+def test_decompresses_and_strips_encoding_headers():
+    raw = b"name,email\n" * 5000
+    body, scope = send_through(gzip.compress(raw), limit=len(raw), chunk=100)
+    assert body == raw
+    assert dict(scope["headers"]) == {}
+
+
+def test_limit_is_checked_before_expanding_a_chunk():
+    bomb = gzip.compress(b"\0" * (64 << 20))          # ~64 KB que viram 64 MB
+    tracemalloc.start()
+    try:
+        with pytest.raises(HTTPException) as e:
+            send_through(bomb, limit=1 << 20, chunk=len(bomb))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert e.value.status_code == 413
+    assert peak < 8 << 20
+
+
+def test_body_one_byte_over_limit_is_rejected():
+    raw = b"x" * 10000
+    assert send_through(gzip.compress(raw), limit=10000)[0] == raw
+    with pytest.raises(HTTPException) as e:
+        send_through(gzip.compress(raw), limit=9999)
+    assert e.value.status_code == 413
+
+
+def test_invalid_gzip_is_400():
+    with pytest.raises(HTTPException) as e:
+        send_through(b"not gzip at all", limit=100)
+    assert e.value.status_code == 400
+
+
+def test_plain_requests_pass_untouched():
+    body, scope = send_through(b"plain", limit=1, encoding=b"identity")
+    assert body == b"plain" and (b"content-length", b"1") in scope["headers"]
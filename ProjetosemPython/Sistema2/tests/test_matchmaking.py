@@ -0,0 +1,150 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from matchmaking import Lobby
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def lobby(clock, **kw):
+    kw.setdefault("size", 4)
+    return Lobby(clock=clock, **kw)
+
+
+def fill(lb, n, rating=1500.0, ping=30.0, prefix="u"):
+    return [lb.enqueue(f"{prefix}{i}", f"P{i}", rating + i, ping) for i in range(n)]
+
+
+def test_full_grid_forms_and_leaves_queue(clock):
+    lb = lobby(clock)
+    ts = fill(lb, 4)
+    clock.now = 0.25
+    [m] = lb.tick()
+    assert m["bots"] == 0 and len(m["players"]) == 4
+    assert lb.waiting_count() == 0 and lb.matches_total == 1
+    assert all(lb.get(t.ticket_id).match is m for t in ts)
+
+
+def test_same_user_gets_same_ticket_and_cancel_frees_it(clock):
+    lb = lobby(clock)
+    t = lb.enqueue("u", "P", 1500)
+    assert lb.enqueue("u", "P", 1500) is t
+    assert lb.cancel(t.ticket_id) and not lb.cancel(t.ticket_id)
+    assert lb.waiting_count() == 0
+    assert lb.enqueue("u", "P", 1500) is not t
+
+
+def test_rating_band_widens_with_wait(clock):
+    lb = lobby(clock, band_base=50, band_growth=20, fill_after=1000)
+    for i, r in enumerate((1000, 1100, 1200, 1300)):
+        lb.enqueue(f"u{i}", "P", r, 30)
+    assert lb.tick() == []                          # ±50: ninguém tem 4 na faixa
+    clock.now = 15                                  # ±350
+    [m] = lb.tick()
+    assert sorted(p["rating"] for p in m["players"]) == [1000, 1100, 1200, 1300]
+
+
+def test_ping_spread_fits_smallest_tolerance(clock):
+    lb = lobby(clock, ping_base=40, ping_growth=0, fill_after=1000)
+    ping = {"u0": 10, "u1": 45, "u2": 60, "u3": 80}      # pares 10-60, 10-80, 45-80 estouram 40
+    for uid, p in ping.items():
+        lb.enqueue(uid, "P", 1500, p)
+    assert lb.tick() == []
+    ping.update(v0=20, v1=30, v2=35)
+    for uid in ("v0", "v1", "v2"):
+        lb.enqueue(uid, "P", 1500, ping[uid])
+    clock.now = 1
+    [m] = lb.tick()
+    pings = [ping[p["user_id"]] for p in m["players"]]
+    assert max(pings) - min(pings) <= 40
+
+
+def test_fill_after_adds_bots_and_host_is_oldest(clock):
+    lb = lobby(clock, fill_after=45)
+    lb.enqueue("old", "P", 1500, 30)
+    clock.now = 10
+    lb.enqueue("new", "P", 1520, 30)
+    clock.now = 44
+    assert lb.tick() == []
+    clock.now = 46
+    [m] = lb.tick()
+    assert m["bots"] == 2 and m["host"] == "old"
+    assert [p["user_id"] for p in m["players"]] == ["old", "new"]
+
+
+def test_host_is_oldest_even_when_anchor_is_newer(clock):
+    lb = lobby(clock, fill_after=1000)
+    clock.now = 0
+    lb.enqueue("a", "P", 1500, 30)
+    clock.now = 1
+    for i in range(3):
+        lb.enqueue(f"b{i}", "P", 1501 + i, 30)
+    clock.now = 2
+    [m] = lb.tick()
+    assert m["host"] == "a"
+
+
+def test_budget_cut_resumes_on_next_tick(clock):
+    lb = lobby(clock, budget_ms=0, fill_after=1000)
+    fill(lb, 400)
+    clock.now = 0.25
+    formed = len(lb.tick())
+    assert lb.cut and 0 < formed < 100               # sempre há progresso, mesmo com orçamento 0
+    while lb.cut:
+        formed += len(lb.tick())
+    assert formed == 100 and lb.waiting_count() == 0
+
+
+def test_slots_are_reused_and_columns_track_queue(clock):
+    lb = lobby(clock, fill_after=1000)
+    rng = np.random.default_rng(0)
+    for round_ in range(20):
+        for i in range(60):
+            lb.enqueue(f"r{round_}-{i}", "P", float(rng.normal(1500, 200)), float(rng.uniform(10, 60)))
+        clock.now += 0.25
+        lb.tick()
+        waiting = list(lb._waiting.values())
+        assert lb._alive.sum() == len(waiting) == lb.waiting_count()
+        for t in waiting:
+            assert lb._slots[t.slot] is t and lb._rating[t.slot] == t.rating
+    assert lb._cap <= 2048
+
+
+def test_finished_tickets_expire_after_keep_done(clock):
+    lb = lobby(clock, keep_done=60)
+    ts = fill(lb, 4)
+    clock.now = 1
+    lb.tick()
+    clock.now = 60
+    lb.tick()
+    assert lb.get(ts[0].ticket_id) is not None
+    clock.now = 62
+    lb.tick()
+    assert lb.get(ts[0].ticket_id) is None
+
+
+def test_wait_returns_when_matched(clock):
+    lb = lobby(clock)
+    ts = fill(lb, 3)
+
+    async def go():
+        waiter = asyncio.create_task(lb.wait(ts[0].ticket_id, timeout=5))
+        await asyncio.sleep(0)
+        lb.enqueue("last", "P", 1500, 30)
+        lb.tick()
+        return await waiter
+
+    assert asyncio.run(go()).match is not None
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from outbox import Outbox
+
+
+class Down(OSError):
+    """Banco fora do ar (transitório)."""
+
+
+class Rejected(Exception):
+    """Payload recusado pelo banco (não transitório)."""
+
+
+@pytest.fixture
+def box(tmp_path):
+    b = Outbox(str(tmp_path / "outbox.sqlite3"), base_backoff=0, max_backoff=0,
+               max_attempts=3, transient_errors=(Down,))
+    yield b
+    b.close()
+
+
+def fill(box, *race_ids):
+    async def go():
+        for rid in race_ids:
+            await box.append(rid, '{"rid": "%s"}' % rid)
+    asyncio.run(go())
+
+
+def drain(box, flush, rounds: int):
+    async def go():
+        for _ in range(rounds):
+            try:
+                await box.flush_once(flush)
+            except Exception:
+                pass
+    asyncio.run(go())
+
+
+def test_flush_acks_and_dedupes_race_id(box):
+    fill(box, "r1", "r2", "r1")
+    seen = []
+
+    async def flush(items):
+        seen.extend(rid for rid, _ in items)
+
+    drain(box, flush, 1)
+    assert seen == ["r1", "r2"]
+    assert box.stats()["depth"] == 0
+    assert box.stats()["flushed_total"] == 2
+
+
+def test_transient_errors_never_dead_letter(box):
+    fill(box, "r1", "r2", "r3")
+
+    async def flush(items):
+        raise Down("pg fora do ar")
+
+    drain(box, flush, 10)
+    s = box.stats()
+    assert (s["depth"], s["dead"]) == (3, 0)
+    assert s["retrying"] == 3
+    assert "Down" in s["last_error"]
+
+
+def test_bad_item_is_isolated_and_dead_lettered(box):
+    fill(box, "ok1", "bad", "ok2")
+    done = []
+
+    async def flush(items):
+        if any(rid == "bad" for rid, _ in items):
+            raise Rejected("payload inválido")
+        done.extend(rid for rid, _ in items)
+
+    drain(box, flush, 5)
+    s = box.stats()
+    assert sorted(done) == ["ok1", "ok2"]
+    assert (s["depth"], s["dead"]) == (0, 1)
+    assert s["last_dead_at"] is not None
+
+
+def test_requeue_dead_brings_items_back(box):
+    fill(box, "a", "b")
+
+    async def reject(items):
+        raise Rejected("x")
+
+    drain(box, reject, 10)
+    assert box.stats()["dead"] == 2
+
+    assert box.requeue_dead(["a"]) == 1
+    assert box.requeue_dead([]) == 0
+    assert asyncio.run(box.requeue()) == 1
+    s = box.stats()
+    assert (s["depth"], s["dead"], s["retrying"]) == (2, 0, 0)
+
+    drain(box, lambda items: asyncio.sleep(0), 1)
+    assert box.stats()["depth"] == 0
+
+
+def test_max_attempts_zero_keeps_retrying(tmp_path):
+    b = Outbox(str(tmp_path / "o.sqlite3"), base_backoff=0, max_backoff=0, max_attempts=0)
+    fill(b, "r1")
+
+    async def reject(items):
+        raise Rejected("x")
+
+    drain(b, reject, 5)
+    assert (b.stats()["depth"], b.stats()["dead"]) == (1, 0)
+    b.close()
@@ -0,0 +1,101 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import race_results as rr
+
+TS = datetime(2025, 3, 14, 15, 9, tzinfo=timezone.utc)
+U1, U2 = str(uuid.uuid4()), str(uuid.uuid4())
+
+
+def player(pid, position, **extra):
+    return {"id": pid, "name": f"P-{pid[:4]}", "position": position,
+            "character": {"name": "Mario"}, "kart": {"name": "Pipe"},
+            "wheel": {"name": "Std"}, "glider": {"name": "Super"}, **extra}
+
+
+def test_points_for():
+    assert [rr.points_for(p) for p in (1, 2, 12)] == [15, 12, 1]
+    assert [rr.points_for(p) for p in (None, 0, -1, 13)] == [0, 0, 0, 0]
+
+
+def test_batch_params_columns():
+    races = [
+        ("r1", {"mode": "online", "track": {"name": "Water Park"},
+                "players": [player(U1, 1, time_ms=61000), player("bot-1", 2)]}, TS),
+        ("r2", {"mode": "local", "track": {}, "players": [player(U2, 3)]}, TS + timedelta(days=40)),
+    ]
+    p = rr.batch_params(races)
+    assert p["race_id"] == ["r1", "r2"]
+    assert p["players"] == [2, 1]
+    assert p["track"] == ["Water Park", None]
+    # uma linha por jogador, na ordem do payload
+    assert p["r_race_id"] == ["r1", "r1", "r2"]
+    assert p["r_slot"] == [1, 2, 1]
+    assert p["r_points"] == [15, 12, 10]
+    assert p["r_time_ms"] == [61000, None, None]
+    assert p["r_finished_at"] == [TS, TS, TS + timedelta(days=40)]
+    # bots não têm UUID: user_id nulo, ficam fora de player_totals
+    assert p["r_user_id"] == [U1, None, U2]
+    lengths = {len(v) for k, v in p.items() if k.startswith("r_")}
+    assert lengths == {3}
+
+
+def test_batch_params_ties_get_distinct_slots():
+    p = rr.batch_params([("r", {"players": [player(U1, 1), player(U2, 1)]}, TS)])
+    assert p["r_position"] == [1, 1]
+    assert p["r_slot"] == [1, 2]
+
+
+@pytest.mark.parametrize("period, lo, hi", [
+    ("day", datetime(2025, 3, 14), datetime(2025, 3, 15)),
+    ("week", datetime(2025, 3, 10), datetime(2025, 3, 17)),      # segunda a segunda
+    ("month", datetime(2025, 3, 1), datetime(2025, 4, 1)),
+    ("year", datetime(2025, 1, 1), datetime(2026, 1, 1)),
+])
+def test_period_bounds(period, lo, hi):
+    assert rr.period_bounds(period, TS) == (lo.replace(tzinfo=timezone.utc), hi.replace(tzinfo=timezone.utc))
+
+
+def test_period_bounds_converts_to_utc_and_crosses_year():
+    brt = timezone(timedelta(hours=-3))
+    now = datetime(2025, 12, 31, 22, 30, tzinfo=brt)   # já é 2026 em UTC
+    assert rr.period_bounds("day", now)[0] == datetime(2026, 1, 1, tzinfo=timezone.utc)
+    assert rr.period_bounds("month", datetime(2025, 12, 5, tzinfo=timezone.utc))[1] == \
+        datetime(2026, 1, 1, tzinfo=timezone.utc)
+    with pytest.raises(ValueError):
+        rr.period_bounds("decade", now)
+
+
+class FakeConn:
+    """Conexão mínima: conta as chamadas a mk_ensure_race_partitions."""
+
+    def __init__(self):
+        self.calls = []
+
+    def cursor(self):
+        conn = self
+
+        class Cur:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            async def execute(self, sql, params):
+                conn.calls.append(params[0])
+
+            async def fetchone(self):
+                return (2,)
+        return Cur()
+
+
+def test_partition_guard_goes_to_db_once_per_month():
+    guard, conn = rr.PartitionGuard(), FakeConn()
+    march, april = TS, TS + timedelta(days=20)
+    assert asyncio.run(guard.ensure(conn, [march, march, april])) == 4
+    assert asyncio.run(guard.ensure(conn, [march, april])) == 0
+    assert conn.calls == [rr.month_start(march), rr.month_start(april)]
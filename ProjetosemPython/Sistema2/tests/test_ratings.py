@@ -0,0 +1,148 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+import ratings
+from ratings import BOT, EMPTY, Params
+
+P = Params()
+
+
+def random_history(n_races=300, n_users=40, width=8, seed=1):
+    rng = np.random.default_rng(seed)
+    idx = np.stack([rng.choice(n_users, width, replace=False) for _ in range(n_races)])
+    idx[rng.random(idx.shape) < 0.1] = BOT
+    idx[:, -1][rng.random(n_races) < 0.3] = EMPTY          # grids incompletos
+    pos = np.argsort(rng.random((n_races, width)), axis=1) + 1
+    pos[rng.random(pos.shape) < 0.05] = 1                   # alguns empates
+    return idx, pos, n_users
+
+
+def test_two_player_elo():
+    d = ratings.deltas(np.array([[1500.0, 1500.0]]), np.array([[100, 100]]), np.array([[1, 2]]),
+                       np.ones((1, 2), bool), np.ones((1, 2), bool), P)
+    assert d.tolist() == [[P.k / 2, -P.k / 2]]
+
+
+def test_deltas_zero_sum_between_rated_players():
+    rng = np.random.default_rng(0)
+    r = rng.normal(1500, 200, (5, 8))
+    pos = np.argsort(rng.random((5, 8)), axis=1) + 1
+    ones = np.ones((5, 8), bool)
+    d = ratings.deltas(r, np.full((5, 8), 100), pos, ones, ones, P)
+    np.testing.assert_allclose(d.sum(axis=1), 0, atol=1e-9)
+
+
+def test_deltas_skip_bots_and_empty_slots():
+    r = np.array([[1400.0, 1600.0, 1500.0, 1500.0]])
+    slot = np.array([[True, True, True, False]])
+    rated = np.array([[True, True, False, False]])
+    d = ratings.deltas(r, np.full((1, 4), 100), np.array([[3, 1, 2, 0]]), slot, rated, P)
+    assert d[0, 2] == 0 and d[0, 3] == 0                    # bot e vaga vazia não mudam
+    assert d[0, 1] > 0 > d[0, 0]
+
+
+def test_provisional_players_move_faster():
+    r, pos = np.array([[1500.0, 1500.0]]), np.array([[1, 2]])
+    ones = np.ones((1, 2), bool)
+    new = ratings.deltas(r, np.array([[0, 0]]), pos, ones, ones, P)
+    old = ratings.deltas(r, np.array([[P.provisional, P.provisional]]), pos, ones, ones, P)
+    assert new[0, 0] == pytest.approx(old[0, 0] * P.k_new / P.k)
+
+
+def test_waves_never_repeat_a_player_and_keep_order():
+    idx = np.array([[0, 1, BOT], [2, 3, EMPTY], [1, 2, BOT], [4, 5, EMPTY], [1, 4, BOT]])
+    assert ratings.waves(idx).tolist() == [0, 0, 1, 0, 2]
+    idx, _, _ = random_history()
+    wave = ratings.waves(idx)
+    last = {}
+    for r, row in enumerate(idx.tolist()):
+        for u in row:
+            if u >= 0:
+                assert wave[r] > last.get(u, -1)               # sempre depois da corrida anterior do jogador
+                last[u] = wave[r]
+    for w in np.unique(wave):
+        players = idx[wave == w]
+        players = players[players >= 0]
+        assert len(players) == len(np.unique(players))
+
+
+def test_batched_run_equals_one_race_at_a_time():
+    idx, pos, n_users = random_history()
+    batch_r, batch_n = np.full(n_users, P.default), np.zeros(n_users, dtype=np.int64)
+    ratings.run(idx, pos, batch_r, batch_n, P)
+    seq_r, seq_n = np.full(n_users, P.default), np.zeros(n_users, dtype=np.int64)
+    for i in range(len(idx)):
+        ratings.run(idx[i:i + 1], pos[i:i + 1], seq_r, seq_n, P)
+    np.testing.assert_allclose(batch_r, seq_r)
+    assert batch_n.tolist() == seq_n.tolist()
+    assert batch_n.sum() == (idx >= 0).sum()
+
+
+class FakeRatingsCursor:
+    """Tabela `ratings` em memória, só com os comandos que ratings.apply usa."""
+
+    def __init__(self):
+        self.table: dict[str, list] = {}
+        self._rows = []
+
+    async def execute(self, sql, params):
+        if sql.lstrip().startswith("INSERT"):
+            default, users = params
+            for u in users:
+                self.table.setdefault(u, [default, 0])
+        elif sql.lstrip().startswith("SELECT"):
+            self._rows = [(u, *self.table[u]) for u in sorted(params[0])]
+        else:
+            for u, r, n in zip(*params):
+                self.table[u] = [r, n]
+
+    async def fetchall(self):
+        return self._rows
+
+
+def test_online_apply_equals_recompute():
+    idx, pos, n_users = random_history(n_races=120)
+    users = [str(uuid.uuid4()) for _ in range(n_users)]
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    races = []
+    for r in range(len(idx)):
+        players = [{"id": users[u] if u >= 0 else f"bot-{j}", "position": int(pos[r, j])}
+                   for j, u in enumerate(idx[r].tolist()) if u != EMPTY]
+        races.append((str(uuid.uuid4()), {"players": players}, t0 + timedelta(minutes=r)))
+
+    cur = FakeRatingsCursor()
+    for i in range(0, len(races), 7):                          # lotes como os do outbox
+        asyncio.run(ratings.apply(cur, races[i:i + 7], P))
+
+    # recomputação: as mesmas corridas, sem os slots vazios, num único run
+    ids = {u: i for i, u in enumerate(users)}
+    ridx = np.full_like(idx, EMPTY)
+    rpos = np.zeros_like(pos)
+    for r, (_, payload, _) in enumerate(races):
+        for j, pl in enumerate(payload["players"]):
+            ridx[r, j] = ids.get(pl["id"], BOT)
+            rpos[r, j] = pl["position"]
+    rec_r, rec_n = np.full(n_users, P.default), np.zeros(n_users, dtype=np.int64)
+    ratings.run(ridx, rpos, rec_r, rec_n, P)
+
+    for u, i in ids.items():
+        if rec_n[i]:
+            assert cur.table[u][0] == pytest.approx(rec_r[i])
+            assert cur.table[u][1] == rec_n[i]
+
+
+def test_rating_cache_lru_and_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(ratings.time, "monotonic", lambda: now[0])
+    c = ratings.RatingCache(max_size=2, ttl=30)
+    c.put("a", 1500.0, 1)
+    c.put("b", 1510.0, 2)
+    assert c.get("a") == (1500.0, 1)
+    c.put("c", 1490.0, 3)                                      # "b" é o menos usado
+    assert c.get("b") is None and c.get("c") == (1490.0, 3)
+    now[0] += 31
+    assert c.get("a") is None
@@ -0,0 +1,95 @@
+"""
+Tokens de sessão assinados (JWT HS256) + caches em memória.
+
+O login emite um token com sub/name/email/exp/jti assinado com JWT_SECRET.
+Validar um token é só HMAC + relógio, então autorizar /race/start,
+/race/finish e /rdb/users não consulta o Postgres. O logout revoga o jti
+numa lista em memória (por processo) que se limpa sozinha quando os tokens
+expiram.
+"""
+import base64, hashlib, hmac, json, time, uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _b64e(b: bytes) -> str:
+    return base64.urlsafe_b64encode(b).rstrip(b"=").decode("ascii")
+
+def _b64d(s: str) -> bytes:
+    return base64.urlsafe_b64decode(s + "=" * (-len(s) % 4))
+
+_HEADER = _b64e(json.dumps({"alg": "HS256", "typ": "JWT"}, separators=(",", ":")).encode())
+
+
+def issue(secret: str, sub: str, name: str, email: str, ttl: int) -> tuple[str, Dict[str, Any]]:
+    now = int(time.time())
+    claims = {"sub": sub, "name": name, "email": email,
+              "iat": now, "exp": now + ttl, "jti": uuid.uuid4().hex}
+    body = _b64e(json.dumps(claims, separators=(",", ":")).encode())
+    signing_input = f"{_HEADER}.{body}".encode()
+    sig = _b64e(hmac.new(secret.encode(), signing_input, hashlib.sha256).digest())
+    return f"{_HEADER}.{body}.{sig}", claims
+
+def decode(secret: str, token: str, now: Optional[float] = None) -> Dict[str, Any]:
+    try:
+        header, body, sig = token.split(".")
+    except ValueError:
+        raise InvalidToken("token malformado")
+    if header != _HEADER:
+        raise InvalidToken("algoritmo não suportado")
+    expected = hmac.new(secret.encode(), f"{header}.{body}".encode(), hashlib.sha256).digest()
+    try:
+        ok = hmac.compare_digest(_b64d(sig), expected)
+        claims = json.loads(_b64d(body)) if ok else None
+    except (ValueError, json.JSONDecodeError):
+        raise InvalidToken("token malformado")
+    if not ok:
+        raise InvalidToken("assinatura inválida")
+    if claims.get("exp", 0) <= (now if now is not None else time.time()):
+        raise InvalidToken("token expirado")
+    return claims
+
+
+class Revocations:
+    """jti revogados até o seu exp (depois disso o token já não vale mesmo)."""
+
+    def __init__(self):
+        self._exp: Dict[str, int] = {}
+
+    def revoke(self, jti: str, exp: int):
+        self._exp[jti] = exp
+        if len(self._exp) % 1024 == 0:
+            self.prune()
+
+    def is_revoked(self, jti: str) -> bool:
+        return jti in self._exp
+
+    def prune(self):
+        now = time.time()
+        for jti in [j for j, e in self._exp.items() if e <= now]:
+            del self._exp[jti]
+
+
+class ProfileCache:
+    """LRU de perfis {user_id, name, email}, preenchido no login/cadastro."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._d: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def put(self, profile: Dict[str, Any]):
+        uid = profile["user_id"]
+        self._d[uid] = profile
+        self._d.move_to_end(uid)
+        while len(self._d) > self.max_size:
+            self._d.popitem(last=False)
+
+    def get(self, uid: str) -> Optional[Dict[str, Any]]:
+        prof = self._d.get(uid)
+        if prof is not None:
+            self._d.move_to_end(uid)
+        return prof